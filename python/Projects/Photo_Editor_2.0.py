@@ -1,283 +1,240 @@
+import argparse
 import os
 import sys
-import io
-import re
-from urllib.request import urlopen, Request
-from urllib.parse import urlparse, urljoin
-from PIL import Image
-
-# -----------------------------------------------------------------------------
-# Output folder
-# -----------------------------------------------------------------------------
-OUTPUT_DIR = os.path.join(os.path.dirname(__file__), "outputs")
-os.makedirs(OUTPUT_DIR, exist_ok=True)
-
-
-def out(name: str) -> str:
-    return os.path.join(OUTPUT_DIR, name)
 
+import graph
+import profiling
+from photo_core.files import (OUTPUT_DIR, is_url, load_image, load_image_any,
+                              out, save_image)
+from photo_core.pixels import (build_smiley, clamp8, create_pixel, get_blue,
+                               get_green, get_red, scale_image)
+from pixel_buffer import as_buffer, destination, is_image
+from profiling import profiled, stage
+
+# The backends, engines (convolve, rank, point_pipeline, histogram, tiled,
+# strips), codecs and output queue are imported by the functions that use
+# them, as are URL loading (photo_core.net), batch, result_cache and the
+# process pool: loading this module pulls in neither Pillow nor NumPy
+# (bench_startup.py checks this).
 
 # -----------------------------------------------------------------------------
-# Local I/O
+# Filter backends
 # -----------------------------------------------------------------------------
-def load_image(filepath):
-    """Load local image file and convert to list-of-lists of 0xRRGGBB ints."""
-    try:
-        with Image.open(filepath) as img:
-            img = img.convert("RGB")
-            width, height = img.size
-            pixels = list(img.getdata())
-        image_data = [
-            [(r << 16) | (g << 8) | b for r, g, b in pixels[i * width:(i + 1)
-                                                            * width]]
-            for i in range(height)
-        ]
-        print(f"Successfully loaded '{filepath}' ({width}x{height})")
-        return image_data
-    except Exception as e:
-        print(f"Error loading image: {e}")
+# "python": the reference per-pixel loops below.
+# "numpy":  whole-array versions from np_backend (bit-identical output).
+# "stdlib": bytes.translate/slice versions from stdlib_backend, for installs
+#           without NumPy (bit-identical; sepia, kernels and rank filters
+#           run the loops).
+# "auto":   numpy when it is installed, stdlib otherwise.
+BACKENDS = ("auto", "python", "numpy", "stdlib")
+BACKEND = "auto"
+_NUMPY_MISSING_SAID = False   # the stdlib fallback is announced once
+
+
+def set_backend(name):
+    """Select the default filter backend for every call."""
+    global BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}; choose from {BACKENDS}")
+    BACKEND = name
+
+
+def _vectorized(backend=None, op=None):
+    """Return the backend module to use, or None for the Python loops (also
+    when the module has no function ``op``)."""
+    global _NUMPY_MISSING_SAID
+    import np_backend
+    import stdlib_backend
+
+    name = BACKEND if backend is None else backend
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend {name!r}; choose from {BACKENDS}")
+    if name == "python":
         return None
+    if name != "stdlib" and np_backend.AVAILABLE:
+        fast = np_backend
+    else:
+        if name == "numpy" and not _NUMPY_MISSING_SAID:
+            print("NumPy is not installed; falling back to the stdlib "
+                  "backend.")
+            _NUMPY_MISSING_SAID = True
+        fast = stdlib_backend
+    return fast if op is None or hasattr(fast, op) else None
 
 
-def save_image(image_data, filepath):
-    """Save list-of-lists of 0xRRGGBB ints to an image file."""
-    if not image_data or not image_data[0]:
-        print("Error: Image data is empty.")
-        return
-    h, w = len(image_data), len(image_data[0])
-    img = Image.new("RGB", (w, h))
-    buf = []
-    for row in image_data:
-        for px in row:
-            buf.append(((px >> 16) & 0xFF, (px >> 8) & 0xFF, px & 0xFF))
-    img.putdata(buf)
-    try:
-        img.save(filepath)
-        print(f"Saved: {os.path.abspath(filepath)}")
-    except Exception as e:
-        print(f"An error occurred while saving: {e}")
-
-
-def display_image(image_data):
-    """(Optional) Show image with OS viewer."""
-    if not image_data or not image_data[0]:
-        print("Error: Image data is empty.")
-        return
-    h, w = len(image_data), len(image_data[0])
-    img = Image.new("RGB", (w, h))
-    buf = []
-    for row in image_data:
-        for px in row:
-            buf.append(((px >> 16) & 0xFF, (px >> 8) & 0xFF, px & 0xFF))
-    img.putdata(buf)
-    img.show()
-
-
-def scale_image(image_data, factor):
-    """Nearest neighbor integer scaling."""
-    if not image_data or not image_data[0] or factor <= 0:
-        return []
-    if factor == 1:
-        return [row[:] for row in image_data]
-    new_h = len(image_data) * factor
-    new_w = len(image_data[0]) * factor
-    new_image = [[0] * new_w for _ in range(new_h)]
-    for y in range(new_h):
-        for x in range(new_w):
-            new_image[y][x] = image_data[y // factor][x // factor]
-    return new_image
-
-
-# -----------------------------------------------------------------------------
-# URL I/O (std lib only)
-# -----------------------------------------------------------------------------
-
-def is_url(source: str) -> bool:
-    p = urlparse(source)
-    return p.scheme in ("http", "https") and bool(p.netloc)
-
-
-def fetch_url(url: str, timeout: int = 15):
-    """Return (bytes, content_type, final_url).
-    Adds UA + Referer to reduce 403."""
-    req = Request(
-        url,
-        headers={
-            "User-Agent": "Mozilla/5.0",
-            "Accept": "image/*,*/*;q=0.8",
-            "Referer": url,
-        },
-    )
-    with urlopen(req, timeout=timeout) as r:
-        data = r.read()
-        content_type = (r.headers.get("Content-Type") or
-                        "").split(";")[0].strip().lower()
-        final_url = r.geturl()  # after redirects
-    return data, content_type, final_url
-
-
-def _looks_like_image_url(u: str) -> bool:
-    return u.lower().split("?")[0].endswith((".png", ".jpg", ".jpeg", ".webp",
-                                             ".bmp"))
-
-
-def _image_bytes_to_data(data: bytes, source="URL"):
-    with Image.open(io.BytesIO(data)) as img:
-        img = img.convert("RGB")
-        w, h = img.size
-        pixels = list(img.getdata())
-    image_data = [
-        [(r << 16) | (g << 8) | b for r, g, b in pixels[i * w:(i + 1) * w]]
-        for i in range(h)
-    ]
-    print(f"Successfully loaded {source} ({w}x{h})")
-    return image_data
-
-
-def load_image_from_url(url: str):
-    """Load from direct image URL; fallback:
-    parse HTML og:image/twitter:image."""
-    try:
-        data, ctype, final_url = fetch_url(url)
-
-        # Direct image response or URL looks like image
-        if ctype.startswith("image/") or _looks_like_image_url(final_url):
-            return _image_bytes_to_data(data, source=final_url)
-
-        # Likely HTML: try to extract meta image
-        html = data.decode("utf-8", "ignore")
-        m = re.search(
-            r'property=["\']og:image["\'][^>]*content=["\']([^"\']+)["\']',
-            html, re.I)
-        if not m:
-            m = re.search(
-                (r'name=["\']twitter:image["\'][^>]*'
-                 r'content=["\']([^"\']+)["\']'),
-                html, re.I)
-        if m:
-            img_url = urljoin(final_url, m.group(1))
-            data2, ctype2, final_img_url = fetch_url(img_url)
-            if (not ctype2.startswith("image/")) and (
-                    not _looks_like_image_url(final_img_url)):
-                print("Found meta image, "
-                      "but it doesn't look like a direct image URL.")
-                return None
-            return _image_bytes_to_data(data2, source=final_img_url)
-
-        print("The URL is a webpage (HTML), not a direct image. "
-              "Provide a .jpg/.png link.")
-        return None
+AUTO = ("auto", "otsu")
 
-    except Exception as e:
-        print(f"Error loading URL: {e}")
-        return None
 
-
-def load_image_any(source: str):
-    """Smart router: URL -> load_image_from_url, Local -> load_image
-    (with existence check)."""
-    if is_url(source):
-        return load_image_from_url(source)
-    if not os.path.isfile(source):
-        print(f"Local path not found: {source}")
+def _target(image_data, out=None, inplace=False):
+    """Destination for a filter's ``out=``/``inplace=``, or None when the
+    caller gave neither (the filter then allocates its result)."""
+    if out is None and not inplace:
         return None
-    return load_image(source)
-
-
-# -----------------------------------------------------------------------------
-# Pixel toolkit (bitwise)
-# -----------------------------------------------------------------------------
-
-def get_red(px):
-    return (px >> 16) & 0xFF
-
-
-def get_green(px):
-    return (px >> 8) & 0xFF
-
+    return destination(image_data, out, inplace)
 
-def get_blue(px):
-    return px & 0xFF
 
+def _lut_pass(image_data, lut, backend=None, out=None, inplace=False):
+    """Map all three channels through one 256-entry table."""
+    from point_pipeline import PointPipeline
 
-def create_pixel(r, g, b):
-    return ((r & 0xFF) << 16) | ((g & 0xFF) << 8) | (b & 0xFF)
-
-
-def clamp8(x):
-    return 0 if x < 0 else 255 if x > 255 else int(x)
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.apply_lut(image_data, lut, out=out)
+    return PointPipeline().lut(lut).apply(image_data, use_numpy=False,
+                                          out=out, use_stdlib=False)
 
 
 # -----------------------------------------------------------------------------
 # Core filters (spec-required)
 # -----------------------------------------------------------------------------
-
-def to_grayscale(image_data):
+# Every filter returns a new PixelBuffer, or writes into ``out=`` (a buffer
+# of the same size) and returns that. ``inplace=True`` overwrites the
+# source, which must be a PixelBuffer nobody else reads (not one returned
+# by a ResultCache). Point filters read each pixel before writing it;
+# apply_kernel stages its result in a scratch buffer.
+
+@profiled("filter")
+def to_grayscale(image_data, backend=None, out=None, inplace=False):
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.to_grayscale(image_data, out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0] * w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            px = image_data[y][x]
+            px = src[x]
             gray = (get_red(px) + get_green(px) + get_blue(px)) // 3
-            out[y][x] = create_pixel(gray, gray, gray)
+            dst[x] = create_pixel(gray, gray, gray)
+    out.invalidate()
     return out
 
 
-def invert_colors(image_data):
+@profiled("filter")
+def invert_colors(image_data, backend=None, out=None, inplace=False):
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.xor_mask(image_data, 0xFFFFFF, out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0] * w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            out[y][x] = image_data[y][x] ^ 0xFFFFFF
+            dst[x] = src[x] ^ 0xFFFFFF
+    out.invalidate()
     return out
 
 
-def remove_green(image_data):
+@profiled("filter")
+def remove_green(image_data, backend=None, out=None, inplace=False):
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.and_mask(image_data, 0xFF00FF, out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0] * w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            out[y][x] = image_data[y][x] & 0xFF00FF  # keep RR and BB
+            dst[x] = src[x] & 0xFF00FF  # keep RR and BB
+    out.invalidate()
     return out
 
 
-def swap_red_blue(image_data):
+@profiled("filter")
+def swap_red_blue(image_data, backend=None, out=None, inplace=False):
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.swap_red_blue(image_data, out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0] * w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            px = image_data[y][x]
-            out[y][x] = (
+            px = src[x]
+            dst[x] = (
                 (px & 0x0000FF) << 16) | (px & 0x00FF00) | (
                     (px & 0xFF0000) >> 16)
+    out.invalidate()
     return out
 
 
-def posterize_keep_bits(image_data, keep_bits=2):
+@profiled("filter")
+def posterize_keep_bits(image_data, keep_bits=2, backend=None,
+                        out=None, inplace=False):
+    from point_pipeline import posterize_lut
+
     keep_bits = max(1, min(8, int(keep_bits)))
     mask = 0xFF & (~((1 << (8 - keep_bits)) - 1))
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.apply_lut(image_data, posterize_lut(keep_bits), out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0] * w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            px = image_data[y][x]
+            px = src[x]
             r = get_red(px) & mask
             g = get_green(px) & mask
             b = get_blue(px) & mask
-            out[y][x] = create_pixel(r, g, b)
+            dst[x] = create_pixel(r, g, b)
+    out.invalidate()
     return out
 
 
-def threshold_bw(image_data, t=128):
+@profiled("filter")
+def threshold_bw(image_data, t=128, backend=None, out=None, inplace=False):
+    """Black and white at gray level ``t``; t="otsu" (or "auto") picks it
+    from the image's histogram (Otsu's method)."""
+    from histogram import image_stats, otsu_threshold
+
+    if t in AUTO:
+        t = otsu_threshold(image_stats(image_data).gray)
     t = max(0, min(255, int(t)))
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.threshold_bw(image_data, t, out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0] * w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            px = image_data[y][x]
+            px = src[x]
             gray = (get_red(px) + get_green(px) + get_blue(px)) // 3
             val = 255 if gray >= t else 0
-            out[y][x] = create_pixel(val, val, val)
+            dst[x] = create_pixel(val, val, val)
+    out.invalidate()
+    return out
+
+
+@profiled("filter")
+def threshold_gray(gray_data, t=128, backend=None, out=None, inplace=False):
+    """threshold_bw of an image that is already grayscale (one LUT pass);
+    threshold_gray(to_grayscale(img), t) == threshold_bw(img, t)."""
+    from histogram import image_stats, otsu_threshold
+    from point_pipeline import threshold_lut
+
+    if t in AUTO:
+        t = otsu_threshold(image_stats(gray_data).gray)
+    lut = threshold_lut(t)
+    out = _target(gray_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.apply_lut(gray_data, lut, out=out)
+    h, w = len(gray_data), len(gray_data[0])
+    out = destination(gray_data, out)
+    for y in range(h):
+        src, dst = gray_data[y], out[y]
+        for x in range(w):
+            dst[x] = lut[src[x] & 0xFF] * 0x010101
+    out.invalidate()
     return out
 
 
@@ -285,61 +242,68 @@ def threshold_bw(image_data, t=128):
 # Advanced filters (still spec-compliant)
 # -----------------------------------------------------------------------------
 
-def gamma_correction(image_data, gamma=2.2):
+@profiled("filter")
+def gamma_correction(image_data, gamma=2.2, backend=None,
+                     out=None, inplace=False):
     gamma = max(0.1, float(gamma))
     lut = [clamp8(255 * ((i / 255.0) ** (1.0 / gamma))) for i in range(256)]
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.apply_lut(image_data, lut, out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0]*w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            px = image_data[y][x]
+            px = src[x]
             r = lut[get_red(px)]
             g = lut[get_green(px)]
             b = lut[get_blue(px)]
-            out[y][x] = create_pixel(r, g, b)
+            dst[x] = create_pixel(r, g, b)
+    out.invalidate()
     return out
 
 
-def sepia(image_data):
+@profiled("filter")
+def sepia(image_data, backend=None, out=None, inplace=False):
+    from point_pipeline import SEPIA_MATRIX
+
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend, "color_matrix")
+    if fast:
+        return fast.color_matrix(image_data, SEPIA_MATRIX, out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0]*w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            px = image_data[y][x]
+            px = src[x]
             r, g, b = get_red(px), get_green(px), get_blue(px)
             tr = clamp8(0.393*r + 0.769*g + 0.189*b)
             tg = clamp8(0.349*r + 0.686*g + 0.168*b)
             tb = clamp8(0.272*r + 0.534*g + 0.131*b)
-            out[y][x] = create_pixel(tr, tg, tb)
+            dst[x] = create_pixel(tr, tg, tb)
+    out.invalidate()
     return out
 
 
-def apply_kernel(image_data, kernel, divisor=None, offset=0):
-    """3x3 convolution; kernel = 9 ints in row order."""
-    if divisor is None:
-        s = sum(kernel)
-        divisor = s if s != 0 else 1
-    h, w = len(image_data), len(image_data[0])
-    out = [[0]*w for _ in range(h)]
-    for y in range(h):
-        for x in range(w):
-            if y == 0 or x == 0 or y == h-1 or x == w-1:
-                out[y][x] = image_data[y][x]
-                continue
-            acc_r = acc_g = acc_b = 0
-            k = 0
-            for dy in (-1, 0, 1):
-                for dx in (-1, 0, 1):
-                    p = image_data[y+dy][x+dx]
-                    acc_r += get_red(p) * kernel[k]
-                    acc_g += get_green(p) * kernel[k]
-                    acc_b += get_blue(p) * kernel[k]
-                    k += 1
-            r = clamp8(round(acc_r / divisor) + offset)
-            g = clamp8(round(acc_g / divisor) + offset)
-            b = clamp8(round(acc_b / divisor) + offset)
-            out[y][x] = create_pixel(r, g, b)
-    return out
+@profiled("filter")
+def apply_kernel(image_data, kernel, divisor=None, offset=0, border="copy",
+                 backend=None, out=None, inplace=False, scratch=None):
+    """NxN convolution; kernel = n*n ints in row order (or n rows), n odd.
+
+    Runs on the convolve engine: box kernels use a summed-area table,
+    separable ones two 1-D passes. border: copy | clamp | reflect | wrap.
+    In place, the result is staged in ``scratch`` (a same-size buffer,
+    allocated when not given) before it replaces the source.
+    """
+    import np_backend
+    from convolve import convolve
+
+    return convolve(image_data, kernel, divisor, offset, border,
+                    use_numpy=_vectorized(backend) is np_backend,
+                    out=_target(image_data, out, inplace), scratch=scratch)
 
 
 # Presets
@@ -348,50 +312,287 @@ K_SHARPEN = [0, -1, 0, -1, 5, -1, 0, -1, 0]
 K_EDGE_SIMPLE = [0, -1, 0, -1, 4, -1, 0, -1, 0]
 
 
-def adjust_brightness(image_data, delta=0):
+# Rank filters: each channel becomes the median / minimum / maximum /
+# percentile of its (2r+1) x (2r+1) window. Unlike K_BLUR_BOX, the median
+# removes speckle noise without smearing edges. The cost per pixel does not
+# grow with the radius (see rank.py); border as in apply_kernel.
+def _rank_pass(image_data, radius, which, border, backend, out, inplace):
+    import np_backend
+    from rank import rank_filter
+
+    return rank_filter(image_data, radius, which, border,
+                       use_numpy=_vectorized(backend) is np_backend,
+                       out=_target(image_data, out, inplace))
+
+
+@profiled("filter")
+def median_filter(image_data, radius=1, border="copy", backend=None,
+                  out=None, inplace=False):
+    """Median of each window: removes speckle noise, keeps edges."""
+    return _rank_pass(image_data, radius, "median", border, backend, out,
+                      inplace)
+
+
+@profiled("filter")
+def erode(image_data, radius=1, border="copy", backend=None, out=None,
+          inplace=False):
+    """Minimum of each window: dark areas grow."""
+    return _rank_pass(image_data, radius, "min", border, backend, out,
+                      inplace)
+
+
+@profiled("filter")
+def dilate(image_data, radius=1, border="copy", backend=None, out=None,
+           inplace=False):
+    """Maximum of each window: bright areas grow."""
+    return _rank_pass(image_data, radius, "max", border, backend, out,
+                      inplace)
+
+
+@profiled("filter")
+def percentile_filter(image_data, radius=1, percentile=50, border="copy",
+                      backend=None, out=None, inplace=False):
+    """``percentile`` (0..100, or "min"/"median"/"max") of each window."""
+    return _rank_pass(image_data, radius, percentile, border, backend, out,
+                      inplace)
+
+
+@profiled("filter")
+def adjust_brightness(image_data, delta=0, backend=None,
+                      out=None, inplace=False):
+    """Add ``delta`` to every channel; "auto" moves the mean gray to 128."""
+    from histogram import auto_brightness_delta, image_stats
+    from point_pipeline import brightness_lut
+
+    if delta in AUTO:
+        delta = auto_brightness_delta(image_stats(image_data))
     delta = int(delta)
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.apply_lut(image_data, brightness_lut(delta), out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0]*w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            px = image_data[y][x]
+            px = src[x]
             r = clamp8(get_red(px) + delta)
             g = clamp8(get_green(px) + delta)
             b = clamp8(get_blue(px) + delta)
-            out[y][x] = create_pixel(r, g, b)
+            dst[x] = create_pixel(r, g, b)
+    out.invalidate()
     return out
 
 
-def adjust_contrast(image_data, factor=1.0):
+@profiled("filter")
+def adjust_contrast(image_data, factor=1.0, backend=None,
+                    out=None, inplace=False):
+    """Scale channels around 128; "auto" stretches the gray histogram's
+    range to 0..255 instead (auto-levels, clip: histogram.DEFAULT_CLIP)."""
+    from histogram import image_stats, levels_lut
+    from point_pipeline import contrast_lut
+
+    if factor in AUTO:
+        return _lut_pass(image_data,
+                         levels_lut(image_stats(image_data).gray), backend,
+                         out, inplace)
     factor = float(factor)
+    out = _target(image_data, out, inplace)
+    fast = _vectorized(backend)
+    if fast:
+        return fast.apply_lut(image_data, contrast_lut(factor), out=out)
     h, w = len(image_data), len(image_data[0])
-    out = [[0]*w for _ in range(h)]
+    out = destination(image_data, out)
     for y in range(h):
+        src, dst = image_data[y], out[y]
         for x in range(w):
-            px = image_data[y][x]
+            px = src[x]
             r = clamp8(128 + factor * (get_red(px) - 128))
             g = clamp8(128 + factor * (get_green(px) - 128))
             b = clamp8(128 + factor * (get_blue(px) - 128))
-            out[y][x] = create_pixel(r, g, b)
+            dst[x] = create_pixel(r, g, b)
+    out.invalidate()
     return out
 
+
+@profiled("filter")
+def equalize(image_data, backend=None, out=None, inplace=False):
+    """Histogram equalisation: one gray-level LUT applied to R, G and B,
+    so contrast spreads evenly without shifting hues."""
+    from histogram import equalize_lut, image_stats
+
+    return _lut_pass(image_data, equalize_lut(image_stats(image_data).gray),
+                     backend, out, inplace)
+
+
+@profiled("filter")
+def apply_pipeline(image_data, pipeline, backend=None,
+                   out=None, inplace=False):
+    """Run a PointPipeline (fused point filters) in one pass."""
+    import np_backend
+    import stdlib_backend
+    from point_pipeline import PointPipeline
+
+    if not isinstance(pipeline, PointPipeline):
+        raise TypeError("Expected a PointPipeline.")
+    fast = _vectorized(backend)
+    return pipeline.apply(image_data, use_numpy=fast is np_backend,
+                          out=_target(image_data, out, inplace),
+                          use_stdlib=fast is stdlib_backend)
+
+
 # -----------------------------------------------------------------------------
-# Smiley generator (for quick demo)
+# Multi-core execution
 # -----------------------------------------------------------------------------
 
+def filter_halo(fn, args=(), kwargs=None):
+    """Rows of context ``fn`` needs above/below a band (0 = point filter)."""
+    from tiled import kernel_halo
+
+    if fn is apply_kernel:
+        return kernel_halo(args[0] if args else (kwargs or {})["kernel"])
+    if fn in RANK_FILTERS:
+        return int(args[0] if args else (kwargs or {}).get("radius", 1))
+    return 0
+
+
+def resolve_auto(fn, image_data, args=(), kwargs=None):
+    """(fn, args, kwargs) with histogram-based ("auto") arguments fixed
+    from the whole image, so that row bands all agree."""
+    from histogram import (auto_brightness_delta, equalize_lut, image_stats,
+                           levels_lut, otsu_threshold)
+
+    kwargs = dict(kwargs or {})
+    if fn is equalize:
+        return _lut_pass, (equalize_lut(image_stats(image_data).gray),), \
+            kwargs
+    name = AUTO_PARAMS.get(fn)
+    value = args[0] if args else kwargs.get(name)
+    if name is None or value not in AUTO:
+        return fn, tuple(args), kwargs
+    kwargs.pop(name, None)
+    stats = image_stats(image_data)
+    if fn is adjust_contrast:
+        return _lut_pass, (levels_lut(stats.gray),), kwargs
+    if fn is adjust_brightness:
+        value = auto_brightness_delta(stats)
+    else:
+        value = otsu_threshold(stats.gray)
+    return fn, (value,) + tuple(args[1:]), kwargs
+
+
+def run_filter(fn, image_data, *args, workers=1, executor=None, **kwargs):
+    """Call ``fn(image_data, *args)``, split into row bands over ``workers``
+    processes when workers > 1 (or an executor is given)."""
+    if workers > 1 or executor is not None:
+        fn, args, kwargs = resolve_auto(fn, image_data, args, kwargs)
+    halo = filter_halo(fn, args, kwargs)
+    if kwargs.get("border", "copy") == "wrap":
+        # Vertical wrap reads rows from the far edge: keep it in one piece
+        workers, executor = 1, None
+    if workers <= 1 and executor is None:
+        return fn(image_data, *args, **kwargs)
+    # Bands are filtered into shared memory; the destination gets the
+    # stitched result
+    from tiled import run_tiled
+
+    out = _target(image_data, kwargs.pop("out", None),
+                  kwargs.pop("inplace", False))
+    kwargs.pop("scratch", None)
+    with stage(fn.__name__, "filter", workers=workers) as st:
+        result = run_tiled(fn, image_data, *args, halo=halo,
+                           workers=workers, executor=executor, **kwargs)
+        st.add(as_buffer(image_data).nbytes() + result.nbytes())
+    return result if out is None else out.paste(result)
+
+
+RANK_FILTERS = (median_filter, erode, dilate, percentile_filter)
+# Filters whose first parameter accepts "auto" (see resolve_auto)
+AUTO_PARAMS = {threshold_bw: "t", threshold_gray: "t",
+               adjust_brightness: "delta", adjust_contrast: "factor"}
+
+
+# -----------------------------------------------------------------------------
+# Outputs and batch registry
+# -----------------------------------------------------------------------------
 
-def build_smiley():
-    BLACK, YELLOW, BLUE = 0x000000, 0xFFFF00, 0x0000FF
-    return [
-        [BLACK, BLACK, BLACK, BLACK, BLACK, BLACK, BLACK, BLACK],
-        [BLACK, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, BLACK],
-        [BLACK, YELLOW, BLUE,   YELLOW, YELLOW, BLUE,   YELLOW, BLACK],
-        [BLACK, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, BLACK],
-        [BLACK, YELLOW, BLUE,   YELLOW, YELLOW, BLUE,   YELLOW, BLACK],
-        [BLACK, YELLOW, YELLOW, BLUE,   BLUE,   YELLOW, YELLOW, BLACK],
-        [BLACK, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, BLACK],
-        [BLACK, BLACK, BLACK, BLACK, BLACK, BLACK, BLACK, BLACK],
-    ]
+# (file name, filter, args); None = the source itself
+DEFAULT_OUTPUTS = [
+    # Baseline outputs
+    ("original.png",        None,                ()),
+    ("invert.png",          invert_colors,       ()),
+    ("grayscale.png",       to_grayscale,        ()),
+    ("no_green.png",        remove_green,        ()),
+    ("swap_rb.png",         swap_red_blue,       ()),
+    ("posterize_2bits.png", posterize_keep_bits, (2,)),
+    ("threshold_128.png",   threshold_bw,        (128,)),
+    # Advanced outputs
+    ("sepia.png",           sepia,               ()),
+    ("gamma_2_2.png",       gamma_correction,    (2.2,)),
+    ("sharpen.png",         apply_kernel,        (K_SHARPEN,)),
+    ("edges.png",           apply_kernel,        (K_EDGE_SIMPLE,)),
+    # Optional:
+    # ("bright_plus20.png", adjust_brightness,   (20,)),
+    # ("contrast_1_3.png",  adjust_contrast,     (1.3,)),
+    # Optional, from the image's histogram:
+    # ("threshold_otsu.png", threshold_bw,       ("otsu",)),
+    # ("auto_levels.png",   adjust_contrast,     ("auto",)),
+    # ("equalized.png",     equalize,            ()),
+    # Optional, rank filters:
+    # ("median_3x3.png",    median_filter,       (1,)),
+    # ("erode_5x5.png",     erode,               (2,)),
+]
+
+# Filters and constants a batch manifest may name
+FILTERS = {fn.__name__: fn for fn in (
+    to_grayscale, invert_colors, remove_green, swap_red_blue,
+    posterize_keep_bits, threshold_bw, threshold_gray, gamma_correction,
+    sepia, apply_kernel, adjust_brightness, adjust_contrast, equalize,
+    median_filter, erode, dilate, percentile_filter, scale_image)}
+MANIFEST_CONSTANTS = {"K_BLUR_BOX": K_BLUR_BOX, "K_SHARPEN": K_SHARPEN,
+                      "K_EDGE_SIMPLE": K_EDGE_SIMPLE}
+
+
+# Lazy builders: lazy.gray(x), lazy.kernel(x, K_SHARPEN), ... return graph
+# Nodes; graph.evaluate() computes shared sub-expressions once.
+lazy = graph.Lazy(
+    gray=to_grayscale, invert=invert_colors, no_green=remove_green,
+    swap_rb=swap_red_blue, posterize=posterize_keep_bits,
+    gamma=gamma_correction, sepia=sepia, kernel=apply_kernel,
+    brightness=adjust_brightness, contrast=adjust_contrast,
+    equalize=equalize, median=median_filter, erode=erode, dilate=dilate,
+    percentile=percentile_filter, scale=scale_image,
+    pipeline=apply_pipeline)
+
+
+def _lazy_threshold(x, t=128, backend=None):
+    """Threshold via the (shared) grayscale node instead of from scratch."""
+    kw = {} if backend is None else {"backend": backend}
+    is_gray = isinstance(x, graph.Node) and x.fn is to_grayscale
+    return graph.node(threshold_gray, x if is_gray else lazy.gray(x, **kw),
+                      t, **kw)
+
+
+lazy.add("threshold", threshold_bw, builder=_lazy_threshold)
+
+
+def output_graph(image_data, outputs=DEFAULT_OUTPUTS):
+    """{file name: Node} for ``outputs`` applied to one image."""
+    src = graph.source(image_data)
+    return {name: src if fn is None else lazy.call(fn, src, *args)
+            for name, fn, args in outputs}
+
+
+def default_manifest(save=None):
+    """DEFAULT_OUTPUTS as a batch manifest ({stem}_invert.png, ...);
+    ``save``: options for save_image (the encode profile)."""
+    import batch
+
+    return batch.make_manifest(
+        (batch.Output(os.path.splitext(name)[0], fn, tuple(args), {}, "png",
+                      {})
+         for name, fn, args in DEFAULT_OUTPUTS), save=save)
 
 
 # -----------------------------------------------------------------------------
@@ -399,23 +600,154 @@ def build_smiley():
 # -----------------------------------------------------------------------------
 
 if __name__ == "__main__":
-    source = sys.argv[1].strip() if len(sys.argv) > 1 else input(
+    from encode import DEFAULT_PROFILE, PROFILES
+    from output_stage import OutputQueue
+    from strips import DEFAULT_STRIP_ROWS
+
+    parser = argparse.ArgumentParser(
+        description="Load an image and write every filter output.")
+    parser.add_argument("source", nargs="*",
+                        help="local file path, URL, or 's' for smiley; "
+                             "with --batch: files, directories, globs or "
+                             "@list files")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes per filter (row bands), default 1")
+    parser.add_argument("--max-size", type=int, default=None,
+                        help="load a preview whose longest side is at most "
+                             "this many pixels (JPEG draft decoding)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="always download URLs (skip the HTTP cache)")
+    parser.add_argument("--encode-threads", type=int, default=4,
+                        help="threads encoding/writing outputs, default 4")
+    parser.add_argument("--encode-profile", choices=tuple(PROFILES),
+                        default=DEFAULT_PROFILE,
+                        help="encoder settings: speed (fastest), balanced "
+                             "or size (smallest files); default "
+                             f"{DEFAULT_PROFILE}")
+    parser.add_argument("--only", nargs="+", metavar="NAME", default=None,
+                        help="write only these outputs (e.g. threshold_128 "
+                             "grayscale); shared work still runs once")
+    parser.add_argument("--graph-threads", type=int, default=1,
+                        help="run independent filters on this many threads "
+                             "(helps with the NumPy backend), default 1")
+    parser.add_argument("--result-cache", nargs="?", metavar="DIR",
+                        const=os.path.join(OUTPUT_DIR, ".result_cache"),
+                        default=None,
+                        help="reuse filter results and encoded outputs "
+                             "from earlier runs (default DIR: "
+                             "outputs/.result_cache)")
+    parser.add_argument("--result-cache-mb", type=int, default=1024,
+                        help="disk budget for --result-cache, default 1024")
+    parser.add_argument("--stream", action="store_true",
+                        help="decode, filter and write in row strips "
+                             "(bounded memory, local files only)")
+    parser.add_argument("--strip-rows", type=int, default=DEFAULT_STRIP_ROWS,
+                        help="rows per strip in --stream mode")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every stage and filter; print a table")
+    parser.add_argument("--profile-memory", action="store_true",
+                        help="with --profile, also record peak allocations "
+                             "(slower)")
+    parser.add_argument("--profile-out", default=None,
+                        help="write the profile to this file "
+                             "(implies --profile)")
+    parser.add_argument("--profile-format", choices=("json", "chrome"),
+                        default="json",
+                        help="--profile-out format: json records or Chrome "
+                             "trace events")
+    parser.add_argument("--batch", action="store_true",
+                        help="process every source across a process pool")
+    parser.add_argument("--manifest", default=None,
+                        help="--batch: JSON/TOML file naming the outputs "
+                             "(default: the standard outputs)")
+    parser.add_argument("--output-dir", default=None,
+                        help="--batch: where outputs go (default: the "
+                             "manifest's output_dir, else outputs/)")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="--batch: worker processes (default: CPUs)")
+    parser.add_argument("--force", action="store_true",
+                        help="--batch: rewrite outputs that are up to date")
+    parser.add_argument("--journal", default=None,
+                        help="--batch: progress journal (default: "
+                             ".batch_journal.jsonl in the output dir)")
+    cli = parser.parse_args()
+    outputs = DEFAULT_OUTPUTS
+    if cli.only:
+        names = {os.path.splitext(n)[0] for n in cli.only}
+        outputs = [o for o in DEFAULT_OUTPUTS
+                   if os.path.splitext(o[0])[0] in names]
+        if not outputs:
+            parser.error("--only matches none of: " + ", ".join(
+                os.path.splitext(o[0])[0] for o in DEFAULT_OUTPUTS))
+    if cli.profile or cli.profile_out or cli.profile_memory:
+        profiling.enable(memory=cli.profile_memory)
+    if cli.no_cache:
+        from photo_core import net
+
+        net.HTTP_CACHE = None
+
+    if cli.batch:
+        import batch
+
+        if not cli.source:
+            parser.error("--batch needs at least one source")
+        # The profile is part of the manifest signature: changing it
+        # rebuilds outputs that are otherwise up to date
+        save = {"profile": cli.encode_profile}
+        try:
+            manifest = (batch.load_manifest(cli.manifest, FILTERS,
+                                            MANIFEST_CONSTANTS, save)
+                        if cli.manifest else default_manifest(save))
+        except (OSError, ValueError) as e:
+            print(f"Bad manifest: {e}")
+            sys.exit(1)
+        out_dir = cli.output_dir or manifest.output_dir or OUTPUT_DIR
+        report = batch.run_batch(
+            list(batch.expand_sources(cli.source)), manifest, load_image,
+            save_image, out_dir, jobs=cli.jobs, journal_path=cli.journal,
+            force=cli.force)
+        print(report.summary())
+        profiling.finish(cli.profile_out, cli.profile_format)
+        sys.exit(1 if report.failed else 0)
+    if len(cli.source) > 1:
+        parser.error("several sources need --batch")
+
+    source = (cli.source[0] if cli.source else input(
         "Enter local file path or URL, or 's' for smiley: "
-    ).strip()
+    )).strip()
 
     if not source:
         print("No source provided.")
         sys.exit(1)
 
+    if cli.stream:
+        if is_url(source) or not os.path.isfile(source):
+            print(f"--stream needs a local image file: {source}")
+            sys.exit(1)
+        if any(fn is equalize or any(a in AUTO for a in args)
+               for _, fn, args in outputs):
+            print("--stream cannot run histogram-based (auto) filters")
+            sys.exit(1)
+        from strips import stream_process
+
+        stream_process(
+            source,
+            [(out(name), fn, args, {}, filter_halo(fn, args))
+             for name, fn, args in outputs],
+            strip_rows=cli.strip_rows,
+            compress_level=PROFILES[cli.encode_profile]["PNG"][
+                "compress_level"])
+        print(f"All outputs saved to: {OUTPUT_DIR}")
+        profiling.finish(cli.profile_out, cli.profile_format)
+        sys.exit(0)
+
     if source.lower() in ("s", "smiley"):
         img = scale_image(build_smiley(), 20)
     else:
-        img = load_image_any(source)
+        img = load_image_any(source, cli.max_size)
 
     # Strong validation so we never crash downstream
-    if (not img) or (not isinstance(img, list)) or (
-        img and not isinstance(img[0],
-                               list)):
+    if not is_image(img):
         print("Could not load image.\n"
               "- If it's a URL, use a DIRECT image link "
               "(ends with .jpg/.png).\n"
@@ -423,22 +755,41 @@ if __name__ == "__main__":
               + os.path.abspath(source))
         sys.exit(1)
 
-    # Baseline outputs
-    save_image(img,                          out("original.png"))
-    save_image(invert_colors(img),           out("invert.png"))
-    save_image(to_grayscale(img),            out("grayscale.png"))
-    save_image(remove_green(img),            out("no_green.png"))
-    save_image(swap_red_blue(img),           out("swap_rb.png"))
-    save_image(posterize_keep_bits(img, 2),  out("posterize_2bits.png"))
-    save_image(threshold_bw(img, 128),       out("threshold_128.png"))
-
-    # Advanced outputs
-    save_image(sepia(img),                         out("sepia.png"))
-    save_image(gamma_correction(img, 2.2),         out("gamma_2_2.png"))
-    save_image(apply_kernel(img, K_SHARPEN),       out("sharpen.png"))
-    save_image(apply_kernel(img, K_EDGE_SIMPLE),   out("edges.png"))
-    # Optional:
-    # save_image(adjust_brightness(img, 20),       out("bright_plus20.png"))
-    # save_image(adjust_contrast(img, 1.3),        out("contrast_1_3.png"))
-
+    # Outputs are a filter graph: shared steps (threshold's grayscale) run
+    # once, intermediates are freed after their last use, and finished
+    # images encode on background threads while the next filters run.
+    wanted = output_graph(img, outputs)
+    del img
+    print(f"Computing {len(graph.plan(wanted)[0]) - 1} filter step(s) "
+          f"for {len(wanted)} output(s)")
+    pool = None
+    if cli.workers > 1:
+        # Fork the workers now, before any encode/graph thread exists: a
+        # fork while another thread holds a lock can hang the child.
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(cli.workers)
+        pool.submit(int).result()
+
+    def run(fn, *args, **kwargs):
+        return run_filter(fn, *args, workers=cli.workers, executor=pool,
+                          **kwargs)
+
+    save_fn, cache = save_image, None
+    if cli.result_cache:
+        from result_cache import ResultCache
+
+        cache = ResultCache(disk_root=cli.result_cache,
+                            disk_max_bytes=cli.result_cache_mb << 20)
+        run, save_fn = cache.cached(run), cache.saver(save_image)
+
+    with OutputQueue(save_fn, workers=cli.encode_threads) as outq:
+        for name, result in graph.evaluate(wanted, cli.graph_threads, run):
+            outq.submit(result, out(name), profile=cli.encode_profile)
+    if pool:
+        pool.shutdown()
+    print(outq.report())
+    if cache:
+        print(cache.report())
     print(f"All outputs saved to: {OUTPUT_DIR}")
+    profiling.finish(cli.profile_out, cli.profile_format)
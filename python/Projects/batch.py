@@ -0,0 +1,388 @@
+"""Batch mode: many sources x a manifest of outputs, over a process pool.
+
+    python Photo_Editor_2.0.py --batch photos/ "scans/**/*.jpg" @list.txt \\
+        --manifest nightly.toml --jobs 8
+
+Sources are files, directories (walked recursively for image files), globs
+(``**`` allowed) or ``@file`` lists with one source per line (``@-`` reads
+stdin). A manifest (JSON, or TOML on Python 3.11+) says what to write:
+
+    output_dir = "nightly"                        # default: the editor's
+    pattern = "{relpath}/{stem}_{output}.{format}"
+    format = "png"
+
+    [[outputs]]
+    name = "gamma"
+    filter = "gamma_correction"
+    args = [2.2]
+    save = {profile = "speed"}                    # options for save_image
+
+    [[outputs]]
+    name = "sharp"
+    filter = "apply_kernel"
+    args = ["K_SHARPEN"]                          # editor constants by name
+
+``filter`` may be omitted to copy the source. Pattern fields: stem, relpath
+(directory below the input directory or the fixed part of a glob, "" for
+plain files), output, format.
+
+An output is skipped when it is newer than both its source and the
+manifest file (``force`` rebuilds everything). Every finished source is
+appended to a JSON-lines journal in the output directory, so a rerun after a
+crash skips finished sources without even checking their outputs. The
+journal also keeps the manifest signature (outputs, filters, arguments,
+formats and save options such as the encode profile): a source last built
+with a different one is rebuilt whatever the file times say. Each
+output is written to a temporary name and renamed, so an interrupted write
+never looks up to date.
+
+Workers take one source at a time and at most ``max_in_flight`` sources are
+queued, so memory stays at about one image per worker.
+"""
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+try:
+    import tomllib
+except ImportError:   # Python < 3.11: JSON manifests only
+    tomllib = None
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".webp", ".bmp", ".gif", ".tif",
+              ".tiff")
+DEFAULT_PATTERN = "{relpath}/{stem}_{output}.{format}"
+JOURNAL_NAME = ".batch_journal.jsonl"
+
+Source = namedtuple("Source", "path relpath")
+Output = namedtuple("Output", "name fn args kwargs format save")
+Manifest = namedtuple("Manifest", "output_dir pattern outputs signature mtime")
+
+
+# -----------------------------------------------------------------------------
+# Sources
+# -----------------------------------------------------------------------------
+
+def _is_glob(spec):
+    return any(c in spec for c in "*?[")
+
+
+def _glob_root(spec):
+    """Directory part of a glob before its first wildcard."""
+    parts = spec.replace("\\", "/").split("/")
+    fixed = []
+    for part in parts[:-1]:
+        if _is_glob(part):
+            break
+        fixed.append(part)
+    return "/".join(fixed) or "."
+
+
+def expand_sources(specs):
+    """Yield Source(path, relpath) for files, directories, globs and
+    ``@list`` files, each path once."""
+    seen = set()
+
+    def emit(path, relpath=""):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            yield Source(path, relpath)
+
+    for spec in specs:
+        if spec.startswith("@"):
+            if spec == "@-":
+                lines = sys.stdin.read().splitlines()
+            else:
+                with open(spec[1:], encoding="utf-8") as fh:
+                    lines = fh.read().splitlines()
+            lines = [ln.strip() for ln in lines]
+            lines = [ln for ln in lines if ln and not ln.startswith("#")]
+            for source in expand_sources(lines):
+                yield from emit(*source)
+        elif os.path.isdir(spec):
+            for root, dirs, files in os.walk(spec):
+                dirs.sort()
+                rel = os.path.relpath(root, spec)
+                for name in sorted(files):
+                    if name.lower().endswith(IMAGE_EXTS):
+                        yield from emit(os.path.join(root, name),
+                                        "" if rel == "." else rel)
+        elif _is_glob(spec):
+            root = _glob_root(spec)
+            for path in sorted(glob.glob(spec, recursive=True)):
+                if os.path.isfile(path):
+                    rel = os.path.dirname(os.path.relpath(path, root))
+                    yield from emit(path, rel)
+        else:
+            yield from emit(spec)
+
+
+# -----------------------------------------------------------------------------
+# Manifest
+# -----------------------------------------------------------------------------
+
+def _signature(pattern, outputs):
+    spec = [pattern] + [[o.name, getattr(o.fn, "__name__", None),
+                         o.args, o.kwargs, o.format, o.save]
+                        for o in outputs]
+    blob = json.dumps(spec, sort_keys=True, default=repr).encode()
+    return hashlib.sha256(blob).hexdigest()[:16]
+
+
+def make_manifest(outputs, output_dir=None, pattern=DEFAULT_PATTERN,
+                  mtime=0.0, save=None):
+    """``save``: default save options (e.g. the encode profile) under each
+    output's own."""
+    outputs = [o._replace(save=dict(save or {}, **o.save)) for o in outputs]
+    names = [o.name for o in outputs]
+    if len(set(names)) != len(names):
+        raise ValueError("Output names in a manifest must be unique")
+    return Manifest(output_dir, pattern, outputs,
+                    _signature(pattern, outputs), mtime)
+
+
+def load_manifest(path, filters, constants=None, save=None):
+    """Read a JSON/TOML manifest. ``filters`` maps filter names to
+    functions; string args found in ``constants`` are replaced by them.
+    ``save`` as for make_manifest."""
+    if path.lower().endswith(".toml"):
+        if tomllib is None:
+            raise ValueError("TOML manifests need Python 3.11+; use JSON")
+        with open(path, "rb") as fh:
+            spec = tomllib.load(fh)
+    else:
+        with open(path, encoding="utf-8") as fh:
+            spec = json.load(fh)
+    outputs = parse_outputs(spec, filters, constants)
+    if not outputs:
+        raise ValueError(f"Manifest {path} lists no outputs")
+    return make_manifest(outputs, spec.get("output_dir"),
+                         spec.get("pattern", DEFAULT_PATTERN),
+                         os.path.getmtime(path), save)
+
+
+def parse_outputs(spec, filters, constants=None):
+    """Outputs of a manifest dict (``{"format": ..., "outputs": [...]}``);
+    also used for server requests."""
+    constants = constants or {}
+    default_format = spec.get("format", "png")
+    outputs = []
+    for entry in spec.get("outputs", []):
+        name = entry.get("name")
+        if not name:
+            raise ValueError(f"Manifest output without a name: {entry}")
+        fname = entry.get("filter")
+        if fname and fname not in filters:
+            raise ValueError(f"Unknown filter {fname!r} in output {name!r}; "
+                             f"choose from {sorted(filters)}")
+        args = tuple(constants.get(a, a) if isinstance(a, str) else a
+                     for a in entry.get("args", []))
+        outputs.append(Output(name, filters[fname] if fname else None, args,
+                              dict(entry.get("kwargs", {})),
+                              entry.get("format", default_format),
+                              dict(entry.get("save", {}))))
+    return outputs
+
+
+def output_path(out_dir, pattern, source, output):
+    stem = os.path.splitext(os.path.basename(source.path))[0]
+    rel = pattern.format(stem=stem, relpath=source.relpath,
+                         output=output.name, format=output.format)
+    return os.path.normpath(os.path.join(out_dir, rel.lstrip("/\\")))
+
+
+# -----------------------------------------------------------------------------
+# Journal
+# -----------------------------------------------------------------------------
+
+class Journal:
+    """Append-only JSON-lines record of finished sources."""
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        try:
+            with open(path, encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue   # torn last line after a crash
+                    self.entries[entry["source"]] = entry
+        except OSError:
+            pass
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def is_done(self, key, signature, st):
+        entry = self.entries.get(key)
+        return (entry is not None and entry["status"] == "done"
+                and entry["sig"] == signature
+                and entry["mtime_ns"] == st.st_mtime_ns
+                and entry["size"] == st.st_size)
+
+    def record(self, key, signature, st, status, error=None):
+        entry = {"source": key, "sig": signature, "status": status,
+                 "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+        if error:
+            entry["error"] = error
+        self.entries[key] = entry
+        self._fh.write(json.dumps(entry) + "\n")
+        self._fh.flush()
+
+    def close(self):
+        self._fh.close()
+
+
+# -----------------------------------------------------------------------------
+# Worker
+# -----------------------------------------------------------------------------
+
+def process_source(path, outputs, load_fn, save_fn):
+    """Load ``path`` once and write each (out_path, fn, args, kwargs,
+    save_options). Runs in a worker process; console output is captured.
+    Returns (pixels, written, errors)."""
+    written, errors = 0, []
+    with contextlib.redirect_stdout(io.StringIO()):
+        img = load_fn(path)
+        if img is None:
+            return 0, 0, ["could not load image"]
+        for out_path, fn, args, kwargs, save in outputs:
+            try:
+                result = img if fn is None else fn(img, *args, **kwargs)
+                os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
+                root, ext = os.path.splitext(out_path)
+                tmp = f"{root}.part{ext}"
+                if save_fn(result, tmp, **save) is None:
+                    raise OSError("save failed")
+                os.replace(tmp, out_path)
+                written += 1
+            except Exception as e:
+                errors.append(f"{os.path.basename(out_path)}: {e}")
+            result = None
+    return img.width * img.height, written, errors
+
+
+# -----------------------------------------------------------------------------
+# Driver
+# -----------------------------------------------------------------------------
+
+class BatchReport:
+    def __init__(self):
+        self.sources = 0       # sources processed by a worker
+        self.skipped = 0       # sources with nothing to do
+        self.failed = []       # (source, error)
+        self.outputs = 0       # files written
+        self.pixels = 0
+        self.elapsed = 0.0
+
+    def summary(self):
+        secs = max(self.elapsed, 1e-9)
+        msg = (f"Batch: {self.sources} image(s) processed, {self.skipped} "
+               f"up to date, {len(self.failed)} failed; {self.outputs} "
+               f"output(s) written in {self.elapsed:.1f}s "
+               f"({self.sources / secs:.1f} img/s, "
+               f"{self.pixels / 1e6 / secs:.1f} MP/s, "
+               f"{self.outputs / secs:.1f} outputs/s)")
+        return msg
+
+
+def _up_to_date(out_path, newest_input):
+    try:
+        return os.path.getmtime(out_path) >= newest_input
+    except OSError:
+        return False
+
+
+def run_batch(sources, manifest, load_fn, save_fn, out_dir, jobs=None,
+              max_in_flight=None, journal_path=None, force=False,
+              progress_every=100):
+    """Process every source; returns a BatchReport."""
+    jobs = max(1, int(jobs or os.cpu_count() or 1))
+    max_in_flight = max_in_flight or 2 * jobs
+    journal = Journal(journal_path or os.path.join(out_dir, JOURNAL_NAME))
+    report = BatchReport()
+    started = time.perf_counter()
+
+    def plan():
+        """Yield (key, stat, todo) for sources with outputs to write."""
+        for source in sources:
+            key = os.path.abspath(source.path)
+            try:
+                st = os.stat(source.path)
+            except OSError as e:
+                report.failed.append((source.path, str(e)))
+                print(f"Failed {source.path}: {e}")
+                continue
+            paths = [(output_path(out_dir, manifest.pattern, source, o), o)
+                     for o in manifest.outputs]
+            if not force and journal.is_done(key, manifest.signature, st) \
+                    and all(os.path.exists(p) for p, _ in paths):
+                report.skipped += 1
+                continue
+            # Built with other outputs or save options: file times say
+            # nothing (the default manifest has no file at all)
+            entry = journal.entries.get(key)
+            rebuild = force or (entry is not None
+                                and entry["sig"] != manifest.signature)
+            newest = max(st.st_mtime, manifest.mtime)
+            todo = [(p, o.fn, o.args, o.kwargs, o.save) for p, o in paths
+                    if rebuild or not _up_to_date(p, newest)]
+            if not todo:
+                journal.record(key, manifest.signature, st, "done")
+                report.skipped += 1
+                continue
+            yield source.path, key, st, todo
+
+    def finish(path, key, st, outcome):
+        pixels, written, errors = outcome
+        report.sources += 1
+        report.pixels += pixels
+        report.outputs += written
+        if errors:
+            report.failed.append((path, "; ".join(errors)))
+            print(f"Failed {path}: {'; '.join(errors)}")
+        journal.record(key, manifest.signature, st,
+                       "failed" if errors else "done", "; ".join(errors))
+        if progress_every and report.sources % progress_every == 0:
+            rate = report.sources / (time.perf_counter() - started)
+            print(f"... {report.sources} image(s), {rate:.1f} img/s")
+
+    try:
+        if jobs == 1:
+            for path, key, st, todo in plan():
+                finish(path, key, st,
+                       process_source(path, todo, load_fn, save_fn))
+        else:
+            with ProcessPoolExecutor(jobs) as pool:
+                pending = {}
+                work = plan()
+                for item in work:
+                    pending[pool.submit(process_source, item[0], item[3],
+                                        load_fn, save_fn)] = item
+                    while len(pending) >= max_in_flight:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            _collect(future, pending.pop(future), finish)
+                for future in list(pending):
+                    _collect(future, pending.pop(future), finish)
+    finally:
+        journal.close()
+        report.elapsed = time.perf_counter() - started
+    return report
+
+
+def _collect(future, item, finish):
+    path, key, st, _ = item
+    try:
+        outcome = future.result()
+    except Exception as e:   # worker crashed or job not picklable
+        outcome = (0, 0, [str(e)])
+    finish(path, key, st, outcome)
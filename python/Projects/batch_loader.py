@@ -0,0 +1,182 @@
+"""Concurrent loading of many sources over keep-alive connections.
+
+``ConnectionPool.urlopen`` is a drop-in for ``urllib.request.urlopen`` that
+keeps one stack of idle ``http.client`` connections per host, so repeated
+requests to the same server skip the TCP/TLS handshake. ``load_many`` runs a
+loader over thousands of sources on a thread pool with bounded in-flight
+work and yields results as they complete; decoding in one thread overlaps
+downloads in the others (Pillow and socket reads release the GIL).
+"""
+import http.client
+import io
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+from urllib.request import Request
+
+MAX_REDIRECTS = 5
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+
+BatchResult = namedtuple("BatchResult", "source image error")
+
+
+class PooledResponse:
+    """Streaming response with the parts of urllib's interface we use.
+
+    The connection goes back to the pool once the body has been read to
+    the end; closing early drops the connection instead.
+    """
+
+    def __init__(self, pool, key, conn, resp, url):
+        self._pool, self._key, self._conn, self._resp = pool, key, conn, resp
+        self.status = resp.status
+        self.reason = resp.reason
+        self.headers = resp.msg
+        self.url = url
+
+    def read(self, amt=None):
+        data = self._resp.read(amt)
+        if (amt is None or not data) and self._conn is not None:
+            self._release()
+        return data
+
+    def _release(self):
+        conn, self._conn = self._conn, None
+        if self._resp.isclosed() and not self._resp.will_close:
+            self._pool._put(*self._key, conn)
+        else:
+            conn.close()
+
+    def geturl(self):
+        return self.url
+
+    def close(self):
+        if self._conn is not None:
+            self._release()
+        self._resp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ConnectionPool:
+    """Per-host keep-alive HTTP(S) connections shared by worker threads."""
+
+    def __init__(self, max_per_host=8):
+        self.max_per_host = max_per_host
+        self.opened = 0     # new TCP connections
+        self.reused = 0     # requests served on an idle connection
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _get(self, scheme, netloc, timeout):
+        key = (scheme, netloc)
+        with self._lock:
+            stack = self._idle.get(key)
+            if stack:
+                self.reused += 1
+                conn = stack.pop()
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            self.opened += 1
+        cls = http.client.HTTPSConnection if scheme == "https" \
+            else http.client.HTTPConnection
+        return cls(netloc, timeout=timeout), False
+
+    def _put(self, scheme, netloc, conn):
+        with self._lock:
+            stack = self._idle.setdefault((scheme, netloc), [])
+            if len(stack) < self.max_per_host:
+                stack.append(conn)
+                return
+        conn.close()
+
+    def _request_once(self, url, headers, timeout):
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+        for attempt in (0, 1):
+            conn, reused = self._get(parts.scheme, parts.netloc, timeout)
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+            except (http.client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                conn.close()
+                if reused and attempt == 0:
+                    continue   # server dropped an idle connection: retry
+                raise
+            except BaseException:
+                conn.close()
+                raise
+            return PooledResponse(self, (parts.scheme, parts.netloc), conn,
+                                  resp, url)
+
+    def urlopen(self, req, timeout=15):
+        """GET a URL or Request; follows redirects, raises HTTPError for
+        304 and error statuses, like ``urllib.request.urlopen``."""
+        if not isinstance(req, Request):
+            req = Request(req)
+        url = req.full_url
+        headers = dict(req.header_items())
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = self._request_once(url, headers, timeout)
+            if resp.status < 300:
+                return resp
+            status, reason, msg = resp.status, resp.reason, resp.headers
+            body = resp.read()   # drain so the connection can be reused
+            if status in REDIRECT_CODES and msg.get("Location"):
+                url = urljoin(url, msg["Location"])
+                continue
+            raise HTTPError(url, status, reason, msg, io.BytesIO(body))
+        raise HTTPError(url, status, "Too many redirects", msg, None)
+
+    def close(self):
+        with self._lock:
+            stacks, self._idle = list(self._idle.values()), {}
+        for stack in stacks:
+            for conn in stack:
+                conn.close()
+
+
+def load_many(sources, load_one, workers=16, max_in_flight=None):
+    """Run ``load_one(source)`` for every source on ``workers`` threads.
+
+    Yields BatchResult(source, image, error) in completion order. A loader
+    returning None (the usual failure signal) or raising gives image=None;
+    the exception text, if any, is in ``error``.
+    """
+    workers = max(1, int(workers))
+    max_in_flight = max_in_flight or 2 * workers
+    sources = iter(sources)
+    with ThreadPoolExecutor(workers, thread_name_prefix="load") as pool:
+        pending = {}
+
+        def refill():
+            for source in sources:
+                pending[pool.submit(load_one, source)] = source
+                if len(pending) >= max_in_flight:
+                    break
+
+        refill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = pending.pop(future)
+                try:
+                    image = future.result()
+                    error = None if image is not None else "not loaded"
+                except Exception as e:
+                    image, error = None, str(e)
+                    print(f"Error loading {source}: {e}")
+                yield BatchResult(source, image, error)
+            refill()
@@ -0,0 +1,421 @@
+"""Offline benchmark suite for Photo_Editor_2.0.
+
+    python bench.py                        # full run, 256^2 .. 4096^2
+    python bench.py --sizes 256,1024 --json run.json
+    python bench.py --save-baseline        # store this run as the baseline
+    python bench.py --only kernel --backend python
+
+Every filter, apply_kernel with each preset, scale_image, load_image,
+save_image and each encoder profile run on deterministic images built in
+memory: a gradient/fractal image and the upscaled ``build_smiley`` fixture.
+Each case reports the best of several timings as megapixels of *input* per
+second, plus peak memory from tracemalloc (Python and NumPy allocations)
+and, on Linux, peak RSS growth (which also sees Pillow's buffers). Encoder
+cases (``encode[png,size,gray]``) also report the encoded size, so the
+time/bytes trade-off of each profile is visible side by side. Every case
+reports the image buffers it creates per call ("bufs"); the ``chain[...]``
+cases run the same 10-filter chain with a new image per step, through
+run_chain's two ping-pong buffers, and in place on one working copy. The
+rank filters (median, 90th percentile, dilate) run at radii 1, 5 and 15,
+so a cost that grows with the radius shows up side by side.
+
+If a baseline JSON exists (``--baseline``, default bench_baseline.json next
+to this file) the run is compared against it and the script exits with
+status 1 when a case is slower or bigger than the thresholds allow.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from PIL import Image
+
+import np_backend
+from chain import run_chain
+from encode import PROFILES, encode_image
+from photo_core.editor import load_editor
+from pixel_buffer import allocations, from_pil
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = (256, 512, 1024, 2048, 4096)
+DEFAULT_BASELINE = os.path.join(HERE, "bench_baseline.json")
+RADII = (1, 5, 15)      # window radii of the rank filter cases
+MB = 1024 * 1024
+
+
+# -----------------------------------------------------------------------------
+# Fixtures
+# -----------------------------------------------------------------------------
+
+def gradient_image(size):
+    """Deterministic size x size test image: gradients plus fractal detail,
+    so thresholds, kernels and codecs all see varied content."""
+    red = Image.linear_gradient("L").resize((size, size))
+    green = Image.radial_gradient("L").resize((size, size))
+    blue = Image.effect_mandelbrot((size, size), (-2.0, -1.25, 0.75, 1.25),
+                                   64)
+    return from_pil(Image.merge("RGB", (red, green, blue)))
+
+
+def smiley_image(editor, size):
+    """The 8x8 smiley fixture upscaled to size x size."""
+    return editor.scale_image(editor.build_smiley(), size / 8)
+
+
+IMAGES = {
+    "gradient": lambda editor, size: gradient_image(size),
+    "smiley": smiley_image,
+}
+
+
+def chain_steps(editor):
+    """The 10-step chain of the chain[...] cases."""
+    e = editor
+    return [(e.adjust_brightness, (20,)), (e.adjust_contrast, (1.3,)),
+            (e.gamma_correction, (2.2,)), (e.apply_kernel, (e.K_SHARPEN,)),
+            (e.swap_red_blue, ()), (e.posterize_keep_bits, (4,)),
+            (e.apply_kernel, (e.K_BLUR_BOX,)), (e.sepia, ()),
+            (e.invert_colors, ()), (e.to_grayscale, ())]
+
+
+def run_naive(img, steps):
+    for fn, args in steps:
+        img = fn(img, *args)
+    return img
+
+
+def build_cases(editor, tmpdir):
+    """(name, fn(image, tag) -> result, setup(image, tag)) for every case.
+
+    ``tag`` is unique per image/size so file cases do not collide.
+    """
+    e = editor
+    steps = chain_steps(editor)
+    cases = [
+        ("to_grayscale", lambda img, tag: e.to_grayscale(img)),
+        ("invert_colors", lambda img, tag: e.invert_colors(img)),
+        ("remove_green", lambda img, tag: e.remove_green(img)),
+        ("swap_red_blue", lambda img, tag: e.swap_red_blue(img)),
+        ("posterize_keep_bits", lambda img, tag: e.posterize_keep_bits(img)),
+        ("threshold_bw", lambda img, tag: e.threshold_bw(img, 128)),
+        ("gamma_correction", lambda img, tag: e.gamma_correction(img, 2.2)),
+        ("sepia", lambda img, tag: e.sepia(img)),
+        ("adjust_brightness", lambda img, tag: e.adjust_brightness(img, 20)),
+        ("adjust_contrast", lambda img, tag: e.adjust_contrast(img, 1.3)),
+        # Histogram-based modes; invalidate() so each run pays for the
+        # histogram as well as the LUT pass
+        ("threshold_bw[otsu]",
+         lambda img, tag: (img.invalidate(), e.threshold_bw(img, "otsu"))),
+        ("adjust_contrast[auto]",
+         lambda img, tag: (img.invalidate(), e.adjust_contrast(img, "auto"))),
+        ("equalize", lambda img, tag: (img.invalidate(), e.equalize(img))),
+        ("apply_kernel[blur_box]",
+         lambda img, tag: e.apply_kernel(img, e.K_BLUR_BOX)),
+        ("apply_kernel[sharpen]",
+         lambda img, tag: e.apply_kernel(img, e.K_SHARPEN)),
+        ("apply_kernel[edge_simple]",
+         lambda img, tag: e.apply_kernel(img, e.K_EDGE_SIMPLE)),
+        # Rank filters: the cost per pixel should not grow with the radius
+        *[(f"median_filter[r{r}]",
+           lambda img, tag, r=r: e.median_filter(img, r)) for r in RADII],
+        *[(f"percentile_filter[p90,r{r}]",
+           lambda img, tag, r=r: e.percentile_filter(img, r, 90))
+          for r in RADII],
+        *[(f"dilate[r{r}]", lambda img, tag, r=r: e.dilate(img, r))
+          for r in RADII],
+        ("scale_image[x0.5]", lambda img, tag: e.scale_image(img, 0.5)),
+        ("scale_image[x2]", lambda img, tag: e.scale_image(img, 2)),
+        ("scale_image[x0.5,bilinear]",
+         lambda img, tag: e.scale_image(img, 0.5, "bilinear")),
+        ("chain[10,new]", lambda img, tag: run_naive(img, steps)),
+        ("chain[10,pingpong]", lambda img, tag: run_chain(img, steps)),
+        ("chain[10,inplace]",
+         lambda img, tag: run_chain(img.copy(), steps, inplace=True)),
+    ]
+    cases = [(name, fn, None) for name, fn in cases]
+
+    def path(tag, ext):
+        return os.path.join(tmpdir, f"{tag}.{ext}")
+
+    for ext in ("png", "jpg"):
+        cases.append((f"save_image[{ext}]",
+                      lambda img, tag, ext=ext: e.save_image(
+                          img, path(tag, ext)),
+                      None))
+        cases.append((f"load_image[{ext}]",
+                      lambda img, tag, ext=ext: e.load_image(path(tag, ext)),
+                      lambda img, tag, ext=ext: e.save_image(
+                          img, path(tag, ext))))
+
+    # Encoder profiles in memory: colour in every format, plus the gray
+    # and black-and-white outputs that are written as L / 1-bit
+    variants = {"rgb": None, "gray": e.to_grayscale, "bw": e.threshold_bw}
+    derived = {}
+
+    def derive(img, tag, variant):
+        fn = variants[variant]
+        derived[tag, variant] = img if fn is None else fn(img)
+
+    for variant, formats in (("rgb", ("png", "jpeg", "webp")),
+                             ("gray", ("png",)), ("bw", ("png",))):
+        for fmt in formats:
+            for profile in PROFILES:
+                label = ",".join([fmt, profile] +
+                                 ([variant] if variant != "rgb" else []))
+                cases.append((
+                    f"encode[{label}]",
+                    lambda img, tag, v=variant, f=fmt, p=profile:
+                        encode_image(derived[tag, v], f, p),
+                    lambda img, tag, v=variant: derive(img, tag, v)))
+    return cases
+
+
+# -----------------------------------------------------------------------------
+# Measurement
+# -----------------------------------------------------------------------------
+
+def _proc_status(field):
+    try:
+        with open("/proc/self/status") as fh:
+            for line in fh:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset VmHWM so it tracks this case only (Linux); False if not."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure_memory(fn, *args):
+    """(tracemalloc peak, RSS growth) in bytes for one call of ``fn``."""
+    rss_ok = _reset_peak_rss()
+    rss0 = _proc_status("VmRSS")
+    tracemalloc.start()
+    try:
+        fn(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    hwm = _proc_status("VmHWM")
+    rss = hwm - rss0 if rss_ok and hwm and rss0 else None
+    return peak, rss
+
+
+def time_case(fn, args, repeat, budget):
+    """Best and median seconds over 3..``repeat`` calls, the number of
+    calls, image buffers created per call and the last result; repeats
+    stop once ``budget`` seconds have been spent."""
+    runs = []
+    buffers = allocations()[0]
+    min_runs = min(3, repeat)
+    result = None
+    while len(runs) < repeat and (len(runs) < min_runs or
+                                  sum(runs) < budget):
+        result = None
+        t0 = time.perf_counter()
+        result = fn(*args)
+        runs.append(time.perf_counter() - t0)
+    buffers = (allocations()[0] - buffers) / len(runs)
+    runs.sort()
+    return runs[0], runs[len(runs) // 2], len(runs), buffers, result
+
+
+def run_suite(editor, sizes, images, only=None, repeat=50, budget=0.5,
+              memory=True, log=print):
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cases = build_cases(editor, tmpdir)
+        if only:
+            cases = [c for c in cases if any(o in c[0] for o in only)]
+        for size in sizes:
+            for kind in images:
+                img = IMAGES[kind](editor, size)
+                tag = f"{kind}_{size}"
+                mpix = size * size / 1e6
+                for name, fn, setup in cases:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        if setup is not None:
+                            setup(img, tag)
+                        best, median, n, bufs, result = time_case(
+                            fn, (img, tag), repeat, budget)
+                        peak, rss = (measure_memory(fn, img, tag) if memory
+                                     else (None, None))
+                    row = {
+                        "case": name, "image": kind, "size": size,
+                        "runs": n, "best_s": best, "median_s": median,
+                        "mpix_per_s": mpix / best if best else None,
+                        "buffers": bufs,
+                        "peak_alloc_mb": None if peak is None else peak / MB,
+                        "peak_rss_mb": None if rss is None else rss / MB,
+                        "out_bytes": len(result) if isinstance(
+                            result, (bytes, bytearray)) else None,
+                    }
+                    result = None
+                    results.append(row)
+                    log(format_row(row))
+                del img
+    return results
+
+
+# -----------------------------------------------------------------------------
+# Reporting / baseline comparison
+# -----------------------------------------------------------------------------
+
+def _mb(value):
+    return f"{'-':>8}" if value is None else f"{value:8.1f}"
+
+
+def format_row(row):
+    line = (f"{row['case']:<28} {row['image']:<8} {row['size']:>5}^2 "
+            f"{row['mpix_per_s']:9.1f} MP/s  best {row['best_s'] * 1e3:9.2f}"
+            f" ms  bufs {row['buffers']:4.1f}"
+            f"  alloc {_mb(row['peak_alloc_mb'])} MB"
+            f"  rss {_mb(row['peak_rss_mb'])} MB")
+    if row.get("out_bytes") is not None:
+        line += f"  out {row['out_bytes'] / 1e3:9.1f} kB"
+    return line
+
+
+def environment(editor, backend):
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": np_backend.np.__version__ if np_backend.AVAILABLE else None,
+        "pillow": Image.__version__,
+        "backend": backend,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, max_slowdown=0.15, max_growth=0.20,
+            slack_ms=1.0, slack_mb=1.0):
+    """Return (regressions, lines). A case regresses when its throughput
+    drops by more than ``max_slowdown`` (and ``slack_ms``, which keeps
+    timer noise on tiny cases out), its peak allocation grows by more
+    than ``max_growth`` (and ``slack_mb``) or it creates more image
+    buffers per call."""
+    old = {(r["case"], r["image"], r["size"]): r
+           for r in baseline.get("results", [])}
+    regressions, lines = [], []
+    for row in results:
+        ref = old.get((row["case"], row["image"], row["size"]))
+        if ref is None or not ref.get("mpix_per_s"):
+            continue
+        speed = row["mpix_per_s"] / ref["mpix_per_s"]
+        problems = []
+        if speed < 1 - max_slowdown and \
+                row["best_s"] - ref["best_s"] > slack_ms / 1e3:
+            problems.append(f"throughput x{speed:.2f}")
+        new_mem, old_mem = row.get("peak_alloc_mb"), ref.get("peak_alloc_mb")
+        if new_mem is not None and old_mem is not None and \
+                new_mem > old_mem * (1 + max_growth) + slack_mb:
+            problems.append(f"alloc {old_mem:.1f} -> {new_mem:.1f} MB")
+        new_bufs, old_bufs = row.get("buffers"), ref.get("buffers")
+        if new_bufs is not None and old_bufs is not None and \
+                new_bufs > old_bufs + 0.5:
+            problems.append(f"buffers {old_bufs:.1f} -> {new_bufs:.1f}")
+        new_out, old_out = row.get("out_bytes"), ref.get("out_bytes")
+        if new_out is not None and old_out is not None and \
+                new_out > old_out * (1 + max_growth):
+            problems.append(f"output {old_out} -> {new_out} bytes")
+        key = f"{row['case']} {row['image']} {row['size']}^2"
+        lines.append(f"{key:<45} x{speed:5.2f}"
+                     + ("  REGRESSION: " + ", ".join(problems)
+                        if problems else ""))
+        if problems:
+            regressions.append((key, problems))
+    return regressions, lines
+
+
+# -----------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+
+def main(argv=None):
+    editor = load_editor()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated square sizes")
+    parser.add_argument("--images", default=",".join(IMAGES),
+                        help=f"comma-separated subset of {tuple(IMAGES)}")
+    parser.add_argument("--only", default="",
+                        help="comma-separated substrings of case names")
+    parser.add_argument("--backend", default="auto", choices=editor.BACKENDS,
+                        help="filter backend (default: auto)")
+    parser.add_argument("--repeat", type=int, default=50,
+                        help="max timed runs per case (best is kept)")
+    parser.add_argument("--budget", type=float, default=0.5,
+                        help="stop repeating a case after this many seconds")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="skip the extra traced run per case")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store this run as the baseline")
+    parser.add_argument("--max-slowdown", type=float, default=0.15,
+                        help="allowed throughput drop, default 0.15 (15%%)")
+    parser.add_argument("--max-growth", type=float, default=0.20,
+                        help="allowed peak allocation growth, default 0.20")
+    parser.add_argument("--slack-ms", type=float, default=1.0,
+                        help="ignore slowdowns smaller than this, default 1")
+    cli = parser.parse_args(argv)
+
+    editor.set_backend(cli.backend)
+    sizes = [int(s) for s in cli.sizes.split(",") if s]
+    images = [i for i in cli.images.split(",") if i]
+    for kind in images:
+        if kind not in IMAGES:
+            parser.error(f"unknown image {kind!r}")
+    only = [o for o in cli.only.split(",") if o]
+
+    results = run_suite(editor, sizes, images, only, cli.repeat, cli.budget,
+                        not cli.no_memory)
+    report = {"environment": environment(editor, cli.backend),
+              "results": results}
+
+    if cli.json:
+        with open(cli.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=1)
+        print(f"Results written to {cli.json}")
+
+    status = 0
+    if cli.save_baseline:
+        with open(cli.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=1)
+        print(f"Baseline saved to {cli.baseline}")
+    elif os.path.isfile(cli.baseline):
+        with open(cli.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+        regressions, lines = compare(results, baseline, cli.max_slowdown,
+                                     cli.max_growth, cli.slack_ms)
+        print(f"\nCompared with {cli.baseline} "
+              f"({baseline.get('environment', {}).get('time', '?')}):")
+        print("\n".join(lines))
+        if regressions:
+            print(f"{len(regressions)} regression(s).")
+            status = 1
+        else:
+            print("No regressions.")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,222 @@
+"""Cold-start benchmark for the command-line entry points.
+
+    python bench_startup.py                    # compare with the baseline
+    python bench_startup.py --save-baseline
+    python bench_startup.py --only terminal --runs 15
+
+Each case starts a fresh interpreter with ``-X importtime`` and runs one
+entry point end to end: the smiley, a small local PNG, or (editor only)
+``--help``, which parses arguments and touches no image. The other
+editor cases pass ``--only original``, so filter work stays out of the
+numbers. Outputs go to a temporary folder (PHOTO_EDITOR_OUTPUT_DIR). The
+report gives the best wall time and best total import time of several
+runs (noise only ever adds time), and the slowest top-level imports.
+
+The run fails (exit status 1) when:
+  - a case imports a module from FORBIDDEN. The network stack, the page
+    parser and the pool/batch machinery must load on first use only, and
+    a run that touches no image (editor-help) must not load Pillow or
+    NumPy;
+  - import time or wall time grows past the thresholds, compared with the
+    baseline (bench_startup_baseline.json next to this file).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "bench_startup_baseline.json")
+EDITOR = "Photo_Editor_2.0.py"
+TERMINAL = "terminal_photoshop.py"
+
+# name: (script, arguments; "{image}" is the local test image)
+CASES = {
+    "editor-help": (EDITOR, ["--help"]),
+    "editor-smiley": (EDITOR, ["s", "--only", "original"]),
+    "editor-file": (EDITOR, ["{image}", "--only", "original"]),
+    "terminal-smiley": (TERMINAL, ["s"]),
+    "terminal-file": (TERMINAL, ["{image}"]),
+}
+
+# Modules that only URL sources, --batch, --workers or --result-cache need
+FORBIDDEN = (
+    "urllib.request", "http.client", "ssl", "email.parser", "html.parser",
+    "concurrent.futures.process", "multiprocessing.shared_memory",
+    "photo_core.net", "http_cache", "page_meta", "batch_loader",
+    "stream_decode", "batch", "result_cache",
+)
+# ... per case: the terminal tool never needs NumPy, and nothing is decoded
+# or encoded without an image
+FORBIDDEN_EXTRA = {
+    "editor-help": ("PIL", "numpy"),
+    "terminal-smiley": ("numpy",),
+    "terminal-file": ("numpy",),
+}
+
+
+# -----------------------------------------------------------------------------
+# Measurement
+# -----------------------------------------------------------------------------
+
+def parse_importtime(stderr):
+    """({module: cumulative seconds} for top-level imports, every module
+    imported) from ``-X importtime`` output."""
+    top, names = {}, []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|", 2)
+        if not cumulative.strip().isdigit():
+            continue                     # the header line
+        names.append(name.strip())
+        if not name[1:].startswith(" "):
+            top[name.strip()] = int(cumulative) / 1e6
+    return top, names
+
+
+def run_case(script, args, root, env):
+    """(wall seconds, {top-level module: seconds}, modules) for one
+    cold start."""
+    cmd = [sys.executable, "-X", "importtime", os.path.join(root, script)]
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd + args, cwd=root, env=env,
+                          capture_output=True, text=True,
+                          stdin=subprocess.DEVNULL)
+    wall = time.perf_counter() - t0
+    if proc.returncode != 0:
+        raise RuntimeError(f"{script} {' '.join(args)} exited with "
+                           f"{proc.returncode}:\n{proc.stdout[-500:]}")
+    top, names = parse_importtime(proc.stderr)
+    return wall, top, names
+
+
+def measure(name, root, runs, tmpdir, image):
+    script, args = CASES[name]
+    args = [a.format(image=image) for a in args]
+    env = dict(os.environ, PHOTO_EDITOR_OUTPUT_DIR=tmpdir)
+    run_case(script, args, root, env)          # writes .pyc files
+    walls, imports, tops = [], [], []
+    for _ in range(runs):
+        wall, top, names = run_case(script, args, root, env)
+        walls.append(wall)
+        imports.append(sum(top.values()))
+        tops.append(top)
+    slowest = sorted(tops[-1].items(), key=lambda kv: -kv[1])[:4]
+    forbidden = FORBIDDEN + FORBIDDEN_EXTRA.get(name, ())
+    return {
+        "case": name, "runs": runs,
+        "wall_ms": min(walls) * 1e3,
+        "import_ms": min(imports) * 1e3,
+        "modules": len(names),
+        "slowest": [[m, round(s * 1e3, 1)] for m, s in slowest],
+        "forbidden": sorted(m for m in set(names) if m in forbidden),
+    }
+
+
+def format_row(row):
+    slowest = ", ".join(f"{m} {ms:.0f}" for m, ms in row["slowest"])
+    return (f"{row['case']:<16} wall {row['wall_ms']:7.1f} ms  "
+            f"imports {row['import_ms']:7.1f} ms  "
+            f"{row['modules']:4d} modules  [{slowest}]")
+
+
+def compare(results, baseline, max_slowdown=0.20, slack_ms=5.0):
+    """Return (regressions, lines); see the module docstring."""
+    old = {r["case"]: r for r in baseline.get("results", [])}
+    regressions, lines = [], []
+    for row in results:
+        problems = []
+        if row["forbidden"]:
+            problems.append("imports " + ", ".join(row["forbidden"]))
+        ref = old.get(row["case"])
+        parts = []
+        for field in ("import_ms", "wall_ms"):
+            if ref is None or not ref.get(field):
+                continue
+            new, base = row[field], ref[field]
+            parts.append(f"{field[:-3]} {base:.1f} -> {new:.1f} ms")
+            if new > base * (1 + max_slowdown) + slack_ms:
+                problems.append(f"{field[:-3]} x{new / base:.2f}")
+        lines.append(f"{row['case']:<16} " + ", ".join(parts)
+                     + ("  REGRESSION: " + "; ".join(problems)
+                        if problems else ""))
+        if problems:
+            regressions.append((row["case"], problems))
+    return regressions, lines
+
+
+# -----------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--only", default="",
+                        help="comma-separated substrings of case names")
+    parser.add_argument("--runs", type=int, default=9,
+                        help="cold starts per case (best is kept)")
+    parser.add_argument("--root", default=HERE,
+                        help="directory holding the entry points "
+                             "(default: this file's)")
+    parser.add_argument("--json", help="write results to this JSON file")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE,
+                        help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="store this run as the baseline")
+    parser.add_argument("--max-slowdown", type=float, default=0.20,
+                        help="allowed growth of import/wall time, default "
+                             "0.20 (20%%)")
+    parser.add_argument("--slack-ms", type=float, default=5.0,
+                        help="ignore growth smaller than this, default 5")
+    cli = parser.parse_args(argv)
+
+    only = [o for o in cli.only.split(",") if o]
+    names = [n for n in CASES if not only or any(o in n for o in only)]
+    results = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        image = os.path.join(tmpdir, "input.png")
+        Image.linear_gradient("L").resize((64, 64)).convert("RGB") \
+            .save(image)
+        for name in names:
+            row = measure(name, cli.root, cli.runs, tmpdir, image)
+            results.append(row)
+            print(format_row(row))
+    report = {"environment": {"python": platform.python_version(),
+                              "platform": platform.platform(),
+                              "time": time.strftime("%Y-%m-%dT%H:%M:%S")},
+              "results": results}
+
+    if cli.json:
+        with open(cli.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=1)
+        print(f"Results written to {cli.json}")
+
+    baseline = {}
+    if cli.save_baseline:
+        with open(cli.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=1)
+        print(f"Baseline saved to {cli.baseline}")
+    elif os.path.isfile(cli.baseline):
+        with open(cli.baseline, encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    regressions, lines = compare(results, baseline, cli.max_slowdown,
+                                 cli.slack_ms)
+    if baseline:
+        print(f"\nCompared with {cli.baseline}:")
+    for line in lines:
+        print(line)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Run a chain of filters through two reusable buffers (ping-pong).
+
+    steps = [(adjust_brightness, (20,)), (apply_kernel, (K_SHARPEN,)),
+             (sepia, ()), (gamma_correction, (2.2,), {"backend": "numpy"})]
+    result = run_chain(img, steps)
+
+Calling N filters one after another allocates N result images. run_chain
+allocates two and alternates between them through each filter's ``out=``:
+step 1 reads the source and writes A, step 2 reads A and writes B, step 3
+reads B and writes A, and so on. The source is never written, so peak
+memory stays near three image sizes (source, A and B, plus one filter's
+own temporaries) however long the chain is. With ``inplace=True`` every
+step overwrites the source instead; filters that stage their result
+(apply_kernel) share one scratch buffer, so at most one is allocated.
+
+Steps are (fn, args) or (fn, args, kwargs). A filter without ``out=``
+(scale_image changes the size) returns a new image as usual, and the
+ping-pong restarts from it. The result is one of the chain's buffers.
+"""
+import inspect
+
+from pixel_buffer import PixelBuffer, as_buffer
+
+
+def accepts(fn, name):
+    """True if ``fn`` takes a ``name=`` keyword (out, scratch, ...)."""
+    try:
+        return name in inspect.signature(fn).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def _call(fn, image_data, *args, **kwargs):
+    return fn(image_data, *args, **kwargs)
+
+
+def run_chain(image_data, steps, inplace=False, run=None):
+    """Apply ``steps`` in order and return the final image.
+
+    ``run(fn, image, *args, **kwargs)`` routes each call, e.g. through the
+    editor's run_filter for row bands on several processes.
+    """
+    run = run or _call
+    current = as_buffer(image_data) if inplace else image_data
+    spare = None         # the buffer the next step may overwrite
+    for step in steps:
+        fn, args = step[0], tuple(step[1])
+        kwargs = dict(step[2]) if len(step) > 2 else {}
+        if not accepts(fn, "out"):
+            result, spare = run(fn, current, *args, **kwargs), None
+        elif inplace:
+            if accepts(fn, "scratch"):
+                if spare is None:
+                    spare = PixelBuffer.like(current)
+                kwargs.setdefault("scratch", spare)
+            result = run(fn, current, *args, inplace=True, **kwargs)
+        else:
+            dst = spare if spare is not None else PixelBuffer.like(current)
+            result = run(fn, current, *args, out=dst, **kwargs)
+            if current is not image_data:
+                spare = current
+        current = result
+    return current
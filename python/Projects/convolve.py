@@ -0,0 +1,357 @@
+"""NxN convolution engine for 0xRRGGBB images.
+
+    convolve(img, kernel, divisor=None, offset=0, border="copy")
+
+``kernel`` is n*n numbers in row order (like the old 3x3 presets) or a list
+of n rows, with n odd. Each channel becomes
+``clamp8(round(sum(k * p) / divisor) + offset)``, exactly as in the original
+3x3 ``apply_kernel``. Three paths give identical results:
+
+- box kernels (all weights equal) use a summed-area table: O(1) per pixel,
+  whatever the radius;
+- separable kernels (rank 1: Gaussian/binomial, Sobel, ...) run as a
+  horizontal and a vertical 1-D pass of integer sums;
+- anything else is a direct n*n sum.
+
+Border modes: "copy" leaves pixels closer than the radius to the edge
+unchanged (the old behaviour); "clamp" repeats the edge pixel; "reflect"
+mirrors around the edge pixel (d c b | a b c d); "wrap" tiles the image.
+Weights must be integers for the fast paths; other kernels use the direct
+sum. NumPy is used when installed, pure Python otherwise.
+
+``out=`` names a destination buffer of the same size, and may be the input
+itself. The NumPy path works in bands of rows, so its temporaries stay a
+fraction of the image; in place, it stages the result in ``scratch=`` (a
+buffer of the same size, allocated when not given) and copies it back at
+the end. The Python path reads the whole input into channel planes before
+writing, so it needs no scratch.
+"""
+from math import gcd, isqrt
+
+import np_backend
+from photo_core.pixels import clamp8
+from pixel_buffer import destination
+
+BORDER_MODES = ("copy", "clamp", "reflect", "wrap")
+BAND_PIXELS = 1 << 16    # NumPy path: output pixels per band of rows
+
+
+# -----------------------------------------------------------------------------
+# Kernels
+# -----------------------------------------------------------------------------
+
+def normalize_kernel(kernel):
+    """Return the kernel as a tuple of n rows (n odd)."""
+    kernel = list(kernel)
+    if kernel and isinstance(kernel[0], (list, tuple)):
+        rows = tuple(tuple(row) for row in kernel)
+    else:
+        n = isqrt(len(kernel))
+        if n * n != len(kernel):
+            raise ValueError(f"Kernel of {len(kernel)} values is not square.")
+        rows = tuple(tuple(kernel[i * n:(i + 1) * n]) for i in range(n))
+    n = len(rows)
+    if n % 2 == 0 or any(len(row) != n for row in rows):
+        raise ValueError("Kernel must be square with an odd size.")
+    return rows
+
+
+def box_kernel(size):
+    """size x size kernel of ones (the default divisor averages it)."""
+    return [[1] * size for _ in range(size)]
+
+
+def gaussian_kernel(radius):
+    """Integer binomial approximation of a Gaussian, (2r+1) x (2r+1)."""
+    row = [1]
+    for _ in range(2 * radius):
+        row = [a + b for a, b in zip([0] + row, row + [0])]
+    return [[a * b for b in row] for a in row]
+
+
+def separate(rows):
+    """Return integer (column, row) vectors with rows[i][j] == col[i]*row[j],
+    or None if the kernel is not rank 1 with integer weights."""
+    if not all(isinstance(v, int) for r in rows for v in r):
+        return None
+    pivot = next((r for r in rows if any(r)), None)
+    if pivot is None:
+        return None
+    g = 0
+    for v in pivot:
+        g = gcd(g, v)
+    row = [v // g for v in pivot]
+    j = next(i for i, v in enumerate(row) if v)
+    col = []
+    for r in rows:
+        if r[j] % row[j]:
+            return None
+        c = r[j] // row[j]
+        if any(v != c * w for v, w in zip(r, row)):
+            return None
+        col.append(c)
+    return col, row
+
+
+# -----------------------------------------------------------------------------
+# Borders (shared with rank.py)
+# -----------------------------------------------------------------------------
+
+def border_index(i, n, mode):
+    """Map coordinate ``i`` onto 0..n-1 for clamp/reflect/wrap borders."""
+    if 0 <= i < n:
+        return i
+    if mode == "wrap":
+        return i % n
+    if mode == "reflect" and n > 1:
+        period = 2 * n - 2
+        i %= period
+        return period - i if i >= n else i
+    return 0 if i < 0 else n - 1
+
+
+def pad_index(n, r, mode):
+    """NumPy indices of coordinates -r .. n+r-1 with the border applied
+    ("copy" pads like "clamp")."""
+    np = np_backend.np
+    idx = [border_index(i, n, "clamp" if mode == "copy" else mode)
+           for i in range(-r, n + r)]
+    return np.asarray(idx, dtype=np.intp)
+
+
+def padded_channels(image_data, r, border):
+    """Three lists of padded rows (h + 2r rows of w + 2r ints)."""
+    h, w = len(image_data), len(image_data[0])
+    mode = "clamp" if border == "copy" else border
+    xs = [border_index(x, w, mode) for x in range(-r, w + r)]
+    ys = [border_index(y, h, mode) for y in range(-r, h + r)]
+    reds, greens, blues = [], [], []
+    for y in ys:
+        row = image_data[y]
+        line = [row[x] for x in xs]
+        reds.append([(p >> 16) & 0xFF for p in line])
+        greens.append([(p >> 8) & 0xFF for p in line])
+        blues.append([p & 0xFF for p in line])
+    return reds, greens, blues
+
+
+# -----------------------------------------------------------------------------
+# Entry point
+# -----------------------------------------------------------------------------
+
+def convolve(image_data, kernel, divisor=None, offset=0, border="copy",
+             use_numpy=None, out=None, scratch=None):
+    """Convolve an image with an odd NxN kernel; returns a PixelBuffer
+    (``out`` when given)."""
+    if border not in BORDER_MODES:
+        raise ValueError(f"Unknown border mode {border!r}; "
+                         f"choose from {BORDER_MODES}")
+    rows = normalize_kernel(kernel)
+    if divisor is None:
+        s = sum(sum(r) for r in rows)
+        divisor = s if s != 0 else 1
+    if use_numpy is None:
+        use_numpy = np_backend.AVAILABLE
+    if use_numpy and np_backend.AVAILABLE:
+        return _convolve_numpy(image_data, rows, divisor, offset, border,
+                               out, scratch)
+    return _convolve_python(image_data, rows, divisor, offset, border, out)
+
+
+def _plan(rows, divisor):
+    """Pick the fast path: ("box", weight), ("separable", col, row) or
+    ("direct",). Fast paths need an integer divisor to stay exact."""
+    if not isinstance(divisor, int):
+        return ("direct",)
+    first = rows[0][0]
+    if isinstance(first, int) and first and all(
+            v == first for r in rows for v in r):
+        return ("box", first)
+    sep = separate(rows)
+    if sep:
+        return ("separable",) + sep
+    return ("direct",)
+
+
+# -----------------------------------------------------------------------------
+# NumPy path
+# -----------------------------------------------------------------------------
+
+def _int_type(rows, plan, h, w):
+    """int32 when no sum of the plan can overflow it, else int64."""
+    np = np_backend.np
+    n = len(rows)
+    if plan[0] == "box":       # the summed-area table holds whole sums
+        bound = (h + n) * (w + n) * 255 * abs(plan[1])
+    else:
+        bound = 255 * sum(abs(v) for row in rows for v in row)
+    return np.int32 if bound < 2 ** 31 else np.int64
+
+
+def _add_scaled(acc, k, part):
+    if k == 1:
+        acc += part
+    elif k == -1:
+        acc -= part
+    else:
+        acc += k * part
+
+
+def _convolve_band(padded, h, w, rows, plan, divisor, offset):
+    """Convolve one band: ``padded`` holds its h + 2r rows (packed,
+    border applied), the result its h rows."""
+    np = np_backend.np
+    n = len(rows)
+    itype = _int_type(rows, plan, h, w)
+    res = np.zeros((h, w), dtype=np.uint32)
+    for shift in (16, 8, 0):
+        chan = ((padded >> shift) & 0xFF).astype(itype)
+        if plan[0] == "box":
+            sat = np.zeros((h + n, w + n), dtype=itype)
+            np.cumsum(np.cumsum(chan, axis=0, dtype=itype), axis=1,
+                      out=sat[1:, 1:])
+            acc = sat[n:, n:] - sat[:-n, n:]
+            acc -= sat[n:, :-n]
+            acc += sat[:-n, :-n]
+            if plan[1] != 1:
+                acc *= plan[1]
+            del sat
+        elif plan[0] == "separable":
+            col, row = plan[1], plan[2]
+            tmp = np.zeros((h + n - 1, w), dtype=itype)
+            for j, k in enumerate(row):
+                if k:
+                    _add_scaled(tmp, k, chan[:, j:j + w])
+            acc = np.zeros((h, w), dtype=itype)
+            for i, k in enumerate(col):
+                if k:
+                    _add_scaled(acc, k, tmp[i:i + h])
+            del tmp
+        else:
+            acc = np.zeros((h, w), dtype=np.float64 if any(
+                isinstance(v, float) for rr in rows for v in rr)
+                else itype)
+            for i, krow in enumerate(rows):
+                for j, k in enumerate(krow):
+                    if k:
+                        _add_scaled(acc, k, chan[i:i + h, j:j + w])
+        del chan
+        if divisor == 1 and isinstance(offset, int) and acc.dtype != \
+                np.float64:
+            acc += offset                  # round(acc / 1) is acc itself
+        else:
+            acc = acc / divisor
+            np.rint(acc, out=acc)
+            acc += offset
+        np.clip(acc, 0, 255, out=acc)
+        val = acc.astype(np.uint32)
+        val <<= shift
+        res |= val
+    return res
+
+
+def _convolve_numpy(image_data, rows, divisor, offset, border, out=None,
+                    scratch=None):
+    np = np_backend.np
+    h, w = len(image_data), len(image_data[0])
+    n = len(rows)
+    r = n // 2
+    src = np_backend.to_packed(image_data)
+    out = destination(image_data, out)
+    dst = np_backend.to_packed(out)
+    staged = np.may_share_memory(dst, src)
+    # In place, later bands still read rows earlier bands replace: stage
+    # the result in scratch and copy it over at the end
+    res = np_backend.to_packed(destination(image_data, scratch)) \
+        if staged else dst
+    yi, xi = pad_index(h, r, border), pad_index(w, r, border)
+    plan = _plan(rows, divisor)
+    step = max(1, BAND_PIXELS // max(1, w))
+    for y0 in range(0, h, step):
+        y1 = min(h, y0 + step)
+        padded = src[yi[y0:y1 + 2 * r]][:, xi]
+        res[y0:y1] = _convolve_band(padded, y1 - y0, w, rows, plan,
+                                    divisor, offset)
+    if border == "copy" and r:
+        ys = np.r_[0:min(r, h), max(h - r, 0):h]
+        xs = np.r_[0:min(r, w), max(w - r, 0):w]
+        res[ys, :] = src[ys, :]
+        res[:, xs] = src[:, xs]
+    if staged:
+        dst[...] = res
+    out.invalidate()
+    return out
+
+
+# -----------------------------------------------------------------------------
+# Pure-Python path
+# -----------------------------------------------------------------------------
+
+def _sums_box(chan, h, w, n):
+    """Sliding n x n sums via running row sums then running column sums."""
+    horiz = []
+    for row in chan:
+        s = sum(row[:n])
+        line = [s]
+        for x in range(w - 1):
+            s += row[x + n] - row[x]
+            line.append(s)
+        horiz.append(line)
+    out = [None] * h
+    s = [sum(horiz[i][x] for i in range(n)) for x in range(w)]
+    out[0] = s[:]
+    for y in range(1, h):
+        add, sub = horiz[y + n - 1], horiz[y - 1]
+        s = [a + b - c for a, b, c in zip(s, add, sub)]
+        out[y] = s
+    return out
+
+
+def _sums_separable(chan, h, w, col, row):
+    taps = [(j, k) for j, k in enumerate(row) if k]
+    horiz = [[sum(k * line[x + j] for j, k in taps) for x in range(w)]
+             for line in chan]
+    vtaps = [(i, k) for i, k in enumerate(col) if k]
+    return [[sum(k * horiz[y + i][x] for i, k in vtaps) for x in range(w)]
+            for y in range(h)]
+
+
+def _sums_direct(chan, h, w, rows):
+    taps = [(i, j, k) for i, krow in enumerate(rows)
+            for j, k in enumerate(krow) if k]
+    return [[sum(k * chan[y + i][x + j] for i, j, k in taps)
+             for x in range(w)] for y in range(h)]
+
+
+def _convolve_python(image_data, rows, divisor, offset, border, out=None):
+    h, w = len(image_data), len(image_data[0])
+    n = len(rows)
+    r = n // 2
+    plan = _plan(rows, divisor)
+    sums = []
+    for chan in padded_channels(image_data, r, border):
+        if plan[0] == "box":
+            acc = _sums_box(chan, h, w, n)
+            if plan[1] != 1:
+                acc = [[v * plan[1] for v in line] for line in acc]
+        elif plan[0] == "separable":
+            acc = _sums_separable(chan, h, w, plan[1], plan[2])
+        else:
+            acc = _sums_direct(chan, h, w, rows)
+        sums.append(acc)
+    out = destination(image_data, out)
+    acc_r, acc_g, acc_b = sums
+    for y in range(h):
+        src, dst = image_data[y], out[y]
+        edge_row = border == "copy" and (y < r or y >= h - r)
+        ar, ag, ab = acc_r[y], acc_g[y], acc_b[y]
+        for x in range(w):
+            if edge_row or (border == "copy" and (x < r or x >= w - r)):
+                dst[x] = src[x]
+                continue
+            red = clamp8(round(ar[x] / divisor) + offset)
+            green = clamp8(round(ag[x] / divisor) + offset)
+            blue = clamp8(round(ab[x] / divisor) + offset)
+            dst[x] = (red << 16) | (green << 8) | blue
+    out.invalidate()
+    return out
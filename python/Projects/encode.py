@@ -0,0 +1,148 @@
+"""Encoding profiles and compact output modes for save_image.
+
+    save_image(img, "out.png", profile="speed")
+    data = encode_image(img, "PNG", profile="size")     # bytes, no file
+
+A profile picks per-format Pillow settings. "speed" uses the fastest zlib
+level and WebP method, "balanced" uses Pillow's defaults plus an optimised
+JPEG Huffman table, and "size" spends the most time for the smallest file.
+JPEG and WebP keep the same quality in every profile, so only time and
+bytes change. Explicit options (quality=..., compress_level=...) override
+the profile.
+
+With ``mode="auto"``, black-and-white images (threshold_bw) are written as
+1-bit and grayscale images (to_grayscale) as ``L`` wherever the format
+supports it. Both are lossless: the pixels read back unchanged.
+"""
+import io
+import os
+import sys
+
+from pixel_buffer import as_buffer, to_pil
+from profiling import stage
+
+PROFILES = {
+    "speed": {
+        "PNG": {"compress_level": 1},
+        "JPEG": {"quality": 90},
+        "WEBP": {"quality": 85, "method": 0},
+        "TIFF": {"compression": "raw"},
+    },
+    "balanced": {
+        "PNG": {"compress_level": 6},
+        "JPEG": {"quality": 90, "optimize": True},
+        "WEBP": {"quality": 85, "method": 4},
+        "TIFF": {"compression": "tiff_lzw"},
+    },
+    "size": {
+        "PNG": {"compress_level": 9, "optimize": True},
+        "JPEG": {"quality": 90, "optimize": True, "progressive": True},
+        "WEBP": {"quality": 85, "method": 6},
+        "TIFF": {"compression": "tiff_adobe_deflate"},
+    },
+}
+DEFAULT_PROFILE = "balanced"
+
+# Compact modes each format can store, best first
+COMPACT_MODES = {
+    "PNG": ("1", "L"), "TIFF": ("1", "L"), "BMP": ("1", "L"),
+    "GIF": ("L",), "JPEG": ("L",),
+}
+MODES = ("auto", "RGB", "L", "1")
+_ALIASES = {"JPG": "JPEG", "TIF": "TIFF"}
+
+# Byte offsets of B, G, R inside a packed 0x00RRGGBB cell
+_B, _G, _R = (0, 1, 2) if sys.byteorder == "little" else (3, 2, 1)
+_SAMPLE = 64 * 1024     # pixels checked before scanning a whole image
+_BW = {(0, 0, 0), (255, 255, 255)}
+
+
+def format_for(filepath, format=None):
+    """Pillow format name from ``format`` or the file extension (PNG for
+    file objects)."""
+    if format:
+        if not format.isalnum():    # it also names files: no "png/../x"
+            raise ValueError(f"bad image format {format!r}")
+        return _ALIASES.get(format.upper(), format.upper())
+    if not isinstance(filepath, (str, os.PathLike)):
+        return "PNG"
+    ext = os.path.splitext(os.fspath(filepath))[1].lower()
+    # As Image.save does: the common codecs first, every plugin only for
+    # other extensions
+    from PIL import Image
+
+    Image.preinit()
+    fmt = Image.EXTENSION.get(ext) or Image.registered_extensions().get(ext)
+    if fmt is None:
+        raise ValueError(f"unknown file extension: {ext!r}")
+    return fmt
+
+
+def _is_gray(raw):
+    return raw[_R::4] == raw[_G::4] and raw[_G::4] == raw[_B::4]
+
+
+def pixel_mode(image_data):
+    """"1" if every pixel is black or white, "L" if every pixel is gray,
+    else "RGB". A sample is checked first, so colour images exit fast."""
+    buf = as_buffer(image_data)
+    if buf.stride != buf.width:
+        buf = buf.copy()
+    raw = buf._mv[:buf.width * buf.height].cast("B")
+    if not _is_gray(raw[:4 * _SAMPLE]) or not _is_gray(raw):
+        return "RGB"
+    colors = to_pil(buf).getcolors(2)
+    if colors is not None and {c for _, c in colors} <= _BW:
+        return "1"
+    return "L"
+
+
+def output_image(image_data, fmt, mode="auto"):
+    """PIL image to hand to ``save`` for ``fmt``: RGB, or L/1-bit when
+    ``mode`` asks for it (auto: when the pixels allow it)."""
+    if mode not in MODES:
+        raise ValueError(f"Unknown output mode {mode!r}")
+    img = to_pil(image_data)
+    allowed = COMPACT_MODES.get(fmt, ())
+    if mode == "auto":
+        mode = pixel_mode(image_data) if allowed else "RGB"
+        if mode not in allowed:
+            mode = "L" if mode == "1" and "L" in allowed else "RGB"
+    if mode == "RGB":
+        return img
+    gray = img.convert("L")
+    if mode == "1":
+        from PIL import Image
+
+        return gray.convert("1", dither=Image.Dither.NONE)
+    return gray
+
+
+def save_options(fmt, profile=DEFAULT_PROFILE, options=None):
+    """The profile's settings for ``fmt`` overridden by ``options``."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown encoding profile {profile!r} "
+                         f"(choose from {', '.join(PROFILES)})")
+    merged = dict(PROFILES[profile].get(fmt, {}))
+    options = options or {}
+    if fmt == "PNG" and "compress_level" in options:
+        merged.pop("optimize", None)    # optimize would force level 9
+    merged.update(options)
+    return merged
+
+
+def encode(image_data, fp, format=None, profile=DEFAULT_PROFILE,
+           mode="auto", **options):
+    """Write ``image_data`` to ``fp`` (a path or binary file object)."""
+    fmt = format_for(fp, format)
+    settings = save_options(fmt, profile, options)
+    with stage("encode", "codec", format=fmt, profile=profile):
+        output_image(image_data, fmt, mode).save(fp, format=fmt, **settings)
+
+
+def encode_image(image_data, format="PNG", profile=DEFAULT_PROFILE,
+                 mode="auto", **options):
+    """Encode to bytes in memory (for HTTP responses, caches, ...)."""
+    out = io.BytesIO()
+    encode(image_data, out, format, profile, mode, **options)
+    return out.getvalue()
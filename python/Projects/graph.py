@@ -0,0 +1,217 @@
+"""Lazy filter graph: describe outputs first, compute only what they need.
+
+    lazy = Lazy(gray=to_grayscale, invert=invert_colors, kernel=apply_kernel)
+    src = source(img)
+    wanted = {
+        "grayscale.png": lazy.gray(src),
+        "threshold.png": threshold_node,          # built on lazy.gray(src)
+        "sharpen.png": lazy.kernel(src, K_SHARPEN),
+    }
+    for name, image in evaluate(wanted, workers=4):
+        save_image(image, name)
+
+Builders return Nodes instead of images. ``evaluate`` merges nodes that
+describe the same work (same function, same inputs, equal arguments), so
+``lazy.gray(src)`` built twice runs once. It then runs the distinct nodes
+on a thread pool as soon as their inputs exist, so independent branches
+overlap. NumPy and Pillow release the GIL; pass ``run=`` to route calls
+elsewhere, e.g. through the editor's process-band ``run_filter``. Outputs
+are yielded as they finish, and each intermediate is dropped as soon as its
+last consumer has run.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def _freeze(value):
+    """Hashable stand-in for an argument value (lists -> tuples, ...)."""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    try:
+        hash(value)
+    except TypeError:
+        return ("id", id(value))
+    return value
+
+
+class Node:
+    """One lazy image: ``fn(*inputs' images, *args, **kwargs)``, or a
+    source image when ``fn`` is None."""
+
+    __slots__ = ("fn", "inputs", "args", "kwargs", "value", "key")
+
+    def __init__(self, fn, inputs=(), args=(), kwargs=None, value=None):
+        self.fn = fn
+        self.inputs = tuple(inputs)
+        self.args = tuple(args)
+        self.kwargs = dict(kwargs or {})
+        self.value = value
+        if fn is None:
+            self.key = ("source", id(value))
+        else:
+            self.key = (fn, tuple(n.key for n in self.inputs),
+                        _freeze(self.args), _freeze(self.kwargs))
+
+    @property
+    def name(self):
+        return "source" if self.fn is None else self.fn.__name__
+
+    def __repr__(self):
+        if self.fn is None:
+            return "source()"
+        inner = ", ".join([repr(n) for n in self.inputs] +
+                          [repr(a) for a in self.args])
+        return f"{self.name}({inner})"
+
+
+def source(image_data):
+    """Leaf node holding an already computed image."""
+    return Node(None, value=image_data)
+
+
+def node(fn, x, *args, **kwargs):
+    """Node for ``fn(x, *args, **kwargs)``; a plain image ``x`` becomes a
+    source."""
+    if not isinstance(x, Node):
+        x = source(x)
+    return Node(fn, (x,), args, kwargs)
+
+
+def lazy(fn):
+    """Builder taking the same arguments as ``fn`` but returning a Node."""
+    def build(x, *args, **kwargs):
+        return node(fn, x, *args, **kwargs)
+    build.__name__ = build.__qualname__ = fn.__name__
+    build.__doc__ = f"Lazy {fn.__name__}: returns a graph Node."
+    return build
+
+
+class Lazy:
+    """Namespace of builders: ``Lazy(gray=to_grayscale).gray(x)``."""
+
+    def __init__(self, **filters):
+        self._by_fn = {}
+        for name, fn in filters.items():
+            self.add(name, fn)
+
+    def add(self, name, fn, builder=None):
+        """Register ``fn`` under ``name``; ``builder`` overrides how its
+        nodes are built (e.g. to route through a shared sub-expression)."""
+        builder = builder or lazy(fn)
+        setattr(self, name, builder)
+        self._by_fn[fn] = builder
+
+    def call(self, fn, x, *args, **kwargs):
+        """Node for ``fn(x, *args, **kwargs)`` via its registered builder."""
+        return self._by_fn.get(fn, lazy(fn))(x, *args, **kwargs)
+
+
+# -----------------------------------------------------------------------------
+# Evaluation
+# -----------------------------------------------------------------------------
+
+def plan(outputs):
+    """Distinct nodes needed for ``outputs`` ({name: Node}), inputs first.
+
+    Returns (order, canonical) where ``canonical`` maps every node key to
+    the one Node that will be computed for it.
+    """
+    canonical, order = {}, []
+
+    def visit(n):
+        if n.key in canonical:
+            return canonical[n.key]
+        for inp in n.inputs:
+            visit(inp)
+        canonical[n.key] = n
+        order.append(n)
+        return n
+
+    for n in outputs.values():
+        visit(n)
+    return order, canonical
+
+
+def _call(run, n, values):
+    args = [values[i.key] for i in n.inputs]
+    return run(n.fn, *args, *n.args, **n.kwargs)
+
+
+def evaluate(outputs, workers=1, run=None):
+    """Compute ``outputs`` ({name: Node}); yield (name, image) as each is
+    ready. ``run(fn, *args, **kwargs)`` performs one call (default: call
+    directly). ``workers`` > 1 overlaps independent nodes on threads."""
+    run = run or (lambda fn, *a, **kw: fn(*a, **kw))
+    order, canonical = plan(outputs)
+    wanted = {}                       # key -> output names
+    for name, n in outputs.items():
+        wanted.setdefault(n.key, []).append(name)
+    refs = {n.key: len(wanted.get(n.key, ())) for n in order}
+    consumers = {n.key: [] for n in order}
+    for n in order:
+        for key in {i.key for i in n.inputs}:
+            refs[key] += 1
+            consumers[key].append(n)
+    values = {}
+    waiting = {n.key: len({i.key for i in n.inputs}) for n in order}
+
+    def release(key):
+        refs[key] -= 1
+        if refs[key] == 0:
+            del values[key]
+
+    def finished(n, value):
+        """Store a result; return output pairs and newly runnable nodes."""
+        values[n.key] = value
+        ready = []
+        for c in consumers[n.key]:
+            waiting[c.key] -= 1
+            if waiting[c.key] == 0:
+                ready.append(c)
+        return [(name, value) for name in wanted.get(n.key, ())], ready
+
+    def consume(n):
+        for key in {i.key for i in n.inputs}:
+            release(key)
+
+    pool = ThreadPoolExecutor(workers, thread_name_prefix="graph") \
+        if workers > 1 else None
+    pending = {}      # future -> node (thread pool)
+    queued = []       # nodes to run inline (no pool)
+    completed = []    # (node, value) not yet recorded
+
+    def start(n):
+        if n.fn is None:
+            completed.append((n, n.value))
+        elif pool is None:
+            queued.append(n)
+        else:
+            pending[pool.submit(_call, run, n, values)] = n
+
+    try:
+        for n in order:
+            if waiting[n.key] == 0:
+                start(n)
+        while completed or queued or pending:
+            if not completed:
+                if queued:
+                    n = queued.pop(0)
+                    completed.append((n, _call(run, n, values)))
+                else:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        completed.append((pending.pop(future),
+                                          future.result()))
+            n, value = completed.pop(0)
+            consume(n)
+            pairs, more = finished(n, value)
+            del value
+            for c in more:
+                start(c)
+            for name, image in pairs:
+                yield name, image
+                release(n.key)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
@@ -0,0 +1,146 @@
+"""Image statistics from one histogram pass, and auto adjustments.
+
+    st = image_stats(img)               # cached on the PixelBuffer
+    st.gray[200], st.min, st.max, st.mean
+    t = otsu_threshold(st.gray)         # threshold_bw(img, "otsu")
+    lut = levels_lut(st.gray)           # adjust_contrast(img, "auto")
+    lut = equalize_lut(st.gray)         # equalize(img)
+
+The histograms come from Pillow in C, one band of rows at a time so memory
+stays bounded. R, G and B come from ``Image.histogram()``. The gray
+histogram uses the editor's (r + g + b) // 3 level (computed with
+ImageMath), so it matches to_grayscale and threshold_bw exactly. min, max
+and mean are read off the histograms. An auto adjustment therefore costs
+one histogram pass plus one LUT pass, and the histogram is computed only
+once per image.
+"""
+from collections import namedtuple
+
+from PIL import ImageMath
+
+from photo_core.pixels import clamp8
+from pixel_buffer import PixelBuffer, as_buffer, to_pil
+from profiling import stage
+
+BAND_PIXELS = 1 << 20
+DEFAULT_CLIP = 0.005     # auto-levels ignores this fraction at each end
+
+# min, max and mean are (red, green, blue, gray) tuples
+Stats = namedtuple("Stats", "count red green blue gray min max mean")
+
+
+# -----------------------------------------------------------------------------
+# Histograms
+# -----------------------------------------------------------------------------
+
+def _mean3(band):
+    r, g, b = band.split()
+    if hasattr(ImageMath, "lambda_eval"):
+        total = ImageMath.lambda_eval(
+            lambda a: (a["r"] + a["g"] + a["b"]) / 3, r=r, g=g, b=b)
+    else:                                    # Pillow < 10.3
+        total = ImageMath.eval("(r + g + b) / 3", r=r, g=g, b=b)
+    return total.convert("L")                # "/" on I images floors
+
+
+def _summary(hist):
+    count = sum(hist)
+    if not count:
+        return 0, 0, 0.0
+    lo = next(i for i, c in enumerate(hist) if c)
+    hi = 255 - next(i for i, c in enumerate(reversed(hist)) if c)
+    return lo, hi, sum(i * c for i, c in enumerate(hist)) / count
+
+
+def compute_stats(image_data):
+    """Stats for ``image_data`` (not cached; see image_stats)."""
+    buf = as_buffer(image_data)
+    w, h = buf.width, buf.height
+    rgb, gray = [0] * 768, [0] * 256
+    with stage("histogram", "stats", nbytes=buf.nbytes()):
+        img = to_pil(buf)
+        step = max(1, BAND_PIXELS // max(1, w))
+        for y in range(0, h, step):
+            band = img.crop((0, y, w, min(h, y + step)))
+            for i, c in enumerate(band.histogram()):
+                rgb[i] += c
+            for i, c in enumerate(_mean3(band).histogram()):
+                gray[i] += c
+    hists = rgb[:256], rgb[256:512], rgb[512:], gray
+    lo, hi, mean = zip(*(_summary(hh) for hh in hists))
+    return Stats(w * h, *hists, lo, hi, mean)
+
+
+def image_stats(image_data):
+    """Stats for ``image_data``, computed once per PixelBuffer. Call
+    ``buf.invalidate()`` after changing its pixels in place."""
+    if not isinstance(image_data, PixelBuffer):
+        return compute_stats(image_data)
+    cache = image_data._cache
+    if cache is None:
+        cache = image_data._cache = {}
+    if "stats" not in cache:
+        cache["stats"] = compute_stats(image_data)
+    return cache["stats"]
+
+
+# -----------------------------------------------------------------------------
+# Auto adjustments (histogram -> threshold or LUT)
+# -----------------------------------------------------------------------------
+
+def otsu_threshold(hist):
+    """Threshold ``t`` for threshold_bw (gray >= t is white) maximising the
+    between-class variance of ``hist``; 128 for a single-level image."""
+    total = sum(hist)
+    sum_all = sum(i * c for i, c in enumerate(hist))
+    best, best_t = 0.0, 128
+    w0 = sum0 = 0
+    for k in range(255):
+        w0 += hist[k]
+        sum0 += k * hist[k]
+        w1 = total - w0
+        if w0 == 0 or w1 == 0:
+            continue
+        diff = sum0 / w0 - (sum_all - sum0) / w1
+        between = w0 * w1 * diff * diff
+        if between > best:
+            best, best_t = between, k + 1
+    return best_t
+
+
+def levels_lut(hist, clip=DEFAULT_CLIP):
+    """Stretch the occupied range of ``hist`` to 0..255, ignoring ``clip``
+    of the pixels at each end (auto-levels)."""
+    total = sum(hist)
+    cut = total * clip
+    lo, seen = 0, 0
+    while lo < 255 and seen + hist[lo] <= cut:
+        seen += hist[lo]
+        lo += 1
+    hi, seen = 255, 0
+    while hi > 0 and seen + hist[hi] <= cut:
+        seen += hist[hi]
+        hi -= 1
+    if hi <= lo:
+        return tuple(range(256))
+    scale = 255.0 / (hi - lo)
+    return tuple(clamp8(round((i - lo) * scale)) for i in range(256))
+
+
+def equalize_lut(hist):
+    """Map levels through the cumulative histogram, spreading them evenly
+    over 0..255 (histogram equalisation)."""
+    total = sum(hist)
+    first = next((c for c in hist if c), 0)
+    if total <= first:
+        return tuple(range(256))
+    lut, cdf = [], 0
+    for c in hist:
+        cdf += c
+        lut.append(clamp8(round((cdf - first) * 255 / (total - first))))
+    return tuple(lut)
+
+
+def auto_brightness_delta(stats):
+    """Brightness delta that moves the mean gray level to 128."""
+    return round(128 - stats.mean[3])
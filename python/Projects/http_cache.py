@@ -0,0 +1,370 @@
+"""Persistent, content-addressed HTTP cache for fetch_url.
+
+Layout under ``root``:
+
+    blobs/<sha256>   response bodies, shared by every URL with that content
+    index.json       url -> {blob, content_type, final_url, etag,
+                             last_modified, expires, size, used}
+                     plus page -> {image, etag, last_modified, ...}
+                     mappings resolved from HTML
+
+An entry still fresh under its Cache-Control max-age is served from disk
+with no request. Older ones are revalidated with If-None-Match /
+If-Modified-Since, so an unchanged resource costs a 304 and no body. When
+the blobs exceed ``max_bytes`` the least recently used entries are
+evicted.
+
+index.json is rewritten when an entry is inserted or evicted. Hits only
+update the in-memory "used"/"expires" fields; ``close`` writes them out
+(photo_core.net does so at exit), so a warm run does not rewrite the whole
+index once per URL.
+
+``open`` returns a stream instead of the whole body: new downloads are
+hashed and spooled to a temp file as they are read and only become cache
+entries if read to the end, so an aborted download leaves nothing behind.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+CachedResponse = namedtuple(
+    "CachedResponse", "data content_type final_url from_cache")
+
+
+class HttpCache:
+    """On-disk cache with conditional revalidation and LRU size cap."""
+
+    def __init__(self, root, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = int(max_bytes)
+        self.hits = 0        # fresh, or answered by a 304 (body from disk)
+        self.downloads = 0   # full bodies transferred
+        self._lock = threading.RLock()
+        self._index = None
+        self._dirty = False      # index changed since the last _save
+        self._refs = Counter()   # blob -> number of urls using it
+        self._bytes = 0          # size of the referenced blobs
+
+    # --- index --------------------------------------------------------------
+    @property
+    def _index_path(self):
+        return os.path.join(self.root, "index.json")
+
+    def _blob_path(self, digest):
+        return os.path.join(self.root, "blobs", digest)
+
+    def _load(self):
+        if self._index is None:
+            try:
+                with open(self._index_path, encoding="utf-8") as fh:
+                    self._index = json.load(fh)
+            except (OSError, ValueError):
+                self._index = {}
+            self._index.setdefault("urls", {})
+            self._index.setdefault("pages", {})
+            for entry in self._index["urls"].values():
+                self._ref(entry)
+        return self._index
+
+    def _ref(self, entry):
+        self._refs[entry["blob"]] += 1
+        if self._refs[entry["blob"]] == 1:
+            self._bytes += entry["size"]
+
+    def _drop(self, url):
+        """Remove ``url``'s entry; returns its blob if no url uses it now."""
+        entry = self._index["urls"].pop(url, None)
+        if entry is None:
+            return None
+        blob = entry["blob"]
+        self._refs[blob] -= 1
+        if self._refs[blob]:
+            return None
+        del self._refs[blob]
+        self._bytes -= entry["size"]
+        return blob
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self._index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self._index, fh)
+        os.replace(tmp, self._index_path)
+        self._dirty = False
+
+    # --- bodies -------------------------------------------------------------
+    def _temp_path(self):
+        folder = os.path.join(self.root, "blobs")
+        os.makedirs(folder, exist_ok=True)
+        return os.path.join(folder, f".{uuid.uuid4().hex}.tmp")
+
+    # --- public API ---------------------------------------------------------
+    def lookup(self, url):
+        """Cached entry dict for ``url`` (or None), without any network."""
+        with self._lock:
+            return self._load()["urls"].get(url)
+
+    def open(self, url, headers=None, timeout=15, opener=urlopen,
+             pages=False):
+        """GET ``url`` through the cache as a ResponseStream.
+
+        A 304 streams the body from disk. A 200 is copied to the cache
+        while it is read, and committed only if read to the end.
+        With ``pages=True`` a page known only from remember_page_image is
+        revalidated too; its 304 has an empty body (see page_image).
+        """
+        headers = dict(headers or {})
+        with self._lock:
+            index = self._load()
+            entry = index["urls"].get(url)
+            blob = self._blob_path(entry["blob"]) if entry else None
+            if blob and not os.path.exists(blob):
+                entry = blob = None
+            if entry is None and pages:
+                entry = index["pages"].get(url)
+            elif blob and (entry.get("expires") or 0) > time.time():
+                body = open(blob, "rb")
+                entry["used"] = time.time()
+                self.hits += 1
+                self._dirty = True
+                return self._from_disk(body, entry)
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            r = opener(Request(url, headers=headers), timeout=timeout)
+        except HTTPError as e:
+            if e.code != 304 or not entry:
+                raise
+            if blob is None:
+                with self._lock:
+                    self.hits += 1
+                return self._from_disk(io.BytesIO(b""), dict(entry, size=0))
+            body = open(blob, "rb")   # stays readable if evicted below
+            with self._lock:
+                entry["used"] = time.time()
+                entry["expires"] = expires_of(e.headers)
+                self.hits += 1
+                self._dirty = True
+                if self._evict():
+                    self._save()
+            return self._from_disk(body, entry)
+        return _CachingStream(self, url, r)
+
+    @staticmethod
+    def _from_disk(body, entry):
+        return ResponseStream(body, entry["content_type"], entry["final_url"],
+                              from_cache=True, length=entry["size"],
+                              etag=entry["etag"],
+                              last_modified=entry["last_modified"])
+
+    def fetch(self, url, headers=None, timeout=15, opener=urlopen):
+        """GET ``url`` through the cache; returns a CachedResponse."""
+        with self.open(url, headers, timeout, opener) as r:
+            data = r.read()
+        return CachedResponse(data, r.content_type, r.final_url,
+                              r.from_cache)
+
+    def _commit(self, url, tmp_path, digest, size, meta):
+        path = self._blob_path(digest)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+            self.downloads += 1
+            self._load()
+            orphan = self._drop(url)
+            entry = dict(meta, blob=digest, size=size, used=time.time())
+            self._index["urls"][url] = entry
+            self._ref(entry)
+            if orphan not in (None, digest):
+                self._remove_blob(orphan)
+            self._evict()
+            self._save()
+
+    def page_image(self, page_url, response):
+        """Image URL previously resolved from ``page_url``'s HTML, valid only
+        while the page's validators match those of ``response`` (a
+        ResponseStream for the page, e.g. its 304)."""
+        with self._lock:
+            mapping = self._load()["pages"].get(page_url)
+        validators = (response.etag, response.last_modified)
+        if mapping and any(validators) and validators == (
+                mapping.get("etag"), mapping.get("last_modified")):
+            return mapping["image"]
+        return None
+
+    def remember_page_image(self, page_url, image_url, response):
+        """Map ``page_url`` to ``image_url`` under ``response``'s validators
+        (skipped when the server sent neither ETag nor Last-Modified)."""
+        if not (response.etag or response.last_modified):
+            return
+        with self._lock:
+            self._load()["pages"][page_url] = {
+                "image": image_url,
+                "etag": response.etag,
+                "last_modified": response.last_modified,
+                "content_type": response.content_type,
+                "final_url": response.final_url,
+            }
+            self._save()
+
+    def close(self):
+        """Write pending hit updates to index.json (the cache stays
+        usable)."""
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def total_bytes(self):
+        with self._lock:
+            self._load()
+            return self._bytes
+
+    def _evict(self):
+        """Drop least recently used entries down to max_bytes; True if any
+        were dropped."""
+        if self._bytes <= self.max_bytes:
+            return False
+        urls = self._index["urls"]
+        for url in sorted(urls, key=lambda u: urls[u]["used"]):
+            blob = self._drop(url)
+            if blob is not None:
+                self._remove_blob(blob)
+                if self._bytes <= self.max_bytes:
+                    break
+        return True
+
+    def _remove_blob(self, digest):
+        try:
+            os.remove(self._blob_path(digest))
+        except OSError:
+            pass
+
+
+# -----------------------------------------------------------------------------
+# Streaming responses
+# -----------------------------------------------------------------------------
+
+def content_type_of(response):
+    return (response.headers.get("Content-Type") or
+            "").split(";")[0].strip().lower()
+
+
+def expires_of(headers):
+    """Time until which a response may be reused without revalidating
+    (from Cache-Control max-age), or None."""
+    directives = [d.strip().lower()
+                  for d in (headers.get("Cache-Control") or "").split(",")]
+    if "no-cache" in directives or "no-store" in directives:
+        return None
+    for d in directives:
+        if d.startswith("max-age="):
+            try:
+                return time.time() + max(0, int(d[8:]))
+            except ValueError:
+                return None
+    return None
+
+
+def content_length_of(response):
+    try:
+        return int(response.headers.get("Content-Length"))
+    except (TypeError, ValueError):
+        return None
+
+
+class ResponseStream:
+    """A readable body with content_type, final_url, from_cache, length
+    (body size in bytes, None if the server did not say) and the etag /
+    last_modified validators."""
+
+    def __init__(self, raw, content_type, final_url, from_cache=False,
+                 length=None, etag=None, last_modified=None):
+        self.raw = raw
+        self.content_type = content_type
+        self.final_url = final_url
+        self.from_cache = from_cache
+        self.length = length
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @classmethod
+    def wrap(cls, response):
+        """Wrap a urllib-style response (after redirects)."""
+        return cls(response, content_type_of(response), response.geturl(),
+                   length=content_length_of(response),
+                   etag=response.headers.get("ETag"),
+                   last_modified=response.headers.get("Last-Modified"))
+
+    def read(self, amt=None):
+        return self.raw.read() if amt is None else self.raw.read(amt)
+
+    def close(self):
+        self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class _CachingStream(ResponseStream):
+    """Network body that is hashed and copied to a temp file as it is read;
+    fully-read bodies become cache entries on close."""
+
+    def __init__(self, cache, url, response):
+        super().__init__(response, content_type_of(response),
+                         response.geturl(),
+                         length=content_length_of(response),
+                         etag=response.headers.get("ETag"),
+                         last_modified=response.headers.get("Last-Modified"))
+        self._cache, self._url = cache, url
+        self._meta = {
+            "content_type": self.content_type,
+            "final_url": self.final_url,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "expires": expires_of(response.headers),
+        }
+        self._tmp_path = cache._temp_path()
+        self._tmp = open(self._tmp_path, "wb")
+        self._hash = hashlib.sha256()
+        self._size = 0
+        self._complete = False
+
+    def read(self, amt=None):
+        chunk = super().read(amt)
+        if chunk:
+            self._hash.update(chunk)
+            self._tmp.write(chunk)
+            self._size += len(chunk)
+        if amt is None or not chunk:
+            self._complete = True
+        return chunk
+
+    def close(self):
+        if self._tmp.closed:
+            return
+        super().close()
+        self._tmp.close()
+        if self._complete:
+            self._cache._commit(self._url, self._tmp_path,
+                                self._hash.hexdigest(), self._size,
+                                self._meta)
+        else:
+            os.remove(self._tmp_path)
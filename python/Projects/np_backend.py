@@ -0,0 +1,197 @@
+"""Optional NumPy backend: whole-array versions of the point filters.
+
+Every function takes a PixelBuffer, a list-of-lists, a packed (H, W) uint32
+array or an (H, W, 3) uint8 array, and returns a PixelBuffer. Per-channel
+mappings are given as 256-entry LUTs built by the caller, so results are
+bit-identical to the pure-Python loops that built the same LUT.
+
+NumPy is imported on the first access to ``AVAILABLE`` or ``np``, not with
+this module, so runs that never reach a vectorized path skip it. Check
+``AVAILABLE`` before calling anything below.
+"""
+from pixel_buffer import PixelBuffer
+
+BAND_PIXELS = 1 << 16      # pixels per band of rows in map_rows
+
+
+def __getattr__(name):
+    global np, AVAILABLE
+    if name not in ("np", "AVAILABLE"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        import numpy as np
+    except ImportError:  # optional dependency
+        np = None
+    AVAILABLE = np is not None
+    return globals()[name]
+
+
+# -----------------------------------------------------------------------------
+# Conversions
+# -----------------------------------------------------------------------------
+
+def to_packed(image_data):
+    """(H, W) uint32 view/array of 0xRRGGBB values (a view when possible)."""
+    if isinstance(image_data, PixelBuffer):
+        flat = np.frombuffer(image_data._mv, dtype=np.uint32)
+        rows = flat[:image_data.stride * image_data.height]
+        rows = rows.reshape(image_data.height, image_data.stride)
+        return rows[:, :image_data.width]
+    arr = np.asarray(image_data)
+    if arr.ndim == 3 and arr.shape[2] == 3:
+        return pack_rgb(arr)
+    if arr.ndim != 2:
+        raise ValueError(f"Expected (H, W) or (H, W, 3) data, "
+                         f"got shape {arr.shape}")
+    return arr.astype(np.uint32, copy=False)
+
+
+def pack_rgb(rgb):
+    """(H, W, 3) uint8 -> (H, W) uint32 0xRRGGBB."""
+    rgb = rgb.astype(np.uint32, copy=False)
+    return (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+
+
+def to_rgb(image_data):
+    """Any supported image -> (H, W, 3) uint8 array."""
+    packed = to_packed(image_data)
+    rgb = np.empty(packed.shape + (3,), dtype=np.uint8)
+    rgb[..., 0] = packed >> 16
+    rgb[..., 1] = packed >> 8
+    rgb[..., 2] = packed
+    return rgb
+
+
+def from_packed(packed):
+    """Wrap an (H, W) uint32 array in a PixelBuffer without copying."""
+    packed = np.ascontiguousarray(packed, dtype=np.uint32)
+    h, w = packed.shape
+    return PixelBuffer(w, h, packed)
+
+
+def split_channels(image_data):
+    """Any supported image -> three (H, W) uint8 arrays (r, g, b)."""
+    packed = to_packed(image_data)
+    r = (packed >> 16).astype(np.uint8)
+    g = (packed >> 8).astype(np.uint8)
+    b = packed.astype(np.uint8)
+    return r, g, b
+
+
+def pack_channels(r, g, b):
+    """Three (H, W) uint8 arrays -> (H, W) uint32 0xRRGGBB."""
+    out = r.astype(np.uint32)
+    out <<= 8
+    out |= g
+    out <<= 8
+    out |= b
+    return out
+
+
+def merge_channels(r, g, b):
+    """Three (H, W) uint8 arrays -> PixelBuffer."""
+    return from_packed(pack_channels(r, g, b))
+
+
+def map_rows(image_data, fn, out=None):
+    """Store ``fn(rows)`` for each band of packed (n, W) uint32 rows in
+    ``out`` (a new PixelBuffer when None) and return it.
+
+    Temporaries stay band-sized whatever the image size. Each band is read
+    before it is written, so ``out`` may be the source for any ``fn`` that
+    maps pixels one to one.
+    """
+    src = to_packed(image_data)
+    h, w = src.shape
+    if out is None:
+        out = PixelBuffer(w, h)
+    dst = to_packed(out)
+    step = max(1, BAND_PIXELS // max(1, w))
+    for y in range(0, h, step):
+        dst[y:y + step] = fn(src[y:y + step])
+    out.invalidate()
+    return out
+
+
+def _lut(table):
+    return np.asarray(table, dtype=np.uint8)
+
+
+# -----------------------------------------------------------------------------
+# Point filters
+# -----------------------------------------------------------------------------
+# ``out`` is an optional destination PixelBuffer of the same size, possibly
+# the source itself (see map_rows).
+
+def apply_lut(image_data, lut_r, lut_g=None, lut_b=None, out=None):
+    """Map each channel through a 256-entry table (one table = all three)."""
+    lr = _lut(lut_r)
+    lg = lr if lut_g is None else _lut(lut_g)
+    lb = lr if lut_b is None else _lut(lut_b)
+
+    def rows(packed):
+        r, g, b = split_channels(packed)
+        return pack_channels(lr[r], lg[g], lb[b])
+    return map_rows(image_data, rows, out)
+
+
+def gray_mean(image_data):
+    """(r + g + b) // 3 per pixel, as a uint8 (H, W) array."""
+    r, g, b = split_channels(image_data)
+    total = r.astype(np.uint16) + g + b
+    return (total // 3).astype(np.uint8)
+
+
+def to_grayscale(image_data, out=None):
+    def rows(packed):
+        gray = gray_mean(packed).astype(np.uint32)
+        return gray * np.uint32(0x010101)
+    return map_rows(image_data, rows, out)
+
+
+def threshold_bw(image_data, t, out=None):
+    def rows(packed):
+        return np.where(gray_mean(packed) >= t, np.uint32(0xFFFFFF),
+                        np.uint32(0))
+    return map_rows(image_data, rows, out)
+
+
+def _mask(op, image_data, mask, out):
+    src = to_packed(image_data)
+    if out is None:
+        return from_packed(op(src, np.uint32(mask)))
+    op(src, np.uint32(mask), out=to_packed(out))   # element-wise: alias-safe
+    out.invalidate()
+    return out
+
+
+def xor_mask(image_data, mask, out=None):
+    return _mask(np.bitwise_xor, image_data, mask, out)
+
+
+def and_mask(image_data, mask, out=None):
+    return _mask(np.bitwise_and, image_data, mask, out)
+
+
+def swap_red_blue(image_data, out=None):
+    def rows(packed):
+        res = (packed & 0x0000FF) << 16
+        res |= packed & 0x00FF00
+        res |= (packed & 0xFF0000) >> 16
+        return res
+    return map_rows(image_data, rows, out)
+
+
+def color_matrix(image_data, matrix, out=None):
+    """3x3 float matrix per pixel, then clamp8 (truncating) per channel.
+
+    Rows are evaluated left to right in float64, like the Python loop.
+    """
+    def rows(packed):
+        r, g, b = (c.astype(np.float64) for c in split_channels(packed))
+        chans = []
+        for mr, mg, mb in matrix:
+            acc = mr * r + mg * g + mb * b
+            chans.append(np.clip(acc, 0, 255).astype(np.uint8))
+        return pack_channels(*chans)
+    return map_rows(image_data, rows, out)
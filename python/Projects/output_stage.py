@@ -0,0 +1,100 @@
+"""Background encode/save stage for batches of output images.
+
+PNG/JPEG encoding runs inside Pillow with the GIL released, so a few
+threads can compress finished images while the main thread computes the
+next filter:
+
+    with OutputQueue(save_image, workers=4) as outq:
+        for name, fn in jobs:
+            outq.submit(fn(img), out(name), compress_level=1)
+    print(outq.report())
+
+``submit`` blocks once ``max_pending`` images are queued, which bounds the
+extra memory held by finished-but-unsaved images. Save functions that run
+on the encoder threads report through ``say``, so their lines never mix.
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_say_lock = threading.Lock()
+
+
+def say(line):
+    """Print ``line`` in one write, so lines from several threads never
+    interleave (print writes the text and the newline separately)."""
+    with _say_lock:
+        sys.stdout.write(f"{line}\n")
+
+
+class OutputQueue:
+    """Thread pool that encodes and writes images handed to ``submit``."""
+
+    def __init__(self, save_fn, workers=4, max_pending=None):
+        self.save_fn = save_fn
+        self.workers = max(1, int(workers))
+        self.max_pending = max_pending or 2 * self.workers
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = ThreadPoolExecutor(self.workers,
+                                        thread_name_prefix="encode")
+        self._futures = []
+        self._started = time.perf_counter()
+        self.saved = []
+        self.failed = []
+        self.elapsed = None
+
+    def submit(self, image_data, filepath, **options):
+        """Queue one image; ``options`` (format, quality, compress_level,
+        optimize, ...) go to ``save_fn`` for this output only."""
+        self._slots.acquire()
+        try:
+            future = self._pool.submit(self._save, image_data, filepath,
+                                       options)
+        except BaseException:
+            self._slots.release()
+            raise
+        self._futures.append(future)
+        return future
+
+    def _save(self, image_data, filepath, options):
+        try:
+            result = self.save_fn(image_data, filepath, **options)
+        except Exception as e:
+            say(f"An error occurred while saving {filepath}: {e}")
+            result = None
+        finally:
+            self._slots.release()
+        (self.saved if result else self.failed).append(filepath)
+        return result
+
+    def flush(self):
+        """Wait until every queued image is written; returns saved paths."""
+        for future in self._futures:
+            future.result()
+        self._futures = []
+        self.elapsed = time.perf_counter() - self._started
+        return list(self.saved)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown()
+
+    def report(self):
+        """One-line summary for the console."""
+        when = "" if self.elapsed is None else f" in {self.elapsed:.2f}s"
+        msg = f"Flushed {len(self.saved)} output(s){when}"
+        if self.failed:
+            names = ", ".join(os.path.basename(p) for p in self.failed)
+            msg += f"; {len(self.failed)} failed: {names}"
+        return msg
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
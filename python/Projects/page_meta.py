@@ -0,0 +1,148 @@
+"""Find a web page's preview image from the start of its HTML.
+
+    with open_url(page) as r:
+        img_url = find_page_image(r, r.final_url)
+
+The body is read in small chunks into an incremental ``HTMLParser`` and
+reading stops at ``</head>`` (or the first tag that can only be in the
+body), or straight away once an og:image is seen, so on a typical article
+page only the first few KB are transferred.
+
+Candidates, best first: og:image (also :url / :secure_url), twitter:image,
+``<link rel="image_src">``, and the ``image`` of a JSON-LD block. Attribute
+order does not matter.
+"""
+import codecs
+import json
+from html.parser import HTMLParser
+from urllib.parse import urljoin
+
+from profiling import stage
+
+CHUNK_SIZE = 8 * 1024
+MAX_HEAD_BYTES = 1024 * 1024
+
+META_RANKS = {
+    "og:image": 0,
+    "og:image:url": 0,
+    "og:image:secure_url": 0,
+    "twitter:image": 1,
+    "twitter:image:src": 1,
+}
+LINK_RANK = 2
+JSONLD_RANK = 3
+
+# Tags allowed in <head>; any other start tag means the body has begun.
+HEAD_TAGS = {"html", "head", "meta", "link", "script", "style", "title",
+             "base", "noscript", "template"}
+
+
+def jsonld_image(node):
+    """First image URL in a parsed JSON-LD value (or None)."""
+    if isinstance(node, list):
+        for item in node:
+            found = jsonld_image(item)
+            if found:
+                return found
+    elif isinstance(node, dict):
+        image = node.get("image")
+        if isinstance(image, str):
+            return image
+        if isinstance(image, dict):
+            found = image.get("url") or image.get("contentUrl")
+            if isinstance(found, str):
+                return found
+        if isinstance(image, list):
+            found = jsonld_image([{"image": i} for i in image])
+            if found:
+                return found
+        return jsonld_image(node.get("@graph"))
+    return None
+
+
+class HeadScanner(HTMLParser):
+    """Incremental parser that collects image candidates from <head>.
+
+    ``done`` turns true once nothing better can follow; ``image`` is the
+    best candidate so far (unresolved, as written in the page).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.done = False
+        self.image = None
+        self._rank = None
+        self._jsonld = None
+        self._noscript = 0
+
+    def _offer(self, rank, url):
+        url = (url or "").strip()
+        if url and (self._rank is None or rank < self._rank):
+            self._rank, self.image = rank, url
+            if rank == 0:
+                self.done = True
+
+    def handle_starttag(self, tag, attrs):
+        if self.done:
+            return
+        if tag not in HEAD_TAGS:
+            # <noscript><img ...> tracking pixels are common inside <head>
+            self.done = not self._noscript
+            return
+        if tag == "noscript":
+            self._noscript += 1
+        a = {k: v or "" for k, v in attrs}
+        if tag == "meta":
+            key = (a.get("property") or a.get("name") or "").strip().lower()
+            if key in META_RANKS:
+                self._offer(META_RANKS[key], a.get("content"))
+        elif tag == "link":
+            if "image_src" in a.get("rel", "").lower().split():
+                self._offer(LINK_RANK, a.get("href"))
+        elif tag == "script":
+            if a.get("type", "").strip().lower() == "application/ld+json":
+                self._jsonld = []
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag == "script":
+            self._jsonld = None
+
+    def handle_data(self, data):
+        if self._jsonld is not None:
+            self._jsonld.append(data)
+
+    def handle_endtag(self, tag):
+        if tag == "head":
+            self.done = True
+        elif tag == "noscript":
+            self._noscript = max(0, self._noscript - 1)
+        elif tag == "script" and self._jsonld is not None:
+            text, self._jsonld = "".join(self._jsonld), None
+            try:
+                self._offer(JSONLD_RANK, jsonld_image(json.loads(text)))
+            except ValueError:
+                pass   # malformed JSON-LD is common; ignore it
+
+
+def find_page_image(stream, base_url, max_bytes=MAX_HEAD_BYTES,
+                    chunk_size=CHUNK_SIZE):
+    """Read ``stream`` (anything with ``read(n)``) only as far as needed and
+    return the page's preview image URL, resolved against ``base_url``, or
+    None. At most ``max_bytes`` are read."""
+    scanner = HeadScanner()
+    decoder = codecs.getincrementaldecoder("utf-8")("replace")
+    total = 0
+    with stage("find_page_image", "net") as st:
+        while not scanner.done:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                scanner.feed(decoder.decode(b"", final=True))
+                scanner.close()
+                break
+            scanner.feed(decoder.decode(chunk))
+            total += len(chunk)
+            if max_bytes and total >= max_bytes:
+                break
+        st.add(total)
+    return urljoin(base_url, scanner.image) if scanner.image else None
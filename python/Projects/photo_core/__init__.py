@@ -0,0 +1,42 @@
+"""Core shared by Photo_Editor_2.0.py and terminal_photoshop.py.
+
+    import photo_core as core
+    img = core.load_image_any("photo.jpg")        # or an http(s) URL
+    core.save_image(core.scale_image(img, 2), core.out("big.png"))
+
+    files   outputs folder, local load/save, the path-or-URL router
+    net     URL loading: urllib, the HTTP cache, page meta parsing, caps
+    pixels  channel helpers, scale_image, the smiley fixture
+    editor  load_editor: Photo_Editor_2.0.py as a module (bench, server)
+
+Names are resolved on first access (``core.load_image_from_url`` is what
+imports net), so the smiley and local-file paths never load urllib.request,
+http.client or the HTML parser. files and pixels keep their module-level
+imports cheap; anything only URLs need belongs in net or inside the
+function that uses it. bench_startup.py fails when one of those modules
+shows up on a local path.
+"""
+import importlib
+
+_EXPORTS = {
+    "files": ("OUTPUT_DIR", "out", "load_image", "save_image",
+              "display_image", "is_url", "load_image_any"),
+    "net": ("open_url", "fetch_url", "load_image_from_url", "load_images"),
+    "pixels": ("get_red", "get_green", "get_blue", "create_pixel", "clamp8",
+               "scale_image", "build_smiley"),
+    "editor": ("load_editor",),
+}
+_MODULE_OF = {name: module for module, names in _EXPORTS.items()
+              for name in names}
+__all__ = sorted(_MODULE_OF)
+
+
+def __getattr__(name):
+    module = _MODULE_OF.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f"{__name__}.{module}"), name)
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
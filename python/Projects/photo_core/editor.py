@@ -0,0 +1,17 @@
+"""Load Photo_Editor_2.0.py as a module (its name is not importable)."""
+import importlib.util
+import os
+import sys
+
+EDITOR_PATH = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), "Photo_Editor_2.0.py")
+
+
+def load_editor():
+    """Import Photo_Editor_2.0.py as the module ``photo_editor``."""
+    spec = importlib.util.spec_from_file_location("photo_editor",
+                                                  EDITOR_PATH)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module     # lets worker processes pickle it
+    spec.loader.exec_module(module)
+    return module
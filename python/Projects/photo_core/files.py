@@ -0,0 +1,115 @@
+"""Local image I/O: the outputs folder, load/save, path-or-URL routing.
+
+Pillow, the codecs and the resamplers are imported by the functions that
+use them, so importing this module stays cheap (see bench_startup.py).
+"""
+import os
+
+from pixel_buffer import is_image
+
+# Outputs go next to the scripts unless PHOTO_EDITOR_OUTPUT_DIR says
+# otherwise
+OUTPUT_DIR = os.environ.get("PHOTO_EDITOR_OUTPUT_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "outputs")
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+
+def out(name: str) -> str:
+    return os.path.join(OUTPUT_DIR, name)
+
+
+def load_image(filepath, max_size=None):
+    """Load local image file into a PixelBuffer of 0xRRGGBB ints.
+
+    ``max_size`` (longest side, or a (w, h) box) loads a reduced preview;
+    JPEGs are then decoded at reduced scale.
+    """
+    from PIL import Image
+
+    import resample
+    from pixel_buffer import from_pil
+    from profiling import stage
+
+    try:
+        with stage("load_image", "io", path=str(filepath)) as st:
+            if max_size:
+                image_data = resample.load_thumbnail(filepath, max_size)
+            else:
+                with Image.open(filepath) as img:
+                    image_data = from_pil(img)
+            st.add(os.path.getsize(filepath))
+        width, height = image_data.width, image_data.height
+        print(f"Successfully loaded '{filepath}' ({width}x{height})")
+        return image_data
+    except Exception as e:
+        print(f"Error loading image: {e}")
+        return None
+
+
+def save_image(image_data, filepath, profile=None, mode="auto", **options):
+    """Save a PixelBuffer (or list-of-lists) of 0xRRGGBB ints to a file.
+
+    ``filepath`` may also be a binary file object (e.g. io.BytesIO; give
+    ``format``). ``profile`` is speed | balanced | size (see encode.py;
+    None means encode.DEFAULT_PROFILE); ``mode="auto"`` writes
+    black-and-white images as 1-bit and gray ones as L. ``options`` go to
+    PIL's ``Image.save`` (format, quality, compress_level, optimize, ...)
+    and override the profile. Returns ``filepath`` or None.
+    """
+    from encode import DEFAULT_PROFILE, encode
+    from output_stage import say
+    from profiling import stage
+
+    if not is_image(image_data):
+        say("Error: Image data is empty.")
+        return None
+    if profile is None:
+        profile = DEFAULT_PROFILE
+    try:
+        is_path = isinstance(filepath, (str, os.PathLike))
+        with stage("save_image", "io", path=str(filepath)) as st:
+            encode(image_data, filepath, profile=profile, mode=mode,
+                   **options)
+            st.add(os.path.getsize(filepath) if is_path else
+                   filepath.tell())
+        if is_path:
+            say(f"Saved: {os.path.abspath(filepath)}")
+        return filepath
+    except Exception as e:
+        say(f"An error occurred while saving: {e}")
+        return None
+
+
+def display_image(image_data):
+    """(Optional) Show image with OS viewer."""
+    if not is_image(image_data):
+        print("Error: Image data is empty.")
+        return
+    from pixel_buffer import to_pil
+
+    img = to_pil(image_data)
+    img.show()
+
+
+def is_url(source: str) -> bool:
+    # Cheap prefix test first: local paths never import urllib.parse
+    if not source.lstrip().lower().startswith(("http:", "https:")):
+        return False
+    from urllib.parse import urlparse
+
+    p = urlparse(source)
+    return p.scheme in ("http", "https") and bool(p.netloc)
+
+
+def load_image_any(source: str, max_size=None, opener=None):
+    """Smart router: URL -> load_image_from_url, Local -> load_image
+    (with existence check). ``opener`` replaces urlopen for URLs."""
+    if is_url(source):
+        from photo_core import net
+
+        return net.load_image_from_url(source, max_size,
+                                       opener or net.urlopen)
+    if not os.path.isfile(source):
+        print(f"Local path not found: {source}")
+        return None
+    return load_image(source, max_size)
@@ -0,0 +1,130 @@
+"""URL loading (std lib only), imported on the first URL source.
+
+Bodies stream through the on-disk HTTP cache and are decoded while they
+download; HTML pages fall back to their og:image / twitter:image.
+"""
+import atexit
+import os
+from urllib.request import Request, urlopen
+
+from batch_loader import ConnectionPool, load_many
+from http_cache import HttpCache, ResponseStream
+from page_meta import find_page_image
+from photo_core.files import OUTPUT_DIR, load_image_any
+from profiling import stage
+from stream_decode import decode_stream
+
+# On-disk cache for URL loads (set to None to always download)
+HTTP_CACHE = HttpCache(os.path.join(OUTPUT_DIR, ".http_cache"))
+atexit.register(HTTP_CACHE.close)
+
+# Caps for URL loads; a download or image past either is aborted early
+# (0 or None disables the cap)
+MAX_DOWNLOAD_BYTES = 100 * 1024 * 1024
+MAX_IMAGE_PIXELS = 64 * 1024 * 1024
+
+
+def open_url(url: str, timeout: int = 15, opener=urlopen, pages=False):
+    """Open ``url`` for streaming; returns a ResponseStream with read(n),
+    content_type, final_url and length (use it as a context manager).
+    Adds UA + Referer to reduce 403. Goes through HTTP_CACHE when set
+    (``pages``: see HttpCache.open).
+    ``opener`` replaces urlopen (e.g. a pooled keep-alive ConnectionPool)."""
+    headers = {
+        "User-Agent": "Mozilla/5.0",
+        "Accept": "image/*,*/*;q=0.8",
+        "Referer": url,
+    }
+    with stage("open_url", "net", url=url):
+        if HTTP_CACHE is not None:
+            return HTTP_CACHE.open(url, headers, timeout, opener, pages)
+        req = Request(url, headers=headers)
+        return ResponseStream.wrap(opener(req, timeout=timeout))
+
+
+def fetch_url(url: str, timeout: int = 15, opener=urlopen):
+    """Return (bytes, content_type, final_url) for the whole body."""
+    with open_url(url, timeout, opener) as r:
+        data = r.read()
+    return data, r.content_type, r.final_url
+
+
+def _looks_like_image_url(u: str) -> bool:
+    return u.lower().split("?")[0].endswith((".png", ".jpg", ".jpeg", ".webp",
+                                             ".bmp"))
+
+
+def _image_stream_to_data(r, max_size=None, max_bytes=None, max_pixels=None,
+                          on_header=None):
+    """Decode an open ResponseStream chunk by chunk (see stream_decode)."""
+    image_data = decode_stream(r, max_bytes, max_pixels, on_header,
+                               max_size, r.length)
+    w, h = image_data.width, image_data.height
+    print(f"Successfully loaded {r.final_url} ({w}x{h})")
+    return image_data
+
+
+def load_image_from_url(url: str, max_size=None, opener=urlopen,
+                        max_bytes=None, max_pixels=None, on_header=None):
+    """Load from direct image URL; fallback:
+    parse HTML og:image/twitter:image.
+
+    The body is decoded while it downloads. ``max_bytes`` / ``max_pixels``
+    default to MAX_DOWNLOAD_BYTES / MAX_IMAGE_PIXELS; ``on_header(size,
+    format)`` is called as soon as the image dimensions are known."""
+    if max_bytes is None:
+        max_bytes = MAX_DOWNLOAD_BYTES
+    if max_pixels is None:
+        max_pixels = MAX_IMAGE_PIXELS
+    caps = dict(max_size=max_size, max_bytes=max_bytes,
+                max_pixels=max_pixels, on_header=on_header)
+    try:
+        with open_url(url, opener=opener, pages=True) as r:
+            ctype, final_url = r.content_type, r.final_url
+
+            # Direct image response or URL looks like image
+            if ctype.startswith("image/") or _looks_like_image_url(final_url):
+                return _image_stream_to_data(r, **caps)
+
+            # Likely HTML: reuse the image found last time if the page is
+            # unchanged, else scan the <head> for a meta image (stops
+            # reading as soon as it is found)
+            img_url = HTTP_CACHE.page_image(url, r) if HTTP_CACHE else None
+            found = img_url is None
+            if found:
+                img_url = find_page_image(r, final_url)
+        if img_url:
+            with open_url(img_url, opener=opener) as r2:
+                if (not r2.content_type.startswith("image/")) and (
+                        not _looks_like_image_url(r2.final_url)):
+                    print("Found meta image, "
+                          "but it doesn't look like a direct image URL.")
+                    return None
+                if found and HTTP_CACHE is not None:
+                    HTTP_CACHE.remember_page_image(url, img_url, r)
+                return _image_stream_to_data(r2, **caps)
+
+        print("The URL is a webpage (HTML), not a direct image. "
+              "Provide a .jpg/.png link.")
+        return None
+
+    except Exception as e:
+        print(f"Error loading URL: {e}")
+        return None
+
+
+def load_images(sources, workers=16, max_size=None):
+    """Load many local paths/URLs concurrently.
+
+    Yields BatchResult(source, image, error) as each finishes; image is
+    None on failure, as with load_image_any. URLs share per-host
+    keep-alive connections.
+    """
+    pool = ConnectionPool()
+    try:
+        yield from load_many(
+            sources,
+            lambda src: load_image_any(src, max_size, opener=pool.urlopen),
+            workers=workers)
+    finally:
+        pool.close()
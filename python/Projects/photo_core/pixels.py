@@ -0,0 +1,53 @@
+"""Pixel toolkit: 0xRRGGBB channel helpers, scaling and the smiley."""
+from pixel_buffer import as_buffer, is_image
+from profiling import profiled
+
+
+def get_red(px):
+    return (px >> 16) & 0xFF
+
+
+def get_green(px):
+    return (px >> 8) & 0xFF
+
+
+def get_blue(px):
+    return px & 0xFF
+
+
+def create_pixel(r, g, b):
+    return ((r & 0xFF) << 16) | ((g & 0xFF) << 8) | (b & 0xFF)
+
+
+def clamp8(x):
+    return 0 if x < 0 else 255 if x > 255 else int(x)
+
+
+@profiled("resample")
+def scale_image(image_data, factor, method="nearest"):
+    """Resize by ``factor`` (integer, fractional or < 1).
+
+    method: nearest | box | bilinear | lanczos (see resample.py).
+    """
+    if not is_image(image_data) or factor <= 0:
+        return []
+    if factor == 1:
+        return as_buffer(image_data).copy()
+    import resample
+
+    return resample.scale(image_data, factor, method)
+
+
+def build_smiley():
+    """8x8 demo image (list of rows)."""
+    BLACK, YELLOW, BLUE = 0x000000, 0xFFFF00, 0x0000FF
+    return [
+        [BLACK, BLACK, BLACK, BLACK, BLACK, BLACK, BLACK, BLACK],
+        [BLACK, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, BLACK],
+        [BLACK, YELLOW, BLUE,   YELLOW, YELLOW, BLUE,   YELLOW, BLACK],
+        [BLACK, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, BLACK],
+        [BLACK, YELLOW, BLUE,   YELLOW, YELLOW, BLUE,   YELLOW, BLACK],
+        [BLACK, YELLOW, YELLOW, BLUE,   BLUE,   YELLOW, YELLOW, BLACK],
+        [BLACK, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, YELLOW, BLACK],
+        [BLACK, BLACK, BLACK, BLACK, BLACK, BLACK, BLACK, BLACK],
+    ]
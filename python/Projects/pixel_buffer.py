@@ -0,0 +1,248 @@
+import sys
+from array import array
+
+from profiling import stage
+
+# -----------------------------------------------------------------------------
+# Packed pixel storage
+# -----------------------------------------------------------------------------
+# One image = one contiguous block of 32-bit cells, each holding 0x00RRGGBB.
+# 4 bytes per pixel instead of a boxed Python int inside a row list.
+
+# Buffers created and their bytes since the last reset_allocations(); the
+# benchmarks report these per call
+_allocated = [0, 0]
+
+
+class PixelBuffer:
+    """Contiguous 0xRRGGBB image: width, height, stride (in pixels).
+
+    Indexing mimics the old list-of-lists layout, so ``buf[y][x]`` reads and
+    writes a pixel and ``len(buf)`` is the height. Rows are memoryview slices
+    over the shared storage, not copies.
+    """
+
+    __slots__ = ("width", "height", "stride", "data", "_mv", "_cache")
+
+    def __init__(self, width, height, data=None, stride=None):
+        width, height = int(width), int(height)
+        stride = width if stride is None else int(stride)
+        if width < 0 or height < 0 or stride < width:
+            raise ValueError(f"Bad buffer geometry {width}x{height} "
+                             f"(stride {stride})")
+        if data is None:
+            data = array("I", [0]) * (stride * height)   # no bytes copy
+        mv = memoryview(data)
+        if mv.format != "I" or mv.ndim != 1:
+            mv = mv.cast("B").cast("I")
+        if len(mv) < stride * height:
+            raise ValueError("Pixel storage is smaller than the geometry.")
+        self.width = width
+        self.height = height
+        self.stride = stride
+        self.data = data
+        self._mv = mv
+        self._cache = None     # data derived from the pixels (histogram.py)
+        _allocated[0] += 1
+        _allocated[1] += 4 * stride * height
+
+    # --- construction -------------------------------------------------------
+    @classmethod
+    def from_rows(cls, rows):
+        """Pack a list-of-lists (or any iterable of rows) of 0xRRGGBB ints."""
+        rows = list(rows)
+        h = len(rows)
+        w = len(rows[0]) if h else 0
+        data = array("I")
+        for row in rows:
+            if len(row) != w:
+                raise ValueError("All rows must have the same width.")
+            data.extend(row)
+        return cls(w, h, data)
+
+    @classmethod
+    def like(cls, other):
+        """Blank (black) buffer with the same width/height as ``other``."""
+        h = len(other)
+        w = len(other[0]) if h else 0
+        return cls(w, h)
+
+    def copy(self):
+        """Tightly packed copy (stride == width)."""
+        if self.stride == self.width:
+            n = self.width * self.height
+            return PixelBuffer(self.width, self.height,
+                               array("I", self._mv[:n]))
+        data = array("I")
+        for y in range(self.height):
+            data.extend(self.row(y))
+        return PixelBuffer(self.width, self.height, data)
+
+    # --- access -------------------------------------------------------------
+    def row(self, y):
+        """Writable memoryview over row ``y`` (no copy). Reading leaves
+        cached statistics alone: after writing through it (``buf[y][x] =
+        px`` included), call ``invalidate()``."""
+        if not 0 <= y < self.height:
+            raise IndexError("row index out of range")
+        start = y * self.stride
+        return self._mv[start:start + self.width]
+
+    def paste(self, other):
+        """Copy the pixels of ``other`` (same size) into this buffer."""
+        other = as_buffer(other)
+        if (other.width, other.height) != (self.width, self.height):
+            raise ValueError(f"Cannot paste {other.width}x{other.height} "
+                             f"into {self.width}x{self.height}")
+        if other is not self:
+            for y in range(self.height):
+                self.row(y)[:] = other.row(y)
+        self._cache = None
+        return self
+
+    def get(self, x, y):
+        return self._mv[y * self.stride + x]
+
+    def set(self, x, y, px):
+        self._mv[y * self.stride + x] = px & 0xFFFFFF
+        self._cache = None
+
+    def invalidate(self):
+        """Forget cached statistics; call after writing pixels in place
+        through ``data``, NumPy views or row views kept from earlier."""
+        self._cache = None
+
+    def to_lists(self):
+        """Unpack into the legacy list-of-lists layout."""
+        return [self.row(y).tolist() for y in range(self.height)]
+
+    def nbytes(self):
+        return self.stride * self.height * 4
+
+    # --- list-of-lists compatibility ----------------------------------------
+    def __len__(self):
+        return self.height
+
+    def __getitem__(self, y):
+        if y < 0:
+            y += self.height
+        return self.row(y)
+
+    def __iter__(self):
+        for y in range(self.height):
+            yield self.row(y)
+
+    def __eq__(self, other):
+        if not isinstance(other, PixelBuffer):
+            try:
+                other = as_buffer(other)
+            except (TypeError, ValueError):
+                return NotImplemented
+        if (self.width, self.height) != (other.width, other.height):
+            return False
+        return all(self.row(y) == other.row(y) for y in range(self.height))
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"PixelBuffer({self.width}x{self.height}, "
+                f"stride={self.stride})")
+
+
+# -----------------------------------------------------------------------------
+# Conversion shim
+# -----------------------------------------------------------------------------
+
+def as_buffer(image_data):
+    """Return ``image_data`` as a PixelBuffer (lists are packed, copied)."""
+    if isinstance(image_data, PixelBuffer):
+        return image_data
+    if isinstance(image_data, (list, tuple)):
+        return PixelBuffer.from_rows(image_data)
+    raise TypeError(f"Unsupported image type: {type(image_data).__name__}")
+
+
+def destination(image_data, out=None, inplace=False):
+    """Buffer a filter writes its result into: ``out`` (same size as
+    ``image_data``), ``image_data`` itself when ``inplace``, else a new
+    one. Call ``invalidate()`` on it once the pixels are written."""
+    if inplace:
+        if not isinstance(image_data, PixelBuffer):
+            raise TypeError("inplace=True needs a PixelBuffer source")
+        if out is not None and out is not image_data:
+            raise ValueError("Pass either out= or inplace=True, not both")
+        return image_data
+    if out is None:
+        return PixelBuffer.like(image_data)
+    if not isinstance(out, PixelBuffer):
+        raise TypeError(f"out must be a PixelBuffer, not "
+                        f"{type(out).__name__}")
+    h = len(image_data)
+    w = len(image_data[0]) if h else 0
+    if (out.width, out.height) != (w, h):
+        raise ValueError(f"out is {out.width}x{out.height}, the image is "
+                         f"{w}x{h}")
+    return out
+
+
+def allocations():
+    """(buffers, bytes) created since the last reset_allocations()."""
+    return tuple(_allocated)
+
+
+def reset_allocations():
+    _allocated[:] = [0, 0]
+
+
+def as_lists(image_data):
+    """Return ``image_data`` in the legacy list-of-lists layout."""
+    if isinstance(image_data, PixelBuffer):
+        return image_data.to_lists()
+    return image_data
+
+
+def is_image(image_data):
+    """True for a non-empty PixelBuffer or list-of-lists image."""
+    if isinstance(image_data, PixelBuffer):
+        return image_data.width > 0 and image_data.height > 0
+    return (isinstance(image_data, list) and bool(image_data)
+            and isinstance(image_data[0], list) and bool(image_data[0]))
+
+
+# -----------------------------------------------------------------------------
+# Pillow bridge
+# -----------------------------------------------------------------------------
+# Cells are native-endian 0x00RRGGBB, i.e. B, G, R, X bytes on little-endian
+# machines, which Pillow's "BGRX"/"XRGB" raw codecs pack and unpack in C.
+RAW_MODE = "BGRX" if sys.byteorder == "little" else "XRGB"
+FROM_PIL_BAND_BYTES = 4 * 1024 * 1024
+
+
+def from_pil(img):
+    """PIL image -> PixelBuffer, without per-pixel Python objects."""
+    with stage("from_pil", "convert") as st:
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        w, h = img.size
+        data = array("I", [0]) * (w * h)
+        dst = memoryview(data).cast("B")
+        # Band by band, so no full-size bytes copy exists next to the result
+        step = max(1, FROM_PIL_BAND_BYTES // max(1, 4 * w))
+        for y in range(0, h, step):
+            y1 = min(h, y + step)
+            band = img.crop((0, y, w, y1)).tobytes("raw", RAW_MODE)
+            dst[4 * w * y:4 * w * y1] = band
+        st.add(4 * w * h)
+    return PixelBuffer(w, h, data)
+
+
+def to_pil(image_data):
+    """PixelBuffer (or list-of-lists) -> PIL RGB image, unpacked in C."""
+    from PIL import Image
+
+    with stage("to_pil", "convert") as st:
+        buf = as_buffer(image_data)
+        raw = buf._mv[:buf.stride * buf.height].cast("B")
+        st.add(len(raw))
+        return Image.frombuffer("RGB", (buf.width, buf.height), raw, "raw",
+                                RAW_MODE, buf.stride * 4, 1)
@@ -0,0 +1,316 @@
+"""Median, min/max and percentile filters over square windows.
+
+    rank_filter(img, radius, rank="median", border="copy")
+    rank_filter(img, 5, "min")              # erode
+    rank_filter(img, 5, 90)                 # 90th percentile
+
+Each channel of the result is the ``k``-th smallest value of that channel
+in the (2r+1) x (2r+1) window around the pixel: k = 0 for "min", n*n - 1
+for "max", n*n // 2 for "median" and round(p / 100 * (n*n - 1)) for a
+percentile p. Three paths give identical results:
+
+- min and max are separable and use the van Herk/Gil-Werman running
+  extreme: a few comparisons per pixel per pass, whatever the radius;
+- small windows (up to DIRECT_WINDOW values) select directly from each
+  window;
+- anything else slides a 256-bin histogram over the image (Huang's
+  algorithm with the per-column histograms of Perreault and Hebert's
+  constant-time median). Each column keeps the histogram of its 2r+1
+  rows; moving down a row adds one value to each column and removes one,
+  and the window's histogram is a sum of columns. The search goes
+  through 16 coarse bins and then the 16 fine bins of the one it
+  lands in, so the cost per pixel does not depend on the radius.
+
+Border modes are convolve's: "copy" leaves pixels closer than the radius
+to the edge unchanged; "clamp", "reflect" and "wrap" pad the image. NumPy
+is used when installed, pure Python otherwise. Both paths read the input
+into channel planes before writing, so ``out=`` may be the input itself.
+"""
+import sys
+from bisect import bisect_right
+from itertools import accumulate, chain
+
+import np_backend
+from convolve import BORDER_MODES, pad_index, padded_channels
+from pixel_buffer import destination
+
+DIRECT_WINDOW = 25       # largest window (n*n values) selected directly
+BAND_PIXELS = 1 << 16    # NumPy path: output pixels per band of rows
+RANKS = ("min", "median", "max")
+
+
+def rank_index(n, rank):
+    """Index into the sorted n x n window for a rank name or percentile."""
+    last = n * n - 1
+    if rank == "min":
+        return 0
+    if rank == "max":
+        return last
+    if rank == "median":
+        return last // 2
+    if isinstance(rank, str) or not 0 <= rank <= 100:
+        raise ValueError(f"Rank must be one of {RANKS} or a percentile "
+                         f"0..100, not {rank!r}")
+    return round(rank * last / 100)
+
+
+# -----------------------------------------------------------------------------
+# Entry point
+# -----------------------------------------------------------------------------
+
+def rank_filter(image_data, radius=1, rank="median", border="copy",
+                use_numpy=None, out=None):
+    """Rank-filter an image over (2r+1)^2 windows; returns a PixelBuffer
+    (``out`` when given)."""
+    if border not in BORDER_MODES:
+        raise ValueError(f"Unknown border mode {border!r}; "
+                         f"choose from {BORDER_MODES}")
+    r = int(radius)
+    if r < 0:
+        raise ValueError("Radius must be 0 or more.")
+    n = 2 * r + 1
+    k = rank_index(n, rank)
+    if use_numpy is None:
+        use_numpy = np_backend.AVAILABLE
+    if use_numpy and np_backend.AVAILABLE:
+        return _rank_numpy(image_data, r, k, border, out)
+    return _rank_python(image_data, r, k, border, out)
+
+
+def _plan(n, k):
+    """Pick the path: "extreme" (min/max), "direct" or "histogram"."""
+    if k in (0, n * n - 1):
+        return "extreme"
+    if n * n <= DIRECT_WINDOW:
+        return "direct"
+    return "histogram"
+
+
+# -----------------------------------------------------------------------------
+# NumPy path
+# -----------------------------------------------------------------------------
+
+def _planes(image_data, r, border):
+    """Padded (h + 2r, w + 2r) uint8 planes of R, G and B."""
+    np = np_backend.np
+    h, w = len(image_data), len(image_data[0])
+    src = np_backend.to_packed(image_data)
+    yi, xi = pad_index(h, r, border), pad_index(w, r, border)
+    planes = [np.empty((h + 2 * r, w + 2 * r), dtype=np.uint8)
+              for _ in range(3)]
+    step = max(1, BAND_PIXELS // (w + 2 * r))
+    for y0 in range(0, h + 2 * r, step):
+        band = src[yi[y0:y0 + step]][:, xi]
+        for plane, shift in zip(planes, (16, 8, 0)):
+            plane[y0:y0 + step] = band >> shift
+    return planes
+
+
+def _running_extreme(a, n, op, fill):
+    """``op`` (np.minimum or np.maximum) of every n consecutive rows of
+    ``a``: a running prefix and suffix per block of n rows, so each window
+    is op(suffix of one block, prefix of the next)."""
+    np = np_backend.np
+    m = a.shape[0] - n + 1
+    blocks = -(-a.shape[0] // n)
+    b = np.full((blocks * n,) + a.shape[1:], fill, dtype=a.dtype)
+    b[:a.shape[0]] = a
+    b = b.reshape((blocks, n) + a.shape[1:])
+    pre = op.accumulate(b, axis=1).reshape((blocks * n,) + a.shape[1:])
+    suf = op.accumulate(b[:, ::-1], axis=1)[:, ::-1]
+    suf = suf.reshape((blocks * n,) + a.shape[1:])
+    return op(suf[:m], pre[n - 1:n - 1 + m])
+
+
+def _extreme_numpy(plane, h, w, n, k):
+    np = np_backend.np
+    op, fill = (np.minimum, 255) if k == 0 else (np.maximum, 0)
+    res = np.empty((h, w), dtype=np.uint8)
+    step = max(1, BAND_PIXELS // max(1, w))
+    for y0 in range(0, h, step):
+        y1 = min(h, y0 + step)
+        cols = _running_extreme(plane[y0:y1 + n - 1], n, op, fill)
+        res[y0:y1] = _running_extreme(cols.T, n, op, fill).T
+    return res
+
+
+def _direct_numpy(plane, h, w, n, k):
+    np = np_backend.np
+    res = np.empty((h, w), dtype=np.uint8)
+    step = max(1, BAND_PIXELS // max(1, w))
+    for y0 in range(0, h, step):
+        y1 = min(h, y0 + step)
+        stack = np.stack([plane[y0 + i:y1 + i, j:j + w]
+                          for i in range(n) for j in range(n)])
+        res[y0:y1] = np.partition(stack, k, axis=0)[k]
+    return res
+
+
+def _histogram_numpy(plane, h, w, n, k):
+    """Sliding histograms, one output row at a time.
+
+    ``fine``/``coarse`` hold each padded column's histogram over the
+    window's rows (256 and 16 bins). A cumulative sum across the columns
+    turns them into every window's histogram at once: window x is
+    cum[x + n] - cum[x]. Counts stay below W * n, so the sums run on
+    64-bit words holding four 16-bit (or two 32-bit) bins at a time.
+    """
+    np = np_backend.np
+    W = w + n - 1
+    lane = np.uint16 if W * n < 1 << 16 else np.uint32
+    fine = np.zeros((W, 256), dtype=lane)
+    coarse = np.zeros((W, 16), dtype=lane)
+    cum_f = np.zeros((W + 1, 256), dtype=lane)
+    cum_c = np.zeros((W + 1, 16), dtype=lane)
+    flat_f, flat_c = fine.reshape(-1), coarse.reshape(-1)
+    words_f, words_c = fine.view(np.uint64), coarse.view(np.uint64)
+    out_f, out_c = cum_f.view(np.uint64)[1:], cum_c.view(np.uint64)[1:]
+    cum_f, cum_c = cum_f.reshape(-1), cum_c.reshape(-1)
+    col_f, col_c = np.arange(W) * 256, np.arange(W) * 16
+    bins = (np.arange(w) * 256)[:, None] + np.arange(16)
+    lanes = np.arange(w) * 16
+    res = np.empty((h, w), dtype=np.uint8)
+
+    def add(row):
+        flat_f[col_f + row] += 1
+        flat_c[col_c + (row >> 4)] += 1
+
+    for y in range(n - 1):
+        add(plane[y])
+    for y in range(h):
+        add(plane[y + n - 1])
+        # Coarse bin c of each window, and how many values lie below it
+        np.add.accumulate(words_c, axis=0, out=out_c)
+        hist = cum_c[16 * n:] - cum_c[:-16 * n]
+        hist = np.cumsum(hist.reshape(w, 16), axis=1, dtype=lane)
+        c = (hist <= k).sum(axis=1)
+        below = hist.reshape(-1)[lanes + c - 1]
+        below[c == 0] = 0
+        # ... then the fine bin inside it
+        np.add.accumulate(words_f, axis=0, out=out_f)
+        idx = bins + 16 * c[:, None]
+        hist = cum_f[idx + 256 * n] - cum_f[idx]
+        np.cumsum(hist, axis=1, out=hist)
+        res[y] = 16 * c + (hist <= (k - below)[:, None]).sum(axis=1)
+        row = plane[y]
+        flat_f[col_f + row] -= 1
+        flat_c[col_c + (row >> 4)] -= 1
+    return res
+
+
+def _rank_numpy(image_data, r, k, border, out=None):
+    np = np_backend.np
+    h, w = len(image_data), len(image_data[0])
+    n = 2 * r + 1
+    rank_plane = {"extreme": _extreme_numpy, "direct": _direct_numpy,
+                  "histogram": _histogram_numpy}[_plan(n, k)]
+    planes = _planes(image_data, r, border)
+    out = destination(image_data, out)
+    dst = np_backend.to_packed(out)
+    for i, plane in enumerate(planes):
+        res = rank_plane(plane, h, w, n, k) if r else plane
+        if border == "copy" and r:
+            src = plane[r:r + h, r:r + w]
+            ys = np.r_[0:min(r, h), max(h - r, 0):h]
+            xs = np.r_[0:min(r, w), max(w - r, 0):w]
+            res[ys, :] = src[ys, :]
+            res[:, xs] = src[:, xs]
+        if i:
+            dst <<= 8
+            dst |= res
+        else:
+            dst[...] = res
+    out.invalidate()
+    return out
+
+
+# -----------------------------------------------------------------------------
+# Pure-Python path
+# -----------------------------------------------------------------------------
+
+def _running_1d(seq, n, op):
+    """van Herk/Gil-Werman: ``op`` (min or max) of every n consecutive
+    values, from a prefix and a suffix run per block of n."""
+    pre, suf = [], []
+    for i in range(0, len(seq), n):
+        block = seq[i:i + n]
+        pre += accumulate(block, op)
+        suf += reversed(list(accumulate(reversed(block), op)))
+    return list(map(op, suf, pre[n - 1:]))
+
+
+def _extreme_python(chan, h, w, n, k):
+    op = min if k == 0 else max
+    cols = [_running_1d(col, n, op) for col in zip(*chan)]
+    return [_running_1d(row, n, op) for row in zip(*cols)]
+
+
+def _direct_python(chan, h, w, n, k):
+    return [[sorted(chain.from_iterable(row[x:x + n] for row in rows))[k]
+             for x in range(w)]
+            for rows in (chan[y:y + n] for y in range(h))]
+
+
+def _histogram_python(chan, h, w, n, k):
+    """Sliding histograms packed into integers: bin v of a histogram is
+    the ``bits``-wide field at v * bits, so adding or removing a column
+    is one integer addition. Multiplying 16 bins by 1 + 2^bits + ...
+    leaves their running totals in the fields, which bisect searches."""
+    bits = 16 if n * n < 1 << 16 else 32
+    code = "H" if bits == 16 else "I"
+    fine = [1 << (v * bits) for v in range(256)]
+    coarse = [1 << ((v >> 4) * bits) for v in range(256)]
+    spread = sum(1 << (i * bits) for i in range(16))
+    mask = (1 << (16 * bits)) - 1
+    size, order = 4 * bits, sys.byteorder       # 32 fields
+    col_f = [0] * len(chan[0])
+    col_c = [0] * len(chan[0])
+    for row in chan[:n - 1]:
+        col_f = [a + fine[v] for a, v in zip(col_f, row)]
+        col_c = [a + coarse[v] for a, v in zip(col_c, row)]
+    result = []
+    for y in range(h):
+        row = chan[y + n - 1]
+        col_f = [a + fine[v] for a, v in zip(col_f, row)]
+        col_c = [a + coarse[v] for a, v in zip(col_c, row)]
+        hist_f, hist_c = sum(col_f[:n - 1]), sum(col_c[:n - 1])
+        line = []
+        for x in range(w):
+            hist_f += col_f[x + n - 1]
+            hist_c += col_c[x + n - 1]
+            totals = memoryview((hist_c * spread).to_bytes(size, order))
+            totals = totals.cast(code)
+            c = bisect_right(totals, k, 0, 16)
+            rest = k - totals[c - 1] if c else k
+            totals = (((hist_f >> (16 * c * bits)) & mask) * spread)
+            totals = memoryview(totals.to_bytes(size, order)).cast(code)
+            line.append(16 * c + bisect_right(totals, rest, 0, 16))
+            hist_f -= col_f[x]
+            hist_c -= col_c[x]
+        result.append(line)
+        row = chan[y]
+        col_f = [a - fine[v] for a, v in zip(col_f, row)]
+        col_c = [a - coarse[v] for a, v in zip(col_c, row)]
+    return result
+
+
+def _rank_python(image_data, r, k, border, out=None):
+    h, w = len(image_data), len(image_data[0])
+    n = 2 * r + 1
+    rank_plane = {"extreme": _extreme_python, "direct": _direct_python,
+                  "histogram": _histogram_python}[_plan(n, k)]
+    planes = [rank_plane(chan, h, w, n, k)
+              for chan in padded_channels(image_data, r, border)]
+    out = destination(image_data, out)
+    res_r, res_g, res_b = planes
+    for y in range(h):
+        src, dst = image_data[y], out[y]
+        edge_row = border == "copy" and (y < r or y >= h - r)
+        ar, ag, ab = res_r[y], res_g[y], res_b[y]
+        for x in range(w):
+            if edge_row or (border == "copy" and (x < r or x >= w - r)):
+                dst[x] = src[x]
+                continue
+            dst[x] = (ar[x] << 16) | (ag[x] << 8) | ab[x]
+    out.invalidate()
+    return out
@@ -0,0 +1,416 @@
+"""Memoized filter results, keyed by image content and parameters.
+
+    cache = ResultCache(disk_root="outputs/.result_cache")
+    a = cache.run(gamma_correction, img, 2.2)    # miss: runs the filter
+    b = cache.run(gamma_correction, img, 2.2)    # hit: no filter call
+    cache.save(b, "gamma.png", save_image)       # encodes once, then copies
+    print(cache.report())
+
+A result's key is a digest of the input pixels (content_hash), the
+filter's qualified name and bytecode, the source of its module and of the
+engines in ENGINE_MODULES, and its arguments bound to the
+signature with defaults filled in. ``backend`` is left out because every
+backend gives identical pixels. Lists and tuples count as equal, and
+objects can supply a ``cache_key()``. Arguments that cannot be normalised
+skip the cache.
+
+There are two tiers. The memory tier is an LRU bounded by ``max_bytes``.
+The optional disk tier keeps raw pixels under ``disk_root/results`` and
+encoded files under ``disk_root/encoded``, and evicts the least recently
+used files once they pass ``disk_max_bytes``. The cache keeps its own
+copies, so callers may modify what they pass in or get back.
+"""
+import hashlib
+import inspect
+import os
+import shutil
+import struct
+import sys
+import threading
+import uuid
+from array import array
+from collections import OrderedDict
+
+from output_stage import say
+from pixel_buffer import PixelBuffer, as_buffer
+
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_DISK_MAX_BYTES = 1024 * 1024 * 1024
+
+_HEADER = struct.Struct("<4sII")     # magic, width, height
+_MAGIC = b"PXB1"
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# Modules filters call into; their source is part of every key's version
+ENGINE_MODULES = ("convolve", "rank", "point_pipeline", "np_backend",
+                  "stdlib_backend", "pixel_buffer", "histogram", "resample",
+                  "photo_core.pixels")
+_engine_digest = None
+_module_digests = {}
+
+
+# -----------------------------------------------------------------------------
+# Keys
+# -----------------------------------------------------------------------------
+
+def content_hash(image_data):
+    """Hex digest of an image's size and pixels (row padding ignored)."""
+    buf = as_buffer(image_data)
+    # SHA-1 for speed (OpenSSL, often hardware assisted), not security
+    h = hashlib.sha1(_HEADER.pack(_MAGIC, buf.width, buf.height),
+                     usedforsecurity=False)
+    if buf.stride == buf.width:
+        h.update(buf._mv[:buf.width * buf.height].cast("B"))
+    else:
+        for y in range(buf.height):
+            h.update(buf.row(y).cast("B"))
+    return h.hexdigest()
+
+
+def _normalise(value):
+    """Stable, hashable form of an argument; TypeError if there is none."""
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalise(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _normalise(v))
+                            for k, v in value.items()))
+    if hasattr(value, "cache_key"):
+        return (type(value).__name__, _normalise(value.cache_key()))
+    raise TypeError(f"cannot key a {type(value).__name__} argument")
+
+
+def _source_digest(paths):
+    h = hashlib.blake2b(digest_size=8)
+    for path in paths:
+        try:
+            with open(path, "rb") as fh:
+                h.update(fh.read())
+        except OSError:
+            h.update(b"?")
+    return h.digest()
+
+
+def _engine_version():
+    """Digest of the ENGINE_MODULES sources (read once per process)."""
+    global _engine_digest
+    if _engine_digest is None:
+        _engine_digest = _source_digest(
+            os.path.join(HERE, *m.split(".")) + ".py"
+            for m in ENGINE_MODULES)
+    return _engine_digest
+
+
+def _code_version(fn):
+    """Digest of ``fn``'s bytecode, the source of its module (helpers it
+    calls live there) and the engines, so that editing any of them makes
+    old entries miss the disk tier."""
+    fn = inspect.unwrap(fn)
+    code = getattr(fn, "__code__", None)
+    if code is None:
+        return ""
+    consts = [c for c in code.co_consts if not inspect.iscode(c)]
+    h = hashlib.blake2b(code.co_code + repr(consts).encode(),
+                        digest_size=8)
+    h.update(_engine_version())
+    path = getattr(sys.modules.get(fn.__module__), "__file__", None)
+    if path is not None:
+        if path not in _module_digests:
+            _module_digests[path] = _source_digest([path])
+        h.update(_module_digests[path])
+    return h.hexdigest()
+
+
+def filter_key(fn, args=(), kwargs=None):
+    """(name, version, params) for ``fn(image, *args, **kwargs)``, or None
+    when the arguments cannot be normalised."""
+    kwargs = dict(kwargs or {})
+    kwargs.pop("backend", None)
+    if kwargs.pop("out", None) is not None or kwargs.pop("inplace", False):
+        return None          # the result lands in a buffer the caller owns
+    try:
+        bound = inspect.signature(fn).bind(None, *args, **kwargs)
+        bound.apply_defaults()
+        params = list(bound.arguments.items())[1:]   # drop the image
+        params = tuple((k, _normalise(v)) for k, v in params
+                       if k not in ("backend", "out", "inplace",
+                                    "scratch"))
+    except (TypeError, ValueError):
+        return None
+    name = f"{fn.__module__}.{fn.__qualname__}"
+    return name, _code_version(fn), params
+
+
+def result_key(fn, image_data, args=(), kwargs=None):
+    """Cache key for a filter call (hex string), or None if uncacheable."""
+    ident = filter_key(fn, args, kwargs)
+    if ident is None:
+        return None
+    h = hashlib.blake2b(content_hash(image_data).encode(), digest_size=20)
+    h.update(repr(ident).encode())
+    return h.hexdigest()
+
+
+# -----------------------------------------------------------------------------
+# Raw pixel files
+# -----------------------------------------------------------------------------
+
+def _write_pixels(buf, path):
+    buf = buf if buf.stride == buf.width else buf.copy()
+    data = array("I", buf._mv[:buf.width * buf.height])
+    if sys.byteorder == "big":
+        data.byteswap()
+    with open(path, "wb") as fh:
+        fh.write(_HEADER.pack(_MAGIC, buf.width, buf.height))
+        data.tofile(fh)
+
+
+def _read_pixels(path):
+    with open(path, "rb") as fh:
+        magic, w, h = _HEADER.unpack(fh.read(_HEADER.size))
+        if magic != _MAGIC:
+            raise ValueError(f"Not a pixel cache file: {path}")
+        data = array("I")
+        data.fromfile(fh, w * h)
+    if sys.byteorder == "big":
+        data.byteswap()
+    return PixelBuffer(w, h, data)
+
+
+# -----------------------------------------------------------------------------
+# Cache
+# -----------------------------------------------------------------------------
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache of filter results."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, disk_root=None,
+                 disk_max_bytes=DEFAULT_DISK_MAX_BYTES, quiet=False):
+        self.max_bytes = int(max_bytes)
+        self.quiet = quiet    # no "Saved:" line for copied encodes
+        self.disk_root = disk_root
+        self.disk_max_bytes = int(disk_max_bytes)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+        self.encode_hits = 0
+        self.encode_misses = 0
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()    # key -> PixelBuffer, oldest first
+        self._memory_bytes = 0
+        self._files = None              # disk path -> (size, last use)
+
+    # --- memory tier --------------------------------------------------------
+    def _remember(self, key, buf):
+        size = buf.nbytes()
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old.nbytes()
+            self._memory[key] = buf
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_bytes:
+                _, dropped = self._memory.popitem(last=False)
+                self._memory_bytes -= dropped.nbytes()
+
+    # --- disk tier ----------------------------------------------------------
+    def _disk_path(self, kind, name):
+        return os.path.join(self.disk_root, kind, name)
+
+    def _scan(self):
+        """Index the disk tier once: path -> (size, mtime)."""
+        if self._files is None:
+            self._files = {}
+            for kind in ("results", "encoded"):
+                folder = os.path.join(self.disk_root, kind)
+                try:
+                    entries = list(os.scandir(folder))
+                except OSError:
+                    continue
+                for e in entries:
+                    if e.is_file() and not e.name.startswith("."):
+                        st = e.stat()
+                        self._files[e.path] = (st.st_size, st.st_mtime)
+        return self._files
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        with self._lock:
+            self._scan()[path] = (size, os.path.getmtime(path))
+        return True
+
+    def _store(self, path, write):
+        """Create ``path`` via ``write(tmp_path)`` atomically, then evict."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = os.path.join(os.path.dirname(path),
+                           f".{uuid.uuid4().hex}.tmp")
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        except OSError as e:
+            say(f"Result cache: could not write {path}: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self._touch(path)
+        self._evict()
+
+    def disk_bytes(self):
+        with self._lock:
+            return sum(size for size, _ in self._scan().values())
+
+    def _evict(self):
+        with self._lock:
+            files = self._scan()
+            total = sum(size for size, _ in files.values())
+            for path in sorted(files, key=lambda p: files[p][1]):
+                if total <= self.disk_max_bytes:
+                    break
+                total -= files[path][0]
+                self._drop(path)
+
+    def _drop(self, path):
+        with self._lock:
+            self._scan().pop(path, None)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    # --- results ------------------------------------------------------------
+    def get(self, key):
+        """Copy of the cached result for ``key``, or None."""
+        with self._lock:
+            buf = self._memory.get(key)
+            if buf is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return buf.copy()
+        if self.disk_root:
+            path = self._disk_path("results", key)
+            if self._touch(path):
+                try:
+                    buf = _read_pixels(path)
+                except (OSError, ValueError, EOFError, struct.error) as e:
+                    say(f"Result cache: dropping unreadable {path}: {e}")
+                    self._drop(path)
+                else:
+                    with self._lock:
+                        self.disk_hits += 1
+                    self._remember(key, buf)
+                    return buf.copy()
+        return None
+
+    def put(self, key, image_data):
+        """Store a result (a PixelBuffer; other values are not cached)."""
+        if not isinstance(image_data, PixelBuffer):
+            return
+        self._remember(key, image_data.copy())   # the caller keeps theirs
+        if self.disk_root:
+            self._store(self._disk_path("results", key),
+                        lambda tmp: _write_pixels(image_data, tmp))
+
+    def cached(self, run=None):
+        """Wrap ``run(fn, image, *args, **kwargs)`` (default: call ``fn``)
+        so that repeated calls are answered from the cache."""
+        def call(fn, image_data, *args, **kwargs):
+            if run is None:
+                return fn(image_data, *args, **kwargs)
+            return run(fn, image_data, *args, **kwargs)
+
+        def wrapper(fn, image_data, *args, **kwargs):
+            key = result_key(fn, image_data, args, kwargs)
+            if key is None:
+                with self._lock:
+                    self.uncacheable += 1
+                return call(fn, image_data, *args, **kwargs)
+            result = self.get(key)
+            if result is None:
+                with self._lock:
+                    self.misses += 1
+                result = call(fn, image_data, *args, **kwargs)
+                self.put(key, result)
+            return result
+        return wrapper
+
+    def run(self, fn, image_data, *args, **kwargs):
+        """``fn(image_data, *args, **kwargs)``, memoized."""
+        return self.cached()(fn, image_data, *args, **kwargs)
+
+    # --- encoded outputs ----------------------------------------------------
+    def save(self, image_data, filepath, save_fn, **options):
+        """``save_fn(image_data, filepath, **options)``, unless the same
+        pixels were already encoded with the same extension and options;
+        then the cached file is copied. Needs the disk tier."""
+        if not self.disk_root:
+            return save_fn(image_data, filepath, **options)
+        try:
+            opts = _normalise(options)
+        except TypeError:
+            return save_fn(image_data, filepath, **options)
+        ext = os.path.splitext(filepath)[1].lower()
+        h = hashlib.blake2b(content_hash(image_data).encode(),
+                            digest_size=20)
+        h.update(repr((ext, opts)).encode())
+        path = self._disk_path("encoded", h.hexdigest() + ext)
+        if self._touch(path):
+            try:
+                shutil.copyfile(path, filepath)
+            except OSError:
+                pass
+            else:
+                with self._lock:
+                    self.encode_hits += 1
+                if not self.quiet:
+                    say(f"Saved: {os.path.abspath(filepath)} (cached)")
+                return filepath
+        with self._lock:
+            self.encode_misses += 1
+        result = save_fn(image_data, filepath, **options)
+        if result:
+            self._store(path, lambda tmp: shutil.copyfile(filepath, tmp))
+        return result
+
+    def saver(self, save_fn):
+        """``save_fn`` routed through save(), e.g. for OutputQueue."""
+        def save(image_data, filepath, **options):
+            return self.save(image_data, filepath, save_fn, **options)
+        return save
+
+    # --- statistics ---------------------------------------------------------
+    def stats(self):
+        with self._lock:
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "uncacheable": self.uncacheable,
+                "encode_hits": self.encode_hits,
+                "encode_misses": self.encode_misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_bytes": self.disk_bytes() if self.disk_root else 0,
+            }
+
+    def report(self):
+        """One-line summary for the console."""
+        s = self.stats()
+        lookups = s["memory_hits"] + s["disk_hits"] + s["misses"]
+        rate = (s["memory_hits"] + s["disk_hits"]) / lookups \
+            if lookups else 0.0
+        msg = (f"Result cache: {s['memory_hits']} memory + "
+               f"{s['disk_hits']} disk hit(s), {s['misses']} miss(es) "
+               f"({rate:.0%})")
+        if self.disk_root:
+            msg += (f"; encodes {s['encode_hits']} reused, "
+                    f"{s['encode_misses']} new; "
+                    f"{s['disk_bytes'] / 1e6:.1f} MB on disk")
+        return msg
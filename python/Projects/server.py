@@ -0,0 +1,605 @@
+"""Local image-processing service with a warm worker pool.
+
+    python server.py --port 8765 --workers 4 --cache-dir outputs/.result_cache
+    python server.py --socket /tmp/photo_editor.sock
+
+    curl -s localhost:8765/process -H 'Content-Type: application/json' -d '{
+        "source": {"path": "photo.jpg"},
+        "outputs": [{"name": "gray", "filter": "to_grayscale"},
+                    {"name": "bw", "filter": "threshold_gray",
+                     "input": "gray", "args": ["otsu"]}]}'
+    curl -s localhost:8765/metrics
+
+POST /process takes one image and the outputs to make from it, written
+like a batch manifest (name, filter, args, kwargs, format, save) plus an
+optional ``input`` naming an earlier output to start from. The source is
+``{"path": ...}``, ``{"url": ...}`` or ``{"data": <base64>}``. An
+``image/*`` body is taken as the image itself, with the request in the
+``job`` query parameter; other content types get 415. Results come back
+base64-encoded in the JSON reply, or are written to ``output_dir`` when
+the request names one; it must lie inside ``--output-root``, and is
+refused when no root is set. ``?raw=1`` with a single output replies
+with the encoded image.
+
+The workers are started and have imported the editor before the server
+listens, so a request only pays for decoding, filtering and encoding. Each
+worker keeps a ResultCache (memory, plus ``--cache-dir`` on disk, shared by
+all workers) and the editor's HTTP cache. At most ``workers + queue``
+requests are admitted; the rest get 503 with Retry-After. A request still
+running after ``--timeout`` gets 504, and its worker gives up at the next
+filter or encode step. GET /metrics reports queue depth, counters and
+latency percentiles; GET /health answers once the pool is up.
+
+There is no authentication, and a source path may be any file the
+server's user can read: keep it on localhost or a private socket. POSTs
+from browser pages on other origins (an Origin header other than the
+server's own) get 403.
+"""
+import argparse
+import base64
+import binascii
+import contextlib
+import io
+import json
+import math
+import multiprocessing
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from PIL import Image
+
+import batch
+import graph
+import np_backend
+from encode import DEFAULT_PROFILE, encode, encode_image, format_for
+from photo_core import net
+from photo_core.editor import load_editor
+from photo_core.files import load_image
+from pixel_buffer import is_image
+from result_cache import ResultCache
+from stream_decode import ImageTooLarge, decode_stream
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_TIMEOUT = 60.0
+MAX_BODY_BYTES = 100 * 1024 * 1024
+JSON_TYPE = "application/json"
+LATENCY_WINDOW = 1000        # requests kept for the percentiles
+
+
+class Busy(Exception):
+    """Every worker and queue slot is taken."""
+
+
+class JobTimeout(Exception):
+    """A request ran past its deadline."""
+
+
+# -----------------------------------------------------------------------------
+# Worker side (runs in the pool processes)
+# -----------------------------------------------------------------------------
+
+_editor = None
+_cache = None
+
+
+def _init_worker(cache_mb, cache_dir, cache_dir_mb, http_cache):
+    global _editor, _cache
+    with contextlib.redirect_stdout(io.StringIO()):
+        _editor = load_editor()
+    np_backend.AVAILABLE     # imports NumPy now rather than on a request
+    if not http_cache:
+        net.HTTP_CACHE = None
+    _cache = ResultCache(cache_mb << 20, disk_root=cache_dir,
+                         disk_max_bytes=cache_dir_mb << 20, quiet=True)
+
+
+def _warm(_):
+    return os.getpid()
+
+
+def _check(deadline):
+    if time.time() > deadline:
+        raise JobTimeout("request timed out")
+
+
+def _load_source(source, max_size):
+    if "bytes" in source:
+        raw = source["bytes"]
+        return decode_stream(io.BytesIO(raw), net.MAX_DOWNLOAD_BYTES,
+                             net.MAX_IMAGE_PIXELS, max_size=max_size,
+                             length=len(raw))
+    if "url" in source:
+        return net.load_image_from_url(source["url"], max_size)
+    if "path" in source:
+        return load_image(source["path"], max_size)
+    raise ValueError("source needs one of: path, url, data")
+
+
+def _build(job, img):
+    """({name: Node}, {name: Output}) for the request's outputs."""
+    outputs = batch.parse_outputs(job, _editor.FILTERS,
+                                  _editor.MANIFEST_CONSTANTS)
+    if not outputs:
+        raise ValueError("request lists no outputs")
+    src, nodes = graph.source(img), {}
+    for entry, o in zip(job["outputs"], outputs):
+        if o.name in nodes:
+            raise ValueError(f"duplicate output name {o.name!r}")
+        base = src
+        if entry.get("input"):
+            base = nodes.get(entry["input"])
+            if base is None:
+                raise ValueError(f"output {o.name!r}: input "
+                                 f"{entry['input']!r} is not an earlier "
+                                 "output")
+        nodes[o.name] = (base if o.fn is None else
+                         _editor.lazy.call(o.fn, base, *o.args, **o.kwargs))
+    return nodes, {o.name: o for o in outputs}
+
+
+def _write(image, path, **options):
+    """save_image without its console line (workers stay quiet)."""
+    encode(image, path, **options)
+    return path
+
+
+def _encode(name, image, output, job):
+    save = dict(output.save)
+    profile = save.pop("profile", job.get("profile", DEFAULT_PROFILE))
+    fmt = format_for(None, output.format)
+    entry = {"name": name, "format": output.format}
+    out_dir = job.get("output_dir")
+    if out_dir is None:
+        entry["data"] = encode_image(image, fmt, profile, **save)
+        entry["bytes"] = len(entry["data"])
+    else:
+        if os.path.basename(name) != name:
+            raise ValueError(f"output name {name!r} is not a file name")
+        out_dir = os.path.abspath(out_dir)
+        path = os.path.abspath(os.path.join(out_dir,
+                                            f"{name}.{output.format}"))
+        if os.path.commonpath([out_dir, path]) != out_dir:
+            raise ValueError(f"output {name!r} would leave output_dir")
+        os.makedirs(out_dir, exist_ok=True)
+        if _cache.save(image, path, _write, profile=profile,
+                       **save) is None:
+            raise OSError(f"could not write {path}")
+        entry["path"], entry["bytes"] = path, os.path.getsize(path)
+    # Image.MIME fills in as codec plugins load, so look it up afterwards
+    entry["content_type"] = Image.MIME.get(fmt, "application/octet-stream")
+    return entry
+
+
+def _run_job(job, deadline):
+    """Load the source, compute every output, encode or write each one.
+    Raises JobTimeout between steps once ``deadline`` has passed."""
+    _check(deadline)
+    t0 = time.perf_counter()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        img = _load_source(job["source"], job.get("max_size"))
+        if not is_image(img):
+            lines = log.getvalue().strip().splitlines()
+            raise ValueError(lines[-1] if lines else "could not load image")
+        width, height = img.width, img.height
+        t_load = time.perf_counter()
+        nodes, outputs = _build(job, img)
+        del img
+
+        def checked(fn, *args, **kwargs):
+            _check(deadline)
+            return fn(*args, **kwargs)
+
+        results, encode_s = {}, 0.0
+        for name, image in graph.evaluate(nodes, 1, _cache.cached(checked)):
+            _check(deadline)
+            t = time.perf_counter()
+            results[name] = _encode(name, image, outputs[name], job)
+            encode_s += time.perf_counter() - t
+            del image
+    total = time.perf_counter() - t0
+    return {
+        "width": width, "height": height, "worker": os.getpid(),
+        "outputs": [results[name] for name in nodes],
+        "timings_ms": {
+            "load": round((t_load - t0) * 1000, 2),
+            "filter": round((total - (t_load - t0) - encode_s) * 1000, 2),
+            "encode": round(encode_s * 1000, 2),
+            "total": round(total * 1000, 2)},
+    }
+
+
+# -----------------------------------------------------------------------------
+# Pool, backpressure and metrics
+# -----------------------------------------------------------------------------
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Metrics:
+    """Request counters and a sliding window of latencies."""
+
+    COUNTERS = ("accepted", "completed", "failed", "rejected", "timeouts")
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.latencies = deque(maxlen=window)
+        self.in_flight = 0
+        self.started = time.time()
+
+    def count(self, name, delta=1):
+        with self._lock:
+            self.counts[name] += delta
+
+    def begin(self):
+        with self._lock:
+            self.counts["accepted"] += 1
+            self.in_flight += 1
+
+    def end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def snapshot(self, workers, capacity):
+        with self._lock:
+            lat = sorted(self.latencies)
+            counts, in_flight = dict(self.counts), self.in_flight
+        ms = {f"p{p}": round(percentile(lat, p) * 1000, 2) if lat else None
+              for p in (50, 90, 99)}
+        ms["max"] = round(lat[-1] * 1000, 2) if lat else None
+        return {"uptime_s": round(time.time() - self.started, 1),
+                "workers": workers, "capacity": capacity,
+                "in_flight": in_flight,
+                "queue_depth": max(0, in_flight - workers),
+                **counts, "latency_ms": ms, "latency_window": len(lat)}
+
+
+class ImageService:
+    """Admits requests up to ``workers + queue`` and runs them on a warm
+    process pool."""
+
+    def __init__(self, workers, queue=None, timeout=DEFAULT_TIMEOUT,
+                 cache_mb=256, cache_dir=None, cache_dir_mb=1024,
+                 http_cache=True):
+        self.workers = workers
+        self.capacity = workers + (workers if queue is None else queue)
+        self.timeout = timeout
+        self.metrics = Metrics()
+        self._initargs = (cache_mb, cache_dir, cache_dir_mb, http_cache)
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self.pool = self._start_pool()
+
+    def _start_pool(self):
+        # Not fork: the pool is replaced after a crash, when the HTTP
+        # threads are running, and forking a threaded process can hang.
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context(
+            "forkserver" if "forkserver" in methods else "spawn")
+        pool = ProcessPoolExecutor(self.workers, mp_context=ctx,
+                                   initializer=_init_worker,
+                                   initargs=self._initargs)
+        # Start every worker (and its editor import) now, not on the
+        # first requests.
+        futures = [pool.submit(_warm, i) for i in range(self.workers)]
+        for future in futures:
+            future.result()
+        return pool
+
+    def _restart(self, broken):
+        with self._lock:
+            if self.pool is broken:
+                print("Worker pool broke; starting a new one",
+                      file=sys.stderr)
+                broken.shutdown(wait=False, cancel_futures=True)
+                self.pool = self._start_pool()
+
+    def _finished(self, future):
+        self.metrics.end()
+        self._slots.release()
+
+    def process(self, job):
+        """Run ``job`` and return its result dict. Raises Busy when no slot
+        is free and JobTimeout after ``timeout`` seconds."""
+        if not self._slots.acquire(blocking=False):
+            self.metrics.count("rejected")
+            raise Busy()
+        start = time.perf_counter()
+        pool = self.pool
+        try:
+            future = pool.submit(_run_job, job, time.time() + self.timeout)
+        except BaseException as e:
+            # No done-callback will release the slot (the pool may also be
+            # mid-restart: "cannot schedule new futures after shutdown")
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._restart(pool)
+            raise
+        self.metrics.begin()
+        # The slot is held until the worker is done, even after a timeout
+        future.add_done_callback(self._finished)
+        try:
+            result = future.result(timeout=self.timeout)
+        except (FutureTimeout, JobTimeout):
+            self.metrics.count("timeouts")
+            raise JobTimeout("request timed out") from None
+        except BrokenProcessPool:
+            self.metrics.count("failed")
+            self._restart(pool)
+            raise
+        except Exception:
+            self.metrics.count("failed")
+            raise
+        finally:
+            self.metrics.record(time.perf_counter() - start)
+        self.metrics.count("completed")
+        return result
+
+    def snapshot(self):
+        return self.metrics.snapshot(self.workers, self.capacity)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+# -----------------------------------------------------------------------------
+# HTTP
+# -----------------------------------------------------------------------------
+
+class Handler(BaseHTTPRequestHandler):
+    server_version = "PhotoEditor/2.0"
+    protocol_version = "HTTP/1.1"
+    quiet = False
+
+    def address_string(self):
+        if isinstance(self.client_address, tuple):
+            return self.client_address[0]
+        return "unix"
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type, headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, status, obj, headers=()):
+        body = json.dumps(obj).encode() + b"\n"
+        self._send(status, body, "application/json", headers)
+
+    def _error(self, status, message, headers=()):
+        self._json(status, {"error": message}, headers)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            self._json(200, self.server.service.snapshot())
+        elif path == "/health":
+            self._json(200, {"status": "ok",
+                             "workers": self.server.service.workers})
+        else:
+            self._error(404, f"no such endpoint: {path}")
+
+    def _output_dir(self, path):
+        """``path`` resolved, if it lies inside the server's output root."""
+        root = self.server.output_root
+        if root is None:
+            raise ValueError("output_dir is disabled (start the server "
+                             "with --output-root)")
+        if not isinstance(path, str):
+            raise ValueError("output_dir must be a string")
+        path = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, path]) != root:
+            raise ValueError(f"output_dir must be inside {root}")
+        return path
+
+    def _refusal(self):
+        """(status, message) when the request may not be processed."""
+        origin = self.headers.get("Origin")
+        if origin is not None and origin not in self.server.origins:
+            return 403, f"cross-origin request from {origin} refused"
+        ctype = self.headers.get_content_type()
+        if ctype != JSON_TYPE and not ctype.startswith("image/"):
+            return 415, (f"unsupported Content-Type {ctype!r}: send "
+                         f"{JSON_TYPE} or image/*")
+        return None
+
+    def _read_job(self, query):
+        length = self.headers.get("Content-Length")
+        if length is None:
+            raise ValueError("Content-Length is required")
+        length = int(length)
+        if length < 0:
+            raise ValueError("Content-Length must not be negative")
+        if length > MAX_BODY_BYTES:
+            raise ImageTooLarge(f"request body is {length} bytes, limit "
+                                f"{MAX_BODY_BYTES}")
+        body = self.rfile.read(length)
+        is_json = self.headers.get_content_type() == JSON_TYPE
+        job = json.loads(body if is_json else query.get("job", ["{}"])[0])
+        if not isinstance(job, dict):
+            raise ValueError("request must be a JSON object")
+        if job.get("output_dir") is not None:
+            job["output_dir"] = self._output_dir(job["output_dir"])
+        if not is_json:
+            job["source"] = {"bytes": body}
+        source = job.get("source")
+        if not isinstance(source, dict):
+            raise ValueError("request needs a source object")
+        if "data" in source:
+            job["source"] = {"bytes": base64.b64decode(source["data"],
+                                                       validate=True)}
+        return job
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/process":
+            self.close_connection = True
+            self._error(404, f"no such endpoint: {url.path}")
+            return
+        query = parse_qs(url.query)
+        refusal = self._refusal()
+        if refusal is not None:
+            self.close_connection = True
+            self._error(*refusal)
+            return
+        try:
+            job = self._read_job(query)
+        except ImageTooLarge as e:
+            self.close_connection = True
+            self._error(413, str(e))
+            return
+        except (ValueError, TypeError, binascii.Error) as e:
+            self.close_connection = True
+            self._error(400, f"bad request: {e}")
+            return
+        try:
+            result = self.server.service.process(job)
+        except Busy:
+            self._error(503, "busy: all workers and queue slots are taken",
+                        [("Retry-After", "1")])
+            return
+        except JobTimeout:
+            self._error(504, "request timed out "
+                             f"after {self.server.service.timeout:g}s")
+            return
+        except ImageTooLarge as e:
+            self._error(413, str(e))
+            return
+        except (ValueError, TypeError, KeyError) as e:
+            self._error(400, f"{type(e).__name__}: {e}")
+            return
+        except Exception as e:
+            self._error(500, f"{type(e).__name__}: {e}")
+            return
+
+        outputs = result["outputs"]
+        if query.get("raw") == ["1"]:
+            if len(outputs) != 1 or "data" not in outputs[0]:
+                self._error(400, "raw=1 needs exactly one in-memory output")
+                return
+            self._send(200, outputs[0]["data"], outputs[0]["content_type"],
+                       [("X-Worker-Ms", str(result["timings_ms"]["total"]))])
+            return
+        for entry in outputs:
+            if "data" in entry:
+                entry["data"] = base64.b64encode(entry["data"]).decode()
+        self._json(200, result)
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn,
+                     socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def own_origins(host, port):
+    """Origins a browser sends for pages served by this server itself."""
+    names = {f"[{host}]" if ":" in host else host}
+    if host in ("127.0.0.1", "localhost", "::1"):
+        names |= {"127.0.0.1", "localhost", "[::1]"}
+    return {f"http://{name}:{port}" for name in names}
+
+
+# -----------------------------------------------------------------------------
+# Main
+# -----------------------------------------------------------------------------
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help=f"address to listen on, default {DEFAULT_HOST}")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help=f"TCP port, default {DEFAULT_PORT}")
+    parser.add_argument("--socket", default=None, metavar="PATH",
+                        help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes, default: CPUs")
+    parser.add_argument("--queue", type=int, default=None,
+                        help="requests allowed to wait for a worker before "
+                             "503s start, default: --workers")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="seconds before a request gets 504, default "
+                             f"{DEFAULT_TIMEOUT:g}")
+    parser.add_argument("--cache-mb", type=int, default=256,
+                        help="in-memory result cache per worker, "
+                             "default 256")
+    parser.add_argument("--cache-dir", default=None,
+                        help="shared on-disk result cache (default: none)")
+    parser.add_argument("--cache-dir-mb", type=int, default=1024,
+                        help="disk budget for --cache-dir, default 1024")
+    parser.add_argument("--output-root", default=None, metavar="DIR",
+                        help="directory that request output_dirs must lie "
+                             "in (default: output_dir is refused)")
+    parser.add_argument("--no-http-cache", action="store_true",
+                        help="always download URLs (skip the HTTP cache)")
+    parser.add_argument("--quiet", action="store_true",
+                        help="do not log every request")
+    cli = parser.parse_args(argv)
+    if cli.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    t0 = time.perf_counter()
+    service = ImageService(cli.workers, cli.queue, cli.timeout,
+                           cli.cache_mb, cli.cache_dir, cli.cache_dir_mb,
+                           not cli.no_http_cache)
+    print(f"Started {cli.workers} warm worker(s) in "
+          f"{time.perf_counter() - t0:.2f}s")
+
+    Handler.quiet = cli.quiet
+    if cli.socket:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(cli.socket)
+        server = UnixHTTPServer(cli.socket, Handler)
+        server.origins = set()
+        where = cli.socket
+    else:
+        server = ThreadingHTTPServer((cli.host, cli.port), Handler)
+        server.origins = own_origins(cli.host, server.server_address[1])
+        where = f"http://{cli.host}:{server.server_address[1]}"
+    server.service = service
+    server.output_root = (os.path.realpath(cli.output_root)
+                          if cli.output_root else None)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Serving on {where} (capacity {service.capacity}, "
+          f"timeout {cli.timeout:g}s)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        if cli.socket:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(cli.socket)
+
+
+if __name__ == "__main__":
+    main()
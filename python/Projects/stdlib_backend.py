@@ -0,0 +1,168 @@
+"""Dependency-free backend: table and mask filters on raw pixel bytes.
+
+For installs without NumPy. A PixelBuffer stores B, G, R, X bytes per
+pixel (X, R, G, B on big-endian machines), the layout Pillow's raw codec
+reads and writes, so whole bands of pixels are transformed by C-level
+bytes operations instead of a Python loop per pixel:
+
+- per-channel tables are one ``bytes.translate`` over the band (the same
+  table for R, G and B) or one per channel, each channel's bytes sliced
+  out with a step of 4 and assigned back;
+- remove_green and swap_red_blue are slice assignments between channel
+  positions;
+- grayscale adds R, G and B in 32-bit lanes of one big integer and
+  divides by 3 with a multiply; threshold is one more table on that.
+
+Results are bit-identical to the Python loops and np_backend. Functions
+mirror np_backend's and return a PixelBuffer (``out`` when given, which
+may be the source). Cross-channel matrices (sepia) are not covered.
+"""
+import sys
+
+from pixel_buffer import PixelBuffer, as_buffer, destination
+
+BAND_PIXELS = 1 << 16      # pixels per band in map_bytes
+
+# Byte offsets of R, G, B and the unused X byte inside a packed cell
+if sys.byteorder == "little":
+    _R, _G, _B, _X = 2, 1, 0, 3
+else:
+    _R, _G, _B, _X = 1, 2, 3, 0
+_POS = (_R, _G, _B)
+# floor(s / 3) == (s * _DIV3) >> 24 for every s < 2**23, and for s <= 765
+# the product stays below 2**32, so 32-bit lanes never carry
+_DIV3 = (1 << 24) // 3 + 1
+
+
+# -----------------------------------------------------------------------------
+# Bands and channel planes
+# -----------------------------------------------------------------------------
+
+def map_bytes(image_data, fn, out=None):
+    """Store ``fn(cells)`` for each band of raw cell bytes in ``out`` (a
+    new PixelBuffer when None) and return it; like np_backend.map_rows.
+    ``fn`` gets a bytes copy, so ``out`` may be the source."""
+    src = as_buffer(image_data)
+    if src.stride != src.width:
+        src = src.copy()
+    target = destination(src, out)
+    dst = target if target.stride == target.width else PixelBuffer.like(src)
+    n = 4 * src.width * src.height
+    s = src._mv[:src.width * src.height].cast("B")
+    d = dst._mv[:dst.width * dst.height].cast("B")
+    step = 4 * BAND_PIXELS
+    for i in range(0, n, step):
+        d[i:i + step] = fn(bytes(s[i:i + step]))
+    if dst is not target:
+        target.paste(dst)
+    target.invalidate()
+    return target
+
+
+def split(cells):
+    """Raw cell bytes -> (r, g, b) planes of one byte per pixel."""
+    return cells[_R::4], cells[_G::4], cells[_B::4]
+
+
+def pack(r, g, b):
+    """(r, g, b) planes -> raw cell bytes (X bytes zero)."""
+    cells = bytearray(4 * len(r))
+    cells[_R::4] = r
+    cells[_G::4] = g
+    cells[_B::4] = b
+    return cells
+
+
+def mean3(r, g, b):
+    """(r + g + b) // 3 per pixel, as a plane."""
+    n = len(r)
+    lane = bytearray(4 * n)
+    total = 0
+    for plane in (r, g, b):
+        lane[0::4] = plane
+        total += int.from_bytes(lane, "little")
+    return (total * _DIV3).to_bytes(4 * n, "little")[3::4]
+
+
+def _table(lut):
+    table = bytes(lut)
+    if len(table) != 256:
+        raise ValueError("LUTs must have exactly 256 entries.")
+    return table
+
+
+# -----------------------------------------------------------------------------
+# Point filters
+# -----------------------------------------------------------------------------
+
+def apply_lut(image_data, lut_r, lut_g=None, lut_b=None, out=None):
+    """Map each channel through a 256-entry table (one table = all three)."""
+    tr = _table(lut_r)
+    tg = tr if lut_g is None else _table(lut_g)
+    tb = tr if lut_b is None else _table(lut_b)
+    return remap(image_data, (0, 1, 2), (tr, tg, tb), out)
+
+
+def remap(image_data, perm, luts, out=None):
+    """Channel c of the result = luts[c] applied to channel perm[c]
+    (0 = R, 1 = G, 2 = B); a None table copies, an all-zero one clears."""
+    tables = [None if t is None else _table(t) for t in luts]
+    if tuple(perm) == (0, 1, 2) and tables[0] is not None and \
+            tables[0] == tables[1] == tables[2]:
+        table = tables[0]
+
+        def cells(raw):            # one table: translate every byte at once
+            res = bytearray(raw.translate(table))
+            res[_X::4] = bytes(len(raw) // 4)
+            return res
+        return map_bytes(image_data, cells, out)
+
+    def cells(raw):
+        res = bytearray(len(raw))
+        for pos, c, table in zip(_POS, perm, tables):
+            if table is not None and not any(table):
+                continue
+            chan = raw[_POS[c]::4]
+            res[pos::4] = chan if table is None else chan.translate(table)
+        return res
+    return map_bytes(image_data, cells, out)
+
+
+def _channel_tables(op, mask):
+    """Per-channel tables for ``px op mask`` (None where it is a no-op)."""
+    tables = []
+    for shift in (16, 8, 0):
+        m = (mask >> shift) & 0xFF
+        table = bytes(op(i, m) for i in range(256))
+        tables.append(None if table == bytes(range(256)) else table)
+    return tables
+
+
+def xor_mask(image_data, mask, out=None):
+    return remap(image_data, (0, 1, 2),
+                 _channel_tables(lambda i, m: i ^ m, mask), out)
+
+
+def and_mask(image_data, mask, out=None):
+    return remap(image_data, (0, 1, 2),
+                 _channel_tables(lambda i, m: i & m, mask), out)
+
+
+def swap_red_blue(image_data, out=None):
+    return remap(image_data, (2, 1, 0), (None, None, None), out)
+
+
+def to_grayscale(image_data, out=None):
+    def cells(raw):
+        gray = mean3(*split(raw))
+        return pack(gray, gray, gray)
+    return map_bytes(image_data, cells, out)
+
+
+def threshold_bw(image_data, t, out=None):
+    table = bytes(255 if i >= t else 0 for i in range(256))
+
+    def cells(raw):
+        bw = mean3(*split(raw)).translate(table)
+        return pack(bw, bw, bw)
+    return map_bytes(image_data, cells, out)
@@ -0,0 +1,120 @@
+"""Chunked image decoding from a stream with byte and pixel caps.
+
+    with open_url(url) as r:
+        img = decode_stream(r, max_bytes=100 << 20, max_pixels=50_000_000,
+                            on_header=lambda size, fmt: print(size, fmt))
+
+The body is read ``CHUNK_SIZE`` bytes at a time into Pillow's
+``ImageFile.Parser`` until the header is recognised; the pixel cap and
+``on_header`` run at that point, before the bulk of the body is read. Formats
+the parser can decode incrementally keep streaming into it; the rest (JPEG,
+PNG, ...) collect the compressed bytes in one growing buffer and decode once.
+Either way the download stops as soon as it passes ``max_bytes``.
+"""
+import io
+
+from PIL import Image, ImageFile
+
+import resample
+from pixel_buffer import from_pil
+from profiling import stage
+
+CHUNK_SIZE = 64 * 1024
+HEADER_LIMIT = 1024 * 1024   # give up if no image header by then
+
+
+class ImageTooLarge(ValueError):
+    """A download or image exceeds the configured byte or pixel cap."""
+
+
+def check_bytes(size, max_bytes):
+    if max_bytes and size > max_bytes:
+        raise ImageTooLarge(f"Download exceeds the {max_bytes} byte cap "
+                            f"({size} bytes or more)")
+
+
+def check_pixels(size, max_pixels):
+    w, h = size
+    if max_pixels and w * h > max_pixels:
+        raise ImageTooLarge(f"Image is {w}x{h} ({w * h} pixels), over the "
+                            f"{max_pixels} pixel cap")
+
+
+def read_capped(stream, max_bytes=None, chunk_size=CHUNK_SIZE):
+    """Read the whole of ``stream`` but stop past ``max_bytes``."""
+    data = bytearray()
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return bytes(data)
+        data += chunk
+        check_bytes(len(data), max_bytes)
+
+
+def decode_stream(stream, max_bytes=None, max_pixels=None, on_header=None,
+                  max_size=None, length=None, chunk_size=CHUNK_SIZE):
+    """Decode an image from ``stream`` (anything with ``read(n)``).
+
+    ``length`` is the expected body size if known (Content-Length), checked
+    before anything is read. ``on_header(size, format)`` is called once the
+    dimensions are known. ``max_size`` decodes a thumbnail instead (see
+    resample.load_thumbnail). Returns a PixelBuffer; raises ImageTooLarge
+    when a cap is hit.
+    """
+    if length is not None:
+        check_bytes(length, max_bytes)
+    with stage("decode_stream", "net") as st:
+        return _decode(stream, max_bytes, max_pixels, on_header, max_size,
+                       chunk_size, st)
+
+
+def _decode(stream, max_bytes, max_pixels, on_header, max_size, chunk_size,
+            st):
+    total = 0
+
+    def chunks():
+        nonlocal total
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                return
+            total += len(chunk)
+            st.add(len(chunk))
+            check_bytes(total, max_bytes)
+            yield chunk
+
+    body = chunks()
+    parser = ImageFile.Parser()
+    head = bytearray()
+    for chunk in body:
+        head += chunk
+        parser.feed(chunk)
+        if parser.image is not None:
+            break
+        if len(head) >= HEADER_LIMIT:
+            raise ValueError(f"No image header in the first {len(head)} "
+                             "bytes")
+    if parser.image is None:
+        raise ValueError("Cannot identify image data")
+
+    check_pixels(parser.image.size, max_pixels)
+    if on_header is not None:
+        on_header(parser.image.size, parser.image.format)
+
+    if parser.decoder is not None and not max_size:
+        del head
+        for chunk in body:
+            parser.feed(chunk)
+        with parser.close() as img:
+            return from_pil(img)
+
+    for chunk in body:
+        head += chunk
+    parser = None
+    src = io.BytesIO(head)
+    del head
+    with stage("decode", "codec"):
+        if max_size:
+            return resample.load_thumbnail(src, max_size)
+        with Image.open(src) as img:
+            return from_pil(img)
@@ -0,0 +1,351 @@
+"""Bounded-memory strip streaming: decode, filter and encode in row strips.
+
+    stream_process("big.jpg", [
+        ("invert.png", invert_colors, (), {}, 0),
+        ("sharpen.png", apply_kernel, (K_SHARPEN,), {}, 1),
+    ], strip_rows=256)
+
+Each output is (path, fn, args, kwargs, halo); ``fn=None`` copies the
+source. Strips of source rows are pulled from the decoder one at a time;
+neighbourhood filters see ``halo`` extra rows on each side, carried over
+from the previous strip instead of being decoded again. Each output is a
+PNG written row by row with a streaming zlib encoder, so no full-size
+output image ever exists.
+
+8-bit, non-interlaced PNG sources (what PNGStripWriter and most tools
+write) are inflated strip by strip as well, so peak memory does not
+depend on the image height. Other sources (JPEG, interlaced or 16-bit
+PNG, ...) are decoded by Pillow in one go: the source then lives in
+Pillow's native buffer (3-4 bytes per pixel, no Python objects) and
+everything downstream of the decoder is strip-sized.
+"""
+import io
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+from pixel_buffer import PixelBuffer, as_buffer, from_pil
+
+DEFAULT_STRIP_ROWS = 256
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+IDAT_CHUNK = 1 << 16
+
+
+# -----------------------------------------------------------------------------
+# Packed -> RGB bytes (C-level slice copies, no per-pixel Python work)
+# -----------------------------------------------------------------------------
+# array("I") cells hold 0x00RRGGBB in native byte order.
+_R, _G, _B = (2, 1, 0) if sys.byteorder == "little" else (1, 2, 3)
+
+
+def packed_to_rgb(cells):
+    """bytes-like of packed cells -> interleaved RGB bytes."""
+    raw = memoryview(cells).cast("B")
+    n = len(raw) // 4
+    rgb = bytearray(3 * n)
+    rgb[0::3] = raw[_R::4]
+    rgb[1::3] = raw[_G::4]
+    rgb[2::3] = raw[_B::4]
+    return rgb
+
+
+# -----------------------------------------------------------------------------
+# PNG rows without a full decode
+# -----------------------------------------------------------------------------
+# color type: (Pillow mode, bytes per pixel) at bit depth 8
+PNG_ROW_MODES = {0: ("L", 1), 2: ("RGB", 3), 3: ("P", 1), 4: ("LA", 2),
+                 6: ("RGBA", 4)}
+
+
+def _write_chunk(fh, kind, payload):
+    fh.write(struct.pack(">I", len(payload)))
+    fh.write(kind)
+    fh.write(payload)
+    crc = zlib.crc32(payload, zlib.crc32(kind))
+    fh.write(struct.pack(">I", crc & 0xFFFFFFFF))
+
+
+class PNGRowSource:
+    """Rows of an 8-bit, non-interlaced PNG, inflated on demand.
+
+    Raises ValueError for anything else. Pillow still does the unfiltering:
+    each block of rows is re-wrapped as a small stored (uncompressed) PNG,
+    led by the previous block's last row so that Up/Average/Paeth filters
+    see their neighbour.
+    """
+
+    def __init__(self, fh):
+        self._fh = fh
+        self._z = zlib.decompressobj()
+        self._tail = b""           # compressed bytes not inflated yet
+        self._left = 0             # unread bytes of the current IDAT chunk
+        self._ended = False
+        self._prev = None          # last row handed out, unfiltered
+        self._extra = []           # PLTE / tRNS, copied into every block
+        if fh.read(8) != PNG_SIGNATURE:
+            raise ValueError("not a PNG file")
+        ihdr = None
+        while True:
+            length, kind = self._chunk_header()
+            if kind == b"IDAT":
+                self._left = length
+                break
+            payload = fh.read(length)
+            fh.read(4)             # CRC
+            if kind == b"IHDR":
+                ihdr = payload
+            elif kind in (b"PLTE", b"tRNS"):
+                self._extra.append((kind, payload))
+            elif kind == b"IEND":
+                raise ValueError("PNG has no image data")
+        if ihdr is None or len(ihdr) != 13:
+            raise ValueError("PNG has no valid IHDR chunk")
+        (self.width, self.height, depth, self.color_type,
+         _, _, interlace) = struct.unpack(">IIBBBBB", ihdr)
+        if depth != 8 or interlace or self.color_type not in PNG_ROW_MODES:
+            raise ValueError("only 8-bit, non-interlaced PNGs are read "
+                             "row by row")
+        self.row_bytes = 1 + self.width * PNG_ROW_MODES[self.color_type][1]
+        self.y = 0
+
+    def _chunk_header(self):
+        head = self._fh.read(8)
+        if len(head) != 8:
+            raise ValueError("truncated PNG file")
+        return struct.unpack(">I4s", head)
+
+    def _compressed(self):
+        """Next piece of the zlib stream (b"" after the last IDAT chunk)."""
+        while not self._left and not self._ended:
+            self._fh.read(4)       # CRC of the previous IDAT chunk
+            length, kind = self._chunk_header()
+            self._ended = kind != b"IDAT"
+            self._left = 0 if self._ended else length
+        if self._ended:
+            return b""
+        data = self._fh.read(min(IDAT_CHUNK, self._left))
+        if not data:
+            raise ValueError("truncated PNG file")
+        self._left -= len(data)
+        return data
+
+    def _inflate(self, size):
+        out = bytearray()
+        while len(out) < size:
+            if not self._tail:
+                self._tail = self._compressed()
+                if not self._tail:
+                    raise ValueError("PNG image data ends early")
+            out += self._z.decompress(self._tail, size - len(out))
+            self._tail = self._z.unconsumed_tail
+        return bytes(out)
+
+    def read(self, rows):
+        """The next ``rows`` rows (fewer at the bottom) as a PIL image."""
+        from PIL import Image
+
+        rows = min(rows, self.height - self.y)
+        data = self._inflate(rows * self.row_bytes)
+        lead = 0
+        if self._prev is not None:
+            data = b"\x00" + self._prev + data
+            lead = 1
+        block = io.BytesIO()
+        block.write(PNG_SIGNATURE)
+        _write_chunk(block, b"IHDR", struct.pack(
+            ">IIBBBBB", self.width, rows + lead, 8, self.color_type, 0, 0, 0))
+        for kind, payload in self._extra:
+            _write_chunk(block, kind, payload)
+        _write_chunk(block, b"IDAT", zlib.compress(data, 0))
+        _write_chunk(block, b"IEND", b"")
+        block.seek(0)
+        image = Image.open(block)
+        image.load()
+        last = rows + lead
+        self._prev = image.crop((0, last - 1, self.width, last)).tobytes()
+        self.y += rows
+        return image.crop((0, lead, self.width, last)) if lead else image
+
+
+# -----------------------------------------------------------------------------
+# Reader / writer
+# -----------------------------------------------------------------------------
+
+def _png_rows(source):
+    """(PNGRowSource, file we opened or None) for a PNG path or file object
+    that can be read row by row, else (None, None) with the file object
+    rewound."""
+    if isinstance(source, (str, os.PathLike)):
+        fh = owned = open(source, "rb")
+    else:
+        fh, owned = source, None
+    start = fh.tell()
+    try:
+        return PNGRowSource(fh), owned
+    except ValueError:
+        if owned:
+            owned.close()
+        else:
+            fh.seek(start)
+        return None, None
+
+
+class StripReader:
+    """Yield (y0, PixelBuffer) strips of ``strip_rows`` rows from a source
+    (path, file object or PIL image)."""
+
+    def __init__(self, source, strip_rows=DEFAULT_STRIP_ROWS):
+        from PIL import Image
+
+        self.image = self._file = None
+        if isinstance(source, Image.Image):
+            self.image = source
+            self.rows = None
+        else:
+            self.rows, self._file = _png_rows(source)
+            if self.rows is None:
+                self.image = Image.open(source)
+        src = self.image if self.rows is None else self.rows
+        self.width, self.height = src.width, src.height
+        self.strip_rows = max(1, int(strip_rows))
+
+    def __iter__(self):
+        w = self.width
+        for y0 in range(0, self.height, self.strip_rows):
+            if self.rows is not None:
+                strip = self.rows.read(self.strip_rows)
+            else:
+                y1 = min(y0 + self.strip_rows, self.height)
+                strip = self.image.crop((0, y0, w, y1))
+            yield y0, from_pil(strip)
+
+    def close(self):
+        if self.image is not None:
+            self.image.close()
+        if self._file is not None:
+            self._file.close()
+
+
+class PNGStripWriter:
+    """Write an RGB PNG incrementally, one block of rows at a time."""
+
+    def __init__(self, path, width, height, compress_level=6):
+        self.path = path
+        self.width, self.height = width, height
+        self.rows_written = 0
+        self._fh = open(path, "wb")
+        self._z = zlib.compressobj(compress_level)
+        self._pending = bytearray()
+        self._fh.write(PNG_SIGNATURE)
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height,
+                                         8, 2, 0, 0, 0))
+
+    def _chunk(self, kind, payload):
+        _write_chunk(self._fh, kind, payload)
+
+    def _flush_idat(self, final=False):
+        while len(self._pending) >= IDAT_CHUNK or (final and self._pending):
+            self._chunk(b"IDAT", bytes(self._pending[:IDAT_CHUNK]))
+            del self._pending[:IDAT_CHUNK]
+
+    def write_rows(self, image_data, y0=0, y1=None):
+        """Append rows y0..y1 of ``image_data`` (filter type 0 per row)."""
+        buf = as_buffer(image_data)
+        y1 = buf.height if y1 is None else y1
+        for y in range(y0, y1):
+            self._pending += self._z.compress(
+                b"\x00" + packed_to_rgb(buf.row(y)))
+        self.rows_written += y1 - y0
+        self._flush_idat()
+
+    def abort(self):
+        """Close the file without finishing the PNG (no-op after close)."""
+        self._fh.close()
+
+    def close(self):
+        if self._fh.closed:
+            return
+        try:
+            if self.rows_written != self.height:
+                raise ValueError(f"PNG expects {self.height} rows, "
+                                 f"got {self.rows_written}")
+            self._pending += self._z.flush()
+            self._flush_idat(final=True)
+            self._chunk(b"IEND", b"")
+        finally:
+            self._fh.close()
+
+
+# -----------------------------------------------------------------------------
+# Streaming driver
+# -----------------------------------------------------------------------------
+
+def _stack(top, bottom):
+    """Concatenate two PixelBuffers vertically (either may be None)."""
+    if top is None or top.height == 0:
+        return bottom
+    cells = array("I")
+    for part in (top, bottom):
+        for y in range(part.height):
+            cells.extend(part.row(y))
+    return PixelBuffer(bottom.width, top.height + bottom.height, cells)
+
+
+def _rows(buf, y0, y1):
+    cells = array("I")
+    for y in range(y0, y1):
+        cells.extend(buf.row(y))
+    return PixelBuffer(buf.width, y1 - y0, cells)
+
+
+def stream_process(source, outputs, strip_rows=DEFAULT_STRIP_ROWS,
+                   compress_level=6):
+    """Push ``source`` through every output filter strip by strip.
+
+    ``outputs``: iterable of (png_path, fn, args, kwargs, halo).
+    Returns the list of written paths. If anything fails, the outputs
+    opened so far are removed rather than left as truncated PNGs.
+    """
+    outputs = [tuple(o) for o in outputs]
+    for path, fn, args, kwargs, halo in outputs:
+        if not str(path).lower().endswith(".png"):
+            raise ValueError(f"Streaming output must be .png: {path}")
+        if kwargs.get("border") == "wrap":
+            raise ValueError("border='wrap' needs the whole image; "
+                             "it cannot be streamed.")
+    reader = StripReader(source, strip_rows)
+    w, h = reader.width, reader.height
+    hmax = max((o[4] for o in outputs), default=0)
+    writers = []
+    try:
+        for o in outputs:
+            writers.append(PNGStripWriter(o[0], w, h, compress_level))
+        carry, carry_top = None, 0   # rows kept for the next window
+        emit0 = 0
+        for y0, strip in reader:
+            y1 = y0 + strip.height
+            window = _stack(carry, strip)
+            top = carry_top if carry is not None else y0
+            emit1 = h if y1 >= h else max(emit0, y1 - hmax)
+            if emit1 > emit0:
+                for (path, fn, args, kwargs, _), writer in zip(outputs,
+                                                              writers):
+                    res = window if fn is None else as_buffer(
+                        fn(window, *args, **kwargs))
+                    writer.write_rows(res, emit0 - top, emit1 - top)
+            carry_top = max(0, emit1 - hmax)
+            carry = _rows(window, carry_top - top, y1 - top)
+            emit0 = emit1
+        for writer in writers:
+            writer.close()
+    except BaseException:
+        for writer in writers:
+            writer.abort()
+            if os.path.exists(writer.path):
+                os.remove(writer.path)
+        raise
+    finally:
+        reader.close()
+    return [o[0] for o in outputs]
@@ -0,0 +1,148 @@
+"""Shared fixtures: the scripts' folder on sys.path, the editor module,
+random test images and a local HTTP/1.1 server with per-path responses,
+a request log and a socket count."""
+import os
+import random
+import socket
+import sys
+import threading
+import zlib
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from photo_core.editor import load_editor  # noqa: E402
+from pixel_buffer import PixelBuffer  # noqa: E402
+
+# (width, height) of the images the backend tests run on: single pixels,
+# rows and columns, and one with odd sides
+SHAPES = ((1, 1), (17, 1), (1, 17), (23, 19))
+
+# (filter name, keyword arguments) for every point filter of the editor
+POINT_CASES = (
+    [("to_grayscale", {}), ("invert_colors", {}), ("remove_green", {}),
+     ("swap_red_blue", {}), ("sepia", {}), ("equalize", {})]
+    + [("posterize_keep_bits", {"keep_bits": k}) for k in range(0, 10)]
+    + [("threshold_bw", {"t": t}) for t in (0, 1, 127, 128, 255, "otsu")]
+    + [("threshold_gray", {"t": t}) for t in (0, 128, 255, "otsu")]
+    + [("gamma_correction", {"gamma": g}) for g in (0.05, 0.5, 1, 2.2, 9)]
+    + [("adjust_brightness", {"delta": d})
+       for d in (-300, -40, 0, 1, 40, 300, "auto")]
+    + [("adjust_contrast", {"factor": f})
+       for f in (0, 0.5, 1, 1.3, 2.7, -1, "auto")])
+
+LAST_MODIFIED = formatdate(0, usegmt=True)
+
+
+def random_image(width, height, seed=0, stride=None):
+    """PixelBuffer of random 0xRRGGBB pixels; with ``stride`` it is a view
+    into a wider block, as tiles are."""
+    rng = random.Random(seed * 1000003 + width * 1009 + height)
+    pad = [0xA5C3E1] * ((stride or width) - width)
+    full = PixelBuffer.from_rows(
+        [[rng.randrange(1 << 24) for _ in range(width)] + pad
+         for _ in range(height)])
+    return PixelBuffer(width, height, full.data, stride)
+
+
+def point_case_id(case):
+    name, kwargs = case
+    return name + "".join(f"-{v}" for v in kwargs.values())
+
+
+def point_source(editor, name, shape, stride=None):
+    """Input for POINT_CASES filter ``name``: a random image, made gray
+    for threshold_gray (which expects one), possibly a strided view."""
+    img = random_image(*shape, seed=1, stride=stride)
+    if name == "threshold_gray":
+        editor.to_grayscale(img, backend="python", inplace=True)
+    return img
+
+
+@pytest.fixture(scope="session")
+def editor():
+    return load_editor()
+
+
+# -----------------------------------------------------------------------------
+# Local HTTP server
+# -----------------------------------------------------------------------------
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"    # keep-alive
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        if self.path not in server.routes:
+            # send_error would close the connection; keep it alive
+            self.send_response(404)
+            self.send_header("Content-Length", "9")
+            self.end_headers()
+            self.wfile.write(b"not found")
+            return
+        body, headers = server.routes[self.path]
+        etag = f'"{zlib.crc32(body):08x}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class LocalServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.routes = {}       # path -> (body, extra headers)
+        self.requests = []     # (path, headers) per request
+        self.accepted = 0      # TCP connections
+        self._socks = []
+
+    def get_request(self):
+        sock, addr = super().get_request()
+        self.accepted += 1
+        self._socks.append(sock)
+        return sock, addr
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+    def drop_connections(self):
+        """Close every accepted connection, as a server dropping idle
+        keep-alives does."""
+        for sock in self._socks:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self._socks = []
+
+
+@pytest.fixture
+def http_server():
+    server = LocalServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,),
+                              daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,75 @@
+"""Batch reruns: up-to-date outputs are skipped, changed jobs rebuilt."""
+import pytest
+
+import batch
+from conftest import random_image
+from pixel_buffer import to_pil
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / "in" / "photo.png"
+    path.parent.mkdir()
+    to_pil(random_image(6, 5)).save(path)
+    return str(path)
+
+
+def _run(source, out_dir, manifest, saves, **kwargs):
+    from photo_core.files import load_image
+
+    def save(image_data, path, **options):
+        saves.append(options)
+        with open(path, "wb") as fh:
+            fh.write(b"x")
+        return path
+    return batch.run_batch(list(batch.expand_sources([source])), manifest,
+                           load_image, save, str(out_dir), jobs=1, **kwargs)
+
+
+def _manifest(profile, fn=None, args=()):
+    return batch.make_manifest(
+        [batch.Output("copy", fn, args, {}, "png", {})],
+        save={"profile": profile})
+
+
+def test_rerun_skips_up_to_date(source, tmp_path):
+    saves = []
+    _run(source, tmp_path / "out", _manifest("balanced"), saves)
+    report = _run(source, tmp_path / "out", _manifest("balanced"), saves)
+    assert report.skipped == 1 and saves == [{"profile": "balanced"}]
+
+
+def test_save_profile_change_rebuilds(source, tmp_path):
+    saves = []
+    _run(source, tmp_path / "out", _manifest("balanced"), saves)
+    report = _run(source, tmp_path / "out", _manifest("speed"), saves)
+    assert report.outputs == 1
+    assert saves == [{"profile": "balanced"}, {"profile": "speed"}]
+
+
+def test_output_spec_change_rebuilds(editor, source, tmp_path):
+    # A manifest without a file (mtime 0) whose filters change, as when
+    # DEFAULT_OUTPUTS is edited
+    saves = []
+    _run(source, tmp_path / "out", _manifest("balanced"), saves)
+    changed = _manifest("balanced", editor.invert_colors)
+    assert _run(source, tmp_path / "out", changed, saves).outputs == 1
+    assert _run(source, tmp_path / "out", changed, saves).skipped == 1
+    assert len(saves) == 2
+
+
+def test_output_save_options_win():
+    manifest = batch.make_manifest(
+        [batch.Output("a", None, (), {}, "png", {"profile": "size"}),
+         batch.Output("b", None, (), {}, "png", {})],
+        save={"profile": "speed"})
+    assert [o.save for o in manifest.outputs] == [{"profile": "size"},
+                                                  {"profile": "speed"}]
+    assert manifest.signature != _manifest("speed").signature
+
+
+def test_default_manifest_carries_profile(editor):
+    fast = editor.default_manifest({"profile": "speed"})
+    small = editor.default_manifest({"profile": "size"})
+    assert fast.signature != small.signature
+    assert all(o.save == {"profile": "speed"} for o in fast.outputs)
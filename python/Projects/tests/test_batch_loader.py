@@ -0,0 +1,52 @@
+"""ConnectionPool and load_many against a local HTTP/1.1 server."""
+from batch_loader import ConnectionPool, load_many
+
+
+def _get(pool, url):
+    with pool.urlopen(url) as r:
+        return r.read()
+
+
+def test_connections_are_reused(http_server):
+    http_server.routes["/a"] = (b"alpha", {})
+    pool = ConnectionPool()
+    try:
+        bodies = [_get(pool, http_server.url("/a")) for _ in range(5)]
+    finally:
+        pool.close()
+    assert bodies == [b"alpha"] * 5
+    assert http_server.accepted == 1
+    assert (pool.opened, pool.reused) == (1, 4)
+
+
+def test_dropped_connection_is_retried_once(http_server):
+    http_server.routes["/a"] = (b"alpha", {})
+    pool = ConnectionPool()
+    try:
+        assert _get(pool, http_server.url("/a")) == b"alpha"
+        http_server.drop_connections()
+        assert _get(pool, http_server.url("/a")) == b"alpha"
+    finally:
+        pool.close()
+    assert http_server.accepted == 2
+    assert (pool.opened, pool.reused) == (2, 1)
+    assert len(http_server.requests) == 2
+
+
+def test_load_many_reports_failures(http_server):
+    http_server.routes["/ok"] = (b"fine", {})
+    pool = ConnectionPool()
+
+    def load(path):
+        with pool.urlopen(http_server.url(path)) as r:
+            return r.read()
+
+    try:
+        results = {r.source: r for r in load_many(["/ok", "/missing"] * 20,
+                                                  load, workers=4)}
+    finally:
+        pool.close()
+    assert results["/ok"].image == b"fine"
+    assert results["/missing"].image is None
+    assert "404" in results["/missing"].error
+    assert http_server.accepted <= 4
@@ -0,0 +1,92 @@
+"""Every convolve path matches a direct per-pixel sum, bit for bit."""
+import random
+
+import pytest
+
+import np_backend
+from conftest import SHAPES, random_image
+from convolve import (BORDER_MODES, border_index, box_kernel, convolve,
+                      gaussian_kernel, normalize_kernel)
+from photo_core.pixels import clamp8
+
+RADII = range(7)
+PATHS = [False] + ([True] if np_backend.AVAILABLE else [])
+
+
+def _kernels(r):
+    """(name, kernel, divisor, offset) for each kind of kernel at radius r:
+    box, separable (positive and signed), direct (integer and float)."""
+    n = 2 * r + 1
+    rng = random.Random(r)
+    binomial = gaussian_kernel(r)[r]
+    slope = [j - r for j in range(n)]
+    return [
+        ("box", box_kernel(n), None, 0),
+        ("gaussian", gaussian_kernel(r), None, 0),
+        ("sobel", [[c * s for s in slope] for c in binomial], 4, 128),
+        ("direct", [[rng.randint(-3, 3) for _ in range(n)]
+                    for _ in range(n)], 7, -5),
+        ("float", [[rng.uniform(-1, 2) for _ in range(n)]
+                   for _ in range(n)], None, 3),
+    ]
+
+
+CASES = [(r,) + k for r in RADII for k in _kernels(r)]
+
+
+def _direct(img, kernel, divisor, offset, border):
+    rows = normalize_kernel(kernel)
+    if divisor is None:
+        divisor = sum(map(sum, rows)) or 1
+    h, w, r = len(img), len(img[0]), len(rows) // 2
+    mode = "clamp" if border == "copy" else border
+    out = img.copy()
+    for y in range(h):
+        for x in range(w):
+            if border == "copy" and not (r <= y < h - r and r <= x < w - r):
+                continue
+            acc = [0, 0, 0]
+            for i, krow in enumerate(rows):
+                src = img[border_index(y + i - r, h, mode)]
+                for j, k in enumerate(krow):
+                    p = src[border_index(x + j - r, w, mode)]
+                    acc[0] += k * ((p >> 16) & 0xFF)
+                    acc[1] += k * ((p >> 8) & 0xFF)
+                    acc[2] += k * (p & 0xFF)
+            r8, g8, b8 = (clamp8(round(a / divisor) + offset) for a in acc)
+            out[y][x] = (r8 << 16) | (g8 << 8) | b8
+    return out
+
+
+@pytest.mark.parametrize("shape", SHAPES, ids=str)
+@pytest.mark.parametrize("border", BORDER_MODES)
+@pytest.mark.parametrize("r, name, kernel, divisor, offset", CASES,
+                         ids=[f"{c[1]}-r{c[0]}" for c in CASES])
+def test_matches_direct_sum(r, name, kernel, divisor, offset, border,
+                            shape):
+    img = random_image(*shape, seed=r)
+    expected = _direct(img, kernel, divisor, offset, border)
+    for use_numpy in PATHS:
+        got = convolve(img, kernel, divisor, offset, border,
+                       use_numpy=use_numpy)
+        assert got == expected, f"use_numpy={use_numpy}"
+        view = random_image(*shape, seed=r, stride=shape[0] + 2)
+        assert convolve(view, kernel, divisor, offset, border,
+                        use_numpy=use_numpy, out=view) == expected
+
+
+@pytest.mark.parametrize("preset", ["K_BLUR_BOX", "K_SHARPEN",
+                                    "K_EDGE_SIMPLE"])
+def test_presets_match_direct_sum(editor, preset):
+    img = random_image(31, 24)
+    kernel = getattr(editor, preset)
+    expected = _direct(img, kernel, None, 0, "copy")
+    for backend in ("python", "numpy"):
+        assert editor.apply_kernel(img, kernel, backend=backend) == expected
+
+
+def test_rejects_bad_kernels():
+    with pytest.raises(ValueError):
+        convolve(random_image(3, 3), [1, 1, 1, 1])
+    with pytest.raises(ValueError):
+        convolve(random_image(3, 3), [1] * 9, border="mirror")
@@ -0,0 +1,69 @@
+"""Auto output modes: 1-bit and L files decode to the pixels written."""
+import io
+import random
+from array import array
+
+import pytest
+from PIL import Image
+
+from encode import encode_image, pixel_mode
+from pixel_buffer import PixelBuffer, from_pil
+
+
+def _gray(value):
+    return value * 0x010101
+
+
+def _image(width, height, values, seed=0, stride=None):
+    r = random.Random(seed)
+    stride = stride or width
+    cells = [_gray(r.choice(values)) if x < width else 0x123456
+             for _ in range(height) for x in range(stride)]
+    return PixelBuffer(width, height, array("I", cells), stride)
+
+
+def _round_trip(image_data, fmt):
+    data = encode_image(image_data, fmt)
+    with Image.open(io.BytesIO(data)) as img:
+        return img.mode, from_pil(img)
+
+
+CASES = [
+    ("1", (0, 255)),                         # black and white only
+    ("L", range(256)),                       # any gray
+    ("L", (0, 128)),                         # two colours, not both B/W
+    ("L", (77,)),                            # one gray
+]
+
+
+@pytest.mark.parametrize("fmt", ["PNG", "TIFF", "BMP"])
+@pytest.mark.parametrize("stride", [None, 40])
+@pytest.mark.parametrize("mode, values", CASES,
+                         ids=["bilevel", "gray", "two-grays", "one-gray"])
+def test_compact_modes_are_lossless(fmt, stride, mode, values):
+    img = _image(37, 11, values, stride=stride)
+    assert pixel_mode(img) == mode
+    stored, decoded = _round_trip(img, fmt)
+    assert stored == mode
+    assert decoded == img.copy()
+
+
+def test_two_tone_image_keeps_its_pixels():
+    # A bilevel picture with all the black on one side and a 1-pixel line
+    cells = [0 if x < 9 or y == 3 else 0xFFFFFF
+             for y in range(7) for x in range(17)]
+    img = PixelBuffer(17, 7, array("I", cells))
+    assert _round_trip(img, "PNG") == ("1", img)
+
+
+def test_colour_pixel_keeps_rgb():
+    img = _image(20, 20, (0, 255))
+    img.set(19, 19, 0xFF0000)
+    assert pixel_mode(img) == "RGB"
+    assert _round_trip(img, "PNG") == ("RGB", img)
+
+
+def test_gif_and_jpeg_store_bilevel_as_gray():
+    img = _image(16, 8, (0, 255))
+    assert _round_trip(img, "GIF")[1] == img     # Pillow reads GIFs as P
+    assert _round_trip(img, "JPEG")[0] == "L"
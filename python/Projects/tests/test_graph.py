@@ -0,0 +1,65 @@
+"""graph.evaluate merges identical sub-expressions and runs each once."""
+from collections import Counter
+
+import pytest
+
+import graph
+from conftest import random_image
+
+
+@pytest.fixture
+def counting_run():
+    calls = Counter()
+
+    def run(fn, *args, **kwargs):
+        calls[fn.__name__] += 1
+        return fn(*args, **kwargs)
+    run.calls = calls
+    return run
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_identical_subgraphs_run_once(editor, counting_run, workers):
+    img = random_image(17, 11)
+    lazy, src = editor.lazy, graph.source(img)
+    # Built twice, separately; the kernel once as a list, once as a tuple
+    a = lazy.kernel(lazy.gray(src), editor.K_SHARPEN, border="reflect")
+    b = lazy.kernel(lazy.gray(src), tuple(editor.K_SHARPEN),
+                    border="reflect")
+    other = lazy.kernel(lazy.gray(src), editor.K_SHARPEN)
+    wanted = {"a": a, "b": b, "other": other, "gray": lazy.gray(src)}
+
+    order, canonical = graph.plan(wanted)
+    assert a is not b and a.key == b.key
+    assert canonical[b.key] is a
+    assert [n.name for n in order] == ["source", "to_grayscale",
+                                       "apply_kernel", "apply_kernel"]
+
+    results = dict(graph.evaluate(wanted, workers=workers, run=counting_run))
+    assert counting_run.calls == {"to_grayscale": 1, "apply_kernel": 2}
+    assert sorted(results) == ["a", "b", "gray", "other"]
+    assert results["a"] is results["b"]
+    gray = editor.to_grayscale(img)
+    assert results["gray"] == gray
+    assert results["a"] == editor.apply_kernel(gray, editor.K_SHARPEN,
+                                               border="reflect")
+
+
+def test_different_sources_are_not_merged(editor, counting_run):
+    img = random_image(5, 4)
+    lazy = editor.lazy
+    wanted = {"x": lazy.invert(img), "y": lazy.invert(img.copy())}
+    results = dict(graph.evaluate(wanted, run=counting_run))
+    assert counting_run.calls == {"invert_colors": 2}
+    assert results["x"] == results["y"]
+
+
+def test_default_outputs_share_grayscale(editor, counting_run):
+    outputs = [o for o in editor.DEFAULT_OUTPUTS
+               if o[0] in ("grayscale.png", "threshold_128.png")]
+    outputs.append(("threshold_again.png", editor.threshold_bw, (128,)))
+    img = random_image(9, 7)
+    results = dict(graph.evaluate(editor.output_graph(img, outputs),
+                                  run=counting_run))
+    assert counting_run.calls == {"to_grayscale": 1, "threshold_gray": 1}
+    assert results["threshold_128.png"] == editor.threshold_bw(img, 128)
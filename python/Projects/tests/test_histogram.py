@@ -0,0 +1,42 @@
+"""image_stats is computed once per image and refreshed after writes."""
+import pytest
+
+import histogram
+from conftest import random_image
+
+
+@pytest.fixture
+def stats_calls(monkeypatch):
+    calls = []
+    compute = histogram.compute_stats
+
+    def counting(image_data):
+        calls.append(image_data)
+        return compute(image_data)
+    monkeypatch.setattr(histogram, "compute_stats", counting)
+    return calls
+
+
+@pytest.mark.parametrize("backend", ["python", "stdlib", "numpy"])
+def test_auto_chain_computes_stats_once(editor, stats_calls, backend):
+    img = random_image(23, 19)
+    editor.threshold_bw(img, "otsu", backend=backend)
+    editor.adjust_contrast(img, "auto", backend=backend)
+    editor.equalize(img, backend=backend)
+    editor.adjust_brightness(img, "auto", backend=backend)
+    assert img == img.copy() and img.to_lists()    # reads keep the cache
+    editor.threshold_gray(img, "otsu", backend=backend)
+    assert len(stats_calls) == 1
+
+
+def test_writes_refresh_stats(editor, stats_calls):
+    img = random_image(5, 4)
+    before = histogram.image_stats(img)
+    img.set(0, 0, 0xFFFFFF)
+    assert histogram.image_stats(img) != before
+    img[1][2] = 0
+    img.invalidate()
+    histogram.image_stats(img)
+    editor.invert_colors(img, backend="python", inplace=True)
+    histogram.image_stats(img)
+    assert len(stats_calls) == 4
@@ -0,0 +1,113 @@
+"""HttpCache and photo_core.net against a local http.server."""
+import io
+import os
+
+from PIL import Image
+
+from conftest import LAST_MODIFIED
+from http_cache import HttpCache
+from photo_core import net
+
+
+def _png(color=(255, 0, 0)):
+    out = io.BytesIO()
+    Image.new("RGB", (4, 3), color).save(out, "PNG")
+    return out.getvalue()
+
+
+def test_fresh_hit_makes_no_request(http_server, tmp_path):
+    http_server.routes["/a"] = (b"fresh body", {"Cache-Control": "max-age=60"})
+    cache = HttpCache(str(tmp_path))
+    url = http_server.url("/a")
+    first = cache.fetch(url)
+    second = cache.fetch(url)
+    assert len(http_server.requests) == 1
+    assert (first.from_cache, second.from_cache) == (False, True)
+    assert second.data == b"fresh body"
+    assert (cache.downloads, cache.hits) == (1, 1)
+
+
+def test_fresh_hits_write_index_on_close(http_server, tmp_path,
+                                         monkeypatch):
+    http_server.routes["/a"] = (b"fresh body", {"Cache-Control": "max-age=60"})
+    cache = HttpCache(str(tmp_path))
+    url = http_server.url("/a")
+    cache.fetch(url)
+    saves = []
+    save = cache._save
+    monkeypatch.setattr(cache, "_save", lambda: saves.append(1) or save())
+    for _ in range(3):
+        cache.fetch(url)
+    assert saves == [] and cache.hits == 3
+    used = cache.lookup(url)["used"]
+    assert HttpCache(str(tmp_path)).lookup(url)["used"] != used
+    cache.close()
+    cache.close()
+    assert len(saves) == 1
+    assert HttpCache(str(tmp_path)).lookup(url)["used"] == used
+
+
+def test_stale_entry_sends_validators(http_server, tmp_path):
+    http_server.routes["/a"] = (b"stale body", {"Cache-Control": "no-cache"})
+    cache = HttpCache(str(tmp_path))
+    url = http_server.url("/a")
+    cache.fetch(url)
+    cache.fetch(url)
+    assert len(http_server.requests) == 2
+    headers = http_server.requests[1][1]
+    assert headers["If-None-Match"] == cache.lookup(url)["etag"]
+    assert headers["If-Modified-Since"] == LAST_MODIFIED
+
+
+def test_304_is_served_from_cache(http_server, tmp_path):
+    http_server.routes["/a"] = (b"unchanged", {})
+    cache = HttpCache(str(tmp_path))
+    url = http_server.url("/a")
+    cache.fetch(url)
+    again = HttpCache(str(tmp_path)).fetch(url)   # reloads index.json
+    assert again == (b"unchanged", "", url, True)
+    assert cache.downloads == 1
+
+    http_server.routes["/a"] = (b"changed", {})
+    changed = cache.fetch(url)
+    assert (changed.data, changed.from_cache) == (b"changed", False)
+    assert cache.downloads == 2
+
+
+def test_eviction_respects_byte_cap(http_server, tmp_path):
+    cache = HttpCache(str(tmp_path), max_bytes=250)
+    for name in "abc":
+        http_server.routes["/" + name] = (name.encode() * 100, {})
+        cache.fetch(http_server.url("/" + name))
+        assert cache.total_bytes() <= 250
+    assert cache.lookup(http_server.url("/a")) is None
+    assert cache.lookup(http_server.url("/c")) is not None
+    blobs = os.listdir(tmp_path / "blobs")
+    assert len(blobs) == 2
+
+    # A body shared by two URLs is stored and counted once
+    http_server.routes["/d"] = (b"c" * 100, {})
+    cache.fetch(http_server.url("/d"))
+    assert cache.total_bytes() == 200
+    assert len(os.listdir(tmp_path / "blobs")) == 2
+
+
+def test_warm_page_load_downloads_nothing(http_server, tmp_path,
+                                          monkeypatch):
+    cache = HttpCache(str(tmp_path))
+    monkeypatch.setattr(net, "HTTP_CACHE", cache)
+    http_server.routes["/page"] = (
+        b'<html><head><meta property="og:image" content="/img.png">'
+        b"</head><body></body></html>", {"Content-Type": "text/html"})
+    http_server.routes["/img.png"] = (_png(), {"Content-Type": "image/png"})
+    url = http_server.url("/page")
+
+    # Only the image body is stored; the page is kept as its mapping
+    cold = net.load_image_from_url(url)
+    assert cache.downloads == 1
+    warm = net.load_image_from_url(url)
+    assert cache.downloads == 1
+    assert (warm.width, warm.height) == (4, 3)
+    assert list(warm) == list(cold)
+    assert [path for path, _ in http_server.requests] == [
+        "/page", "/img.png", "/page", "/img.png"]
@@ -0,0 +1,33 @@
+"""The NumPy backend gives the Python loops' pixels, bit for bit."""
+import pytest
+
+import np_backend
+from conftest import (POINT_CASES, SHAPES, point_case_id, point_source,
+                      random_image)
+
+if not np_backend.AVAILABLE:
+    pytest.skip("NumPy is not installed", allow_module_level=True)
+
+
+@pytest.mark.parametrize("shape", SHAPES, ids=str)
+@pytest.mark.parametrize("case", POINT_CASES, ids=point_case_id)
+def test_point_filter_matches_python(editor, case, shape):
+    name, kwargs = case
+    fn = getattr(editor, name)
+    img = point_source(editor, name, shape)
+    expected = fn(img, backend="python", **kwargs)
+    assert fn(img, backend="numpy", **kwargs) == expected
+
+    # Strided views (tiles) and in-place runs give the same pixels
+    view = point_source(editor, name, shape, stride=shape[0] + 3)
+    assert fn(view, backend="numpy", **kwargs) == expected
+    copy = img.copy()
+    assert fn(copy, backend="numpy", inplace=True, **kwargs) is copy
+    assert copy == expected
+
+
+@pytest.mark.parametrize("shape", SHAPES, ids=str)
+def test_packing_round_trips(shape):
+    img = random_image(*shape)
+    assert np_backend.from_packed(np_backend.to_packed(img)) == img
+    assert np_backend.merge_channels(*np_backend.split_channels(img)) == img
@@ -0,0 +1,118 @@
+"""out= and inplace=: results land in the given buffer, even when it is
+the source, and chains of filters reuse one or two buffers."""
+import pytest
+
+import pixel_buffer
+from conftest import random_image
+
+# (filter, args, kwargs); threshold_gray gets a grayscale source
+FILTERS = [
+    ("to_grayscale", (), {}),
+    ("invert_colors", (), {}),
+    ("remove_green", (), {}),
+    ("swap_red_blue", (), {}),
+    ("posterize_keep_bits", (3,), {}),
+    ("threshold_bw", ("otsu",), {}),
+    ("threshold_gray", (100,), {}),
+    ("gamma_correction", (2.2,), {}),
+    ("sepia", (), {}),
+    ("apply_kernel", ("K_SHARPEN",), {}),
+    ("apply_kernel", ("K_BLUR_BOX",), {"border": "wrap"}),
+    ("median_filter", (1,), {}),
+    ("erode", (1,), {}),
+    ("dilate", (2,), {"border": "reflect"}),
+    ("percentile_filter", (1, 90), {}),
+    ("adjust_brightness", ("auto",), {}),
+    ("adjust_contrast", (1.3,), {}),
+    ("equalize", (), {}),
+]
+BACKENDS = ["python", "stdlib", "numpy"]
+
+
+def _case_id(case):
+    name, args, kwargs = case
+    return "-".join([name] + [str(a) for a in args] + list(kwargs.values()))
+
+
+def _call(editor, case, image_data, backend, **kwargs):
+    name, args, extra = case
+    args = [getattr(editor, a, a) if isinstance(a, str) else a
+            for a in args]
+    return getattr(editor, name)(image_data, *args, backend=backend,
+                                 **extra, **kwargs)
+
+
+def _source(editor, case, stride=None):
+    img = random_image(19, 13, stride=stride)
+    if case[0] == "threshold_gray":
+        editor.to_grayscale(img, backend="python", inplace=True)
+    return img
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("case", FILTERS, ids=_case_id)
+def test_out_aliasing_the_source(editor, case, backend):
+    img = _source(editor, case)
+    expected = _call(editor, case, img.copy(), backend)
+    assert _call(editor, case, img, backend, out=img) is img
+    assert img == expected
+
+    img = _source(editor, case, stride=23)    # a tile's view
+    assert _call(editor, case, img, backend, inplace=True) is img
+    assert img == expected
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("case", FILTERS, ids=_case_id)
+def test_out_leaves_the_source_alone(editor, case, backend):
+    img = _source(editor, case)
+    before = img.copy()
+    out = random_image(19, 13, seed=5)
+    expected = _call(editor, case, img, backend)
+    assert _call(editor, case, img, backend, out=out) is out
+    assert out == expected and img == before
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_chain_reuses_two_buffers(editor, backend):
+    steps = [case for case in FILTERS if case[0] != "threshold_gray"]
+    img = random_image(19, 13)
+    expected = img
+    for case in steps:
+        expected = _call(editor, case, expected, backend)
+
+    # Ping-pong between two buffers ...
+    src, dst = img.copy(), pixel_buffer.PixelBuffer.like(img)
+    for case in steps:
+        assert _call(editor, case, src, backend, out=dst) is dst
+        src, dst = dst, src
+    assert src == expected
+
+    # ... or keep rewriting one
+    work = img.copy()
+    for case in steps:
+        assert _call(editor, case, work, backend, inplace=True) is work
+    assert work == expected
+
+
+def test_chain_with_out_allocates_no_images(editor):
+    img = random_image(19, 13)
+    out = pixel_buffer.PixelBuffer.like(img)
+    pixel_buffer.reset_allocations()
+    editor.invert_colors(img, backend="python", out=out)
+    editor.sepia(out, backend="python", inplace=True)
+    editor.gamma_correction(out, 2.2, backend="python", inplace=True)
+    assert pixel_buffer.allocations()[0] == 0
+
+
+def test_bad_destinations(editor):
+    img = random_image(6, 5)
+    with pytest.raises(ValueError):
+        editor.invert_colors(img, out=random_image(5, 6))
+    with pytest.raises(ValueError):
+        editor.invert_colors(img, out=img.copy(), inplace=True)
+    with pytest.raises(TypeError):
+        editor.invert_colors(img.to_lists(), inplace=True)
+    with pytest.raises(TypeError):
+        editor.invert_colors(img, out=img.to_lists())
+    assert editor.invert_colors(img, out=img, inplace=True) is img
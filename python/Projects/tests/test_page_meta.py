@@ -0,0 +1,107 @@
+"""find_page_image: candidates from <head>, read no further than needed."""
+import io
+import json
+
+import pytest
+
+from page_meta import HeadScanner, find_page_image
+
+BASE = "http://example.test/articles/one.html"
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.consumed = 0
+
+    def read(self, n=-1):
+        chunk = super().read(n)
+        self.consumed += len(chunk)
+        return chunk
+
+
+def _page(head, body="<p>text</p>"):
+    return (f"<!doctype html><html><head><title>t</title>{head}</head>"
+            f"<body>{body}</body></html>").encode()
+
+
+def _find(html, chunk_size=16):
+    return find_page_image(CountingStream(html), BASE, chunk_size=chunk_size)
+
+
+@pytest.mark.parametrize("meta", [
+    '<meta property="og:image" content="/a.jpg">',
+    '<meta content="/a.jpg" property="og:image">',
+    '<meta content="/a.jpg" name="OG:Image" />',
+    "<meta name='twitter:image' content='/a.jpg'>",
+    '<meta content="/a.jpg" name="twitter:image:src">',
+])
+def test_meta_attributes_in_either_order(meta):
+    assert _find(_page(meta)) == "http://example.test/a.jpg"
+
+
+def test_og_image_beats_earlier_candidates():
+    head = ('<link rel="image_src" href="link.jpg">'
+            '<meta name="twitter:image" content="tw.jpg">'
+            '<meta content="og.jpg" property="og:image:secure_url">')
+    assert _find(_page(head)) == "http://example.test/articles/og.jpg"
+
+
+@pytest.mark.parametrize("data, expected", [
+    ({"@type": "Article", "image": "ld.jpg"}, "ld.jpg"),
+    ({"image": {"@type": "ImageObject", "url": "obj.jpg"}}, "obj.jpg"),
+    ({"image": [{"contentUrl": "first.jpg"}, "second.jpg"]}, "first.jpg"),
+    ([{"name": "no image"}, {"image": "second.jpg"}], "second.jpg"),
+    ({"@graph": [{"@type": "WebPage"}, {"image": "graph.jpg"}]},
+     "graph.jpg"),
+])
+def test_jsonld_image(data, expected):
+    script = ('<script type="application/ld+json">'
+              f"{json.dumps(data)}</script>")
+    assert _find(_page(script)) == "http://example.test/articles/" + expected
+
+
+def test_jsonld_ranks_last_and_bad_json_is_ignored():
+    head = ('<script type="application/ld+json">{"image": </script>'
+            '<script type="application/ld+json">{"image": "ld.jpg"}</script>'
+            '<link href="link.jpg" rel="Image_Src">')
+    assert _find(_page(head)) == "http://example.test/articles/link.jpg"
+    bad = '<script type="application/ld+json">not json</script>'
+    assert _find(_page(bad)) is None
+
+
+@pytest.mark.parametrize("end", ["</head>", "<body>", "<div>"])
+def test_reading_stops_at_end_of_head(end):
+    head = '<meta name="twitter:image" content="tw.jpg">'
+    tail = ('<meta property="og:image" content="late.jpg">'
+            + "<p>filler</p>" * 5000)
+    html = f"<html><head>{head}{end}{tail}".encode()
+    stream = CountingStream(html)
+    found = find_page_image(stream, BASE, chunk_size=64)
+    assert found == "http://example.test/articles/tw.jpg"
+    assert stream.consumed < html.index(b"late.jpg") + 64
+
+
+def test_og_image_stops_reading_at_once():
+    html = _page('<meta property="og:image" content="og.jpg">'
+                 + "<style>p {}</style>" * 5000)
+    stream = CountingStream(html)
+    find_page_image(stream, BASE, chunk_size=64)
+    assert stream.consumed < 256
+
+
+def test_noscript_image_inside_head_does_not_end_it():
+    scanner = HeadScanner()
+    scanner.feed('<head><noscript><img src="pixel.gif"></noscript>'
+                 '<meta name="twitter:image" content="tw.jpg">')
+    assert not scanner.done and scanner.image == "tw.jpg"
+    scanner.feed("</head>")
+    assert scanner.done
+
+
+def test_max_bytes_caps_reading():
+    html = b"<html><head>" + b"<title>x</title>" * 5000
+    stream = CountingStream(html)
+    assert find_page_image(stream, BASE, max_bytes=1024,
+                           chunk_size=256) is None
+    assert stream.consumed == 1024
@@ -0,0 +1,53 @@
+"""PIL <-> PixelBuffer conversions keep every pixel."""
+import random
+
+import pytest
+from PIL import Image
+
+import pixel_buffer
+from conftest import SHAPES, random_image
+from pixel_buffer import PixelBuffer, from_pil, to_pil
+
+
+def _random_pil(width, height, seed=0):
+    rng = random.Random(seed)
+    return Image.frombytes("RGB", (width, height),
+                           rng.randbytes(3 * width * height))
+
+
+@pytest.mark.parametrize("band_bytes", [pixel_buffer.FROM_PIL_BAND_BYTES, 1])
+@pytest.mark.parametrize("shape", SHAPES, ids=str)
+def test_pil_round_trip(monkeypatch, shape, band_bytes):
+    monkeypatch.setattr(pixel_buffer, "FROM_PIL_BAND_BYTES", band_bytes)
+    img = _random_pil(*shape)
+    buf = from_pil(img)
+    assert (buf.width, buf.height) == shape
+    x, y = shape[0] - 1, shape[1] - 1
+    r, g, b = img.getpixel((x, y))
+    assert buf.get(x, y) == (r << 16) | (g << 8) | b
+    back = to_pil(buf)
+    assert back.mode == "RGB" and back.tobytes() == img.tobytes()
+
+
+@pytest.mark.parametrize("shape", SHAPES, ids=str)
+def test_buffer_round_trip(shape):
+    buf = random_image(*shape)
+    assert from_pil(to_pil(buf)) == buf
+    view = random_image(*shape, stride=shape[0] + 3)     # a tile
+    assert to_pil(view).tobytes() == to_pil(buf).tobytes()
+    assert to_pil(buf.to_lists()).tobytes() == to_pil(buf).tobytes()
+
+
+@pytest.mark.parametrize("mode", ["L", "RGBA", "P", "1", "I;16"])
+def test_other_modes_convert_to_rgb(mode):
+    img = _random_pil(13, 7)
+    img = img.quantize(16) if mode == "P" else img.convert(mode)
+    expected = img.convert("RGB").tobytes()
+    assert to_pil(from_pil(img)).tobytes() == expected
+
+
+def test_packed_layout():
+    img = Image.new("RGB", (2, 1))
+    img.putpixel((0, 0), (1, 2, 3))
+    img.putpixel((1, 0), (255, 0, 128))
+    assert from_pil(img) == PixelBuffer.from_rows([[0x010203, 0xFF0080]])
@@ -0,0 +1,94 @@
+"""A fused PointPipeline matches running its filters one after another."""
+import random
+
+import pytest
+
+import np_backend
+from conftest import SHAPES, random_image
+from photo_core.pixels import clamp8
+from point_pipeline import PointPipeline
+
+# pipeline method -> (editor filter, its keyword, random parameter); "lut"
+# (separate random tables per channel) is checked against _reference
+STEPS = {
+    "brightness": ("adjust_brightness", "delta",
+                   lambda rng: rng.randint(-300, 300)),
+    "contrast": ("adjust_contrast", "factor",
+                 lambda rng: rng.choice((0, 1, -1, rng.uniform(-3, 3)))),
+    "gamma": ("gamma_correction", "gamma",
+              lambda rng: rng.choice((1, rng.uniform(0.05, 5)))),
+    "posterize": ("posterize_keep_bits", "keep_bits",
+                  lambda rng: rng.randint(1, 8)),
+    "threshold": ("threshold_bw", "t", lambda rng: rng.randint(0, 255)),
+    "invert": ("invert_colors", None, None),
+    "remove_green": ("remove_green", None, None),
+    "swap_red_blue": ("swap_red_blue", None, None),
+    "grayscale": ("to_grayscale", None, None),
+    "sepia": ("sepia", None, None),
+    "lut": (None, None, lambda rng: [[rng.randrange(256) for _ in range(256)]
+                                     for _ in range(3)]),
+}
+IDENTITY_ROWS = ((1, 0, 0), (0, 1, 0), (0, 0, 1))
+CHAINS = 300
+PATHS = {"python": dict(use_numpy=False, use_stdlib=False),
+         "stdlib": dict(use_numpy=False, use_stdlib=True),
+         "numpy": dict(use_numpy=True)}
+
+
+def _reference(img, tables, rows):
+    """Per-channel ``tables`` then the colour matrix ``rows``, per pixel."""
+    out = img.copy()
+    for y in range(out.height):
+        row = out[y]
+        for x in range(out.width):
+            px = row[x]
+            rgb = [table[(px >> s) & 0xFF]
+                   for table, s in zip(tables, (16, 8, 0))]
+            r, g, b = (clamp8(sum(k * v for k, v in zip(krow, rgb)))
+                       for krow in rows)
+            row[x] = (r << 16) | (g << 8) | b
+    return out
+
+
+def _chain(seed):
+    rng = random.Random(seed)
+    chain = []
+    for _ in range(rng.randint(1, 7)):
+        method = rng.choice(sorted(STEPS))
+        make = STEPS[method][2]
+        chain.append((method, make(rng) if make else None))
+    return chain
+
+
+@pytest.mark.parametrize("path", sorted(PATHS))
+@pytest.mark.parametrize("seed", range(CHAINS))
+def test_random_chain_matches_steps(editor, seed, path):
+    if path == "numpy" and not np_backend.AVAILABLE:
+        pytest.skip("NumPy is not installed")
+    img = random_image(*SHAPES[seed % len(SHAPES)], seed=seed)
+    pipeline = PointPipeline()
+    expected = img
+    for method, value in _chain(seed):
+        name, keyword, _ = STEPS[method]
+        if method == "lut":
+            pipeline.lut(*value)
+            expected = _reference(expected, value, IDENTITY_ROWS)
+            continue
+        kwargs = {} if keyword is None else {keyword: value}
+        getattr(pipeline, method)(*kwargs.values())
+        expected = getattr(editor, name)(expected, backend="python",
+                                         **kwargs)
+    assert pipeline.apply(img, **PATHS[path]) == expected
+
+
+@pytest.mark.parametrize("path", sorted(PATHS))
+def test_custom_tables_and_matrix(path):
+    if path == "numpy" and not np_backend.AVAILABLE:
+        pytest.skip("NumPy is not installed")
+    img = random_image(23, 19)
+    rng = random.Random(5)
+    tables = [[rng.randrange(256) for _ in range(256)] for _ in range(3)]
+    rows = ((0.2, 0.7, 0.1), (1.5, -0.3, 0), (0, 0, 1))
+    pipeline = PointPipeline().lut(*tables).matrix(rows)
+    assert pipeline.apply(img, **PATHS[path]) == _reference(img, tables,
+                                                            rows)
@@ -0,0 +1,77 @@
+"""Every rank_filter path matches sorting each window, bit for bit."""
+from functools import lru_cache
+
+import pytest
+
+import np_backend
+import rank
+from conftest import SHAPES, random_image
+from convolve import BORDER_MODES, border_index
+from rank import rank_filter, rank_index
+
+RADII = range(7)
+RANK_ARGS = ("min", "median", "max", 0, 10, 37.5, 90, 100)
+# name -> (use_numpy, BAND_PIXELS); "banded" splits even small images
+PATHS = {"python": (False, rank.BAND_PIXELS)}
+if np_backend.AVAILABLE:
+    PATHS.update(numpy=(True, rank.BAND_PIXELS), banded=(True, 40))
+
+
+@lru_cache(maxsize=None)
+def _sorted_windows(shape, r, border):
+    """Random image and {(y, x): three sorted channel windows} for the
+    pixels the filter sets (shared by the paths)."""
+    img = random_image(*shape, seed=r)
+    h, w = len(img), len(img[0])
+    mode = "clamp" if border == "copy" else border
+    windows = {}
+    for y in range(h):
+        for x in range(w):
+            if border == "copy" and not (r <= y < h - r and r <= x < w - r):
+                continue
+            values = [img[border_index(y + i, h, mode)]
+                      [border_index(x + j, w, mode)]
+                      for i in range(-r, r + 1) for j in range(-r, r + 1)]
+            windows[y, x] = [sorted((p >> s) & 0xFF for p in values)
+                             for s in (16, 8, 0)]
+    return img, windows
+
+
+def _expected(img, windows, k):
+    out = img.copy()
+    for (y, x), (reds, greens, blues) in windows.items():
+        out[y][x] = (reds[k] << 16) | (greens[k] << 8) | blues[k]
+    return out
+
+
+@pytest.mark.parametrize("path", sorted(PATHS))
+@pytest.mark.parametrize("shape", SHAPES, ids=str)
+@pytest.mark.parametrize("border", BORDER_MODES)
+@pytest.mark.parametrize("r", RADII)
+def test_matches_sorted_windows(monkeypatch, r, border, shape, path):
+    use_numpy, band = PATHS[path]
+    monkeypatch.setattr(rank, "BAND_PIXELS", band)
+    img, windows = _sorted_windows(shape, r, border)
+    for which in RANK_ARGS:
+        expected = _expected(img, windows, rank_index(2 * r + 1, which))
+        got = rank_filter(img, r, which, border, use_numpy=use_numpy)
+        assert got == expected, which
+        view = random_image(*shape, seed=r, stride=shape[0] + 2)
+        assert rank_filter(view, r, which, border, use_numpy=use_numpy,
+                           out=view) == expected, which
+
+
+def test_editor_filters_route_to_rank(editor):
+    img = random_image(23, 19)
+    for fn, which in ((editor.median_filter, "median"), (editor.erode, "min"),
+                      (editor.dilate, "max")):
+        assert fn(img, 2, backend="python") == rank_filter(
+            img, 2, which, use_numpy=False)
+    assert editor.percentile_filter(img, 2, 75, backend="python") == \
+        rank_filter(img, 2, 75, use_numpy=False)
+
+
+@pytest.mark.parametrize("args", [(-1, "median"), (1, 101), (1, "mode")])
+def test_rejects_bad_arguments(args):
+    with pytest.raises(ValueError):
+        rank_filter(random_image(3, 3), *args)
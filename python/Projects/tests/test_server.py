@@ -0,0 +1,59 @@
+"""server._encode keeps written outputs inside output_dir."""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+import server
+from conftest import random_image
+from encode import format_for
+from result_cache import ResultCache
+
+ESCAPE = "png/../../escaped.png"
+
+
+@pytest.fixture
+def worker_cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(server, "_cache", ResultCache(
+        disk_root=str(tmp_path / "cache"), quiet=True))
+
+
+def _files(root):
+    return sorted(os.path.relpath(os.path.join(d, f), root)
+                  for d, _, names in os.walk(root) for f in names)
+
+
+@pytest.mark.parametrize("fmt", [ESCAPE, "png/", "../png", "p g", "."])
+def test_format_must_be_a_bare_name(fmt):
+    with pytest.raises(ValueError):
+        format_for(None, fmt)
+
+
+def test_encode_rejects_format_paths(worker_cache, tmp_path):
+    job = {"output_dir": str(tmp_path / "root" / "sub")}
+    output = SimpleNamespace(format=ESCAPE, save={})
+    with pytest.raises(ValueError):
+        server._encode("out", random_image(4, 3), output, job)
+    assert not os.path.exists(tmp_path / "escaped.png")
+
+
+def test_encode_checks_the_final_path(worker_cache, tmp_path, monkeypatch):
+    # Even if a format got past format_for, the file may not leave the dir
+    monkeypatch.setattr(server, "format_for", lambda fp, fmt: "PNG")
+    job = {"output_dir": str(tmp_path / "root" / "sub")}
+    output = SimpleNamespace(format=ESCAPE, save={})
+    with pytest.raises(ValueError):
+        server._encode("out", random_image(4, 3), output, job)
+    assert "escaped.png" not in _files(tmp_path)
+
+
+def test_encode_writes_quietly(worker_cache, tmp_path, capsys):
+    out_dir = tmp_path / "root" / "sub"
+    output = SimpleNamespace(format="png", save={})
+    for _ in range(2):     # the second save is copied from the cache
+        entry = server._encode("out", random_image(4, 3), output,
+                               {"output_dir": str(out_dir)})
+    assert entry["path"] == str(out_dir / "out.png")
+    assert os.path.getsize(entry["path"]) == entry["bytes"]
+    assert server._cache.encode_hits == 1
+    assert capsys.readouterr().out == ""
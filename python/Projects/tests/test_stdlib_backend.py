@@ -0,0 +1,54 @@
+"""The stdlib backend gives the Python loops' pixels, bit for bit."""
+import pytest
+
+import np_backend
+import stdlib_backend
+from conftest import (POINT_CASES, SHAPES, point_case_id, point_source,
+                      random_image)
+
+
+@pytest.mark.parametrize("band", [stdlib_backend.BAND_PIXELS, 7])
+@pytest.mark.parametrize("shape", SHAPES, ids=str)
+@pytest.mark.parametrize("case", POINT_CASES, ids=point_case_id)
+def test_point_filter_matches_python(editor, monkeypatch, case, shape,
+                                     band):
+    monkeypatch.setattr(stdlib_backend, "BAND_PIXELS", band)
+    name, kwargs = case
+    fn = getattr(editor, name)
+    img = point_source(editor, name, shape)
+    expected = fn(img, backend="python", **kwargs)
+    assert fn(img, backend="stdlib", **kwargs) == expected
+
+    # Strided views (tiles) and in-place runs give the same pixels
+    view = point_source(editor, name, shape, stride=shape[0] + 3)
+    assert fn(view, backend="stdlib", **kwargs) == expected
+    copy = img.copy()
+    assert fn(copy, backend="stdlib", inplace=True, **kwargs) is copy
+    assert copy == expected
+
+
+def test_missing_numpy_is_reported_once(editor, monkeypatch, capsys):
+    np_backend.AVAILABLE        # the lazy import, before patching it
+    monkeypatch.setattr(np_backend, "AVAILABLE", False)
+    monkeypatch.setattr(editor, "_NUMPY_MISSING_SAID", False)
+    img = random_image(5, 4)
+    expected = editor.invert_colors(img, backend="python")
+    for _ in range(3):
+        assert editor.invert_colors(img, backend="numpy") == expected
+    assert capsys.readouterr().out.count("NumPy is not installed") == 1
+
+
+def test_mean3_divides_every_sum_exactly():
+    sums = range(766)
+    r = bytes(min(s, 255) for s in sums)
+    g = bytes(min(max(s - 255, 0), 255) for s in sums)
+    b = bytes(max(s - 510, 0) for s in sums)
+    assert list(stdlib_backend.mean3(r, g, b)) == [s // 3 for s in sums]
+
+
+@pytest.mark.parametrize("shape", SHAPES, ids=str)
+def test_split_pack_round_trip(shape):
+    img = random_image(*shape)
+    back = stdlib_backend.map_bytes(
+        img, lambda cells: stdlib_backend.pack(*stdlib_backend.split(cells)))
+    assert back == img
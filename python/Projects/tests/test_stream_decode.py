@@ -0,0 +1,69 @@
+"""decode_stream refuses images over its caps before reading their body."""
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from pixel_buffer import from_pil
+from stream_decode import ImageTooLarge, decode_stream
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.consumed = 0
+
+    def read(self, n=-1):
+        chunk = super().read(n)
+        self.consumed += len(chunk)
+        return chunk
+
+
+def _encoded(width, height, fmt="PNG"):
+    rng = random.Random(width * height)
+    img = Image.frombytes("RGB", (width, height),
+                          rng.randbytes(3 * width * height))
+    out = io.BytesIO()
+    img.save(out, fmt)
+    return out.getvalue(), img
+
+
+@pytest.mark.parametrize("fmt", ["PNG", "BMP", "JPEG"])
+def test_pixel_cap_stops_at_the_header(fmt):
+    data, _ = _encoded(600, 400, fmt)
+    stream = CountingStream(data)
+    headers = []
+    with pytest.raises(ImageTooLarge, match="600x400"):
+        decode_stream(stream, max_pixels=600 * 400 - 1,
+                      on_header=lambda *a: headers.append(a),
+                      chunk_size=4096)
+    assert headers == []
+    assert stream.consumed <= 4096 < len(data)
+
+
+def test_byte_cap_stops_the_download():
+    data, _ = _encoded(300, 200)
+    stream = CountingStream(data)
+    with pytest.raises(ImageTooLarge, match="byte cap"):
+        decode_stream(stream, max_bytes=50_000, chunk_size=4096)
+    assert stream.consumed < 50_000 + 4096
+
+
+def test_declared_length_is_checked_before_reading():
+    stream = CountingStream(b"\x89PNG")
+    with pytest.raises(ImageTooLarge):
+        decode_stream(stream, max_bytes=1000, length=1001)
+    assert stream.consumed == 0
+
+
+@pytest.mark.parametrize("fmt", ["PNG", "BMP"])
+def test_image_at_the_caps_decodes(fmt):
+    data, img = _encoded(60, 40, fmt)
+    headers = []
+    buf = decode_stream(CountingStream(data), max_bytes=len(data),
+                        max_pixels=60 * 40,
+                        on_header=lambda *a: headers.append(a),
+                        chunk_size=1000)
+    assert buf == from_pil(img)
+    assert headers == [((60, 40), fmt)]
@@ -0,0 +1,90 @@
+"""Strip streaming: row-by-row PNG decoding and cleanup on failure."""
+import io
+
+import pytest
+from PIL import Image
+
+from conftest import random_image
+from pixel_buffer import from_pil, to_pil
+from strips import StripReader, stream_process
+
+
+def _cells(strips):
+    return [c for s in strips for y in range(s.height) for c in s.row(y)]
+
+
+def _png(tmp_path, mode, width=29, height=23):
+    img = to_pil(random_image(width, height))
+    # Smooth rows next to noisy ones, so the encoder mixes its filters
+    img.paste(Image.linear_gradient("L").resize((width, height // 2))
+              .convert("RGB"))
+    img = img.quantize(37) if mode == "P" else img.convert(mode)
+    path = tmp_path / f"{mode}.png"
+    img.save(path, optimize=True)
+    return path
+
+
+@pytest.mark.parametrize("strip_rows", [1, 4, 64])
+@pytest.mark.parametrize("mode", ["L", "RGB", "P", "LA", "RGBA"])
+def test_png_strips_match_full_decode(tmp_path, mode, strip_rows):
+    path = _png(tmp_path, mode)
+    reader = StripReader(path, strip_rows)
+    try:
+        assert reader.rows is not None           # no whole-image decode
+        strips = [strip for _, strip in reader]
+    finally:
+        reader.close()
+    assert [s.height for s in strips[:-1]] == [strip_rows] * (
+        len(strips) - 1)
+    with Image.open(path) as full:
+        assert _cells(strips) == _cells([from_pil(full)])
+
+
+@pytest.mark.parametrize("fmt", ["16-bit", "JPEG"])
+def test_other_sources_fall_back_to_pillow(tmp_path, fmt):
+    fh = io.BytesIO()
+    if fmt == "JPEG":
+        to_pil(random_image(20, 9)).save(fh, "JPEG")
+    else:
+        Image.new("I;16", (20, 9), 300).save(fh, "PNG")
+    fh.seek(0)
+    reader = StripReader(fh, 4)
+    assert reader.rows is None
+    assert [y0 for y0, _ in reader] == [0, 4, 8]
+    reader.close()
+
+
+def test_stream_matches_whole_image(editor, tmp_path):
+    path = _png(tmp_path, "RGB", 31, 40)
+    out = tmp_path / "inverted.png"
+    stream_process(path, [(out, editor.invert_colors, (), {}, 0)],
+                   strip_rows=7)
+    with Image.open(path) as src, Image.open(out) as res:
+        assert from_pil(res) == editor.invert_colors(from_pil(src))
+
+
+def test_failed_stream_removes_partial_outputs(tmp_path):
+    path = _png(tmp_path, "RGB")
+    calls = []
+
+    def fails_late(image_data):
+        calls.append(image_data.height)
+        if len(calls) == 2:
+            raise RuntimeError("filter failed")
+        return image_data
+
+    outputs = [(tmp_path / "copy.png", None, (), {}, 0),
+               (tmp_path / "broken.png", fails_late, (), {}, 0)]
+    with pytest.raises(RuntimeError):
+        stream_process(path, outputs, strip_rows=5)
+    assert not (tmp_path / "copy.png").exists()
+    assert not (tmp_path / "broken.png").exists()
+
+
+def test_unopenable_output_removes_earlier_ones(tmp_path):
+    path = _png(tmp_path, "RGB")
+    outputs = [(tmp_path / "first.png", None, (), {}, 0),
+               (tmp_path / "missing" / "second.png", None, (), {}, 0)]
+    with pytest.raises(OSError):
+        stream_process(path, outputs)
+    assert not (tmp_path / "first.png").exists()
@@ -0,0 +1,125 @@
+"""Tiled multi-core execution for any filter ``fn(image_data, *args)``.
+
+The source image is copied once into ``multiprocessing.shared_memory``; each
+worker process reads its band of rows (plus ``halo`` rows above and below
+for neighbourhood filters), runs the filter on it, and writes the band's own
+rows into a shared output block. No pixel data is pickled, only the block
+names and row ranges.
+
+    out = run_tiled(apply_kernel, img, K_SHARPEN,
+                    halo=kernel_halo(K_SHARPEN), workers=8)
+
+Output is identical to calling ``fn`` directly, as long as ``fn`` only looks
+``halo`` rows up/down (point filters: 0, NxN kernels: N // 2). The filter
+must be a module-level function so it can be sent to the workers.
+"""
+import os
+import sys
+from array import array
+from math import isqrt
+
+from pixel_buffer import PixelBuffer, as_buffer
+
+MIN_BAND_ROWS = 16
+BANDS_PER_WORKER = 4
+
+
+def kernel_halo(kernel):
+    """Rows of context an NxN kernel needs on each side of a band."""
+    kernel = list(kernel)
+    n = len(kernel) if kernel and isinstance(kernel[0], (list, tuple)) \
+        else isqrt(len(kernel))
+    return n // 2
+
+
+def split_bands(height, workers, band_rows=None):
+    """[(y0, y1), ...] row ranges covering 0..height."""
+    if band_rows is None:
+        target = max(1, workers * BANDS_PER_WORKER)
+        band_rows = max(MIN_BAND_ROWS, -(-height // target))
+    return [(y, min(y + band_rows, height))
+            for y in range(0, height, band_rows)]
+
+
+def _attach(name):
+    """Open the parent's shared block without registering it with this
+    process's resource tracker. Only the parent unlinks it; a worker whose
+    tracker also recorded it would report it as leaked at exit."""
+    from multiprocessing import resource_tracker, shared_memory
+
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Older versions always register on attach. Unregistering afterwards
+    # is not safe: a forked worker shares the parent's tracker and would
+    # drop the parent's own entry. So skip the registration instead.
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _run_band(fn, args, kwargs, src_name, dst_name, width, height,
+              y0, y1, halo):
+    """Worker: filter rows y0..y1 (with halo context) into the output."""
+    src, dst = _attach(src_name), _attach(dst_name)
+    try:
+        top, bottom = max(0, y0 - halo), min(height, y1 + halo)
+        row_bytes = width * 4
+        band = PixelBuffer(width, bottom - top, bytearray(
+            src.buf[top * row_bytes:bottom * row_bytes]))
+        result = as_buffer(fn(band, *args, **kwargs))
+        for y in range(y0, y1):
+            off = y * row_bytes
+            dst.buf[off:off + row_bytes] = result.row(y - top).cast("B")
+        del band, result
+    finally:
+        src.close()
+        dst.close()
+    return y1 - y0
+
+
+def run_tiled(fn, image_data, *args, halo=0, workers=None, band_rows=None,
+              executor=None, **kwargs):
+    """Run ``fn`` over row bands in parallel and stitch the result.
+
+    ``workers`` defaults to the CPU count; pass an existing
+    ProcessPoolExecutor as ``executor`` to reuse one pool across calls.
+    """
+    src_img = as_buffer(image_data)
+    w, h = src_img.width, src_img.height
+    workers = workers or os.cpu_count() or 1
+    bands = split_bands(h, workers, band_rows)
+    if (workers <= 1 and executor is None) or len(bands) <= 1:
+        return as_buffer(fn(src_img, *args, **kwargs))
+
+    # Imported here: single-process runs never need them
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    size = max(1, w * h * 4)
+    src = shared_memory.SharedMemory(create=True, size=size)
+    dst = shared_memory.SharedMemory(create=True, size=size)
+    pool = executor or ProcessPoolExecutor(max_workers=workers)
+    try:
+        row_bytes = w * 4
+        for y in range(h):
+            src.buf[y * row_bytes:(y + 1) * row_bytes] = \
+                src_img.row(y).cast("B")
+        futures = [
+            pool.submit(_run_band, fn, args, kwargs, src.name, dst.name,
+                        w, h, y0, y1, halo)
+            for y0, y1 in bands
+        ]
+        for f in futures:
+            f.result()
+        packed = array("I")
+        packed.frombytes(dst.buf[:w * h * 4])
+        return PixelBuffer(w, h, packed)
+    finally:
+        if executor is None:
+            pool.shutdown()
+        for block in (src, dst):
+            block.close()
+            block.unlink()